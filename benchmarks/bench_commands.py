@@ -0,0 +1,58 @@
+"""
+   pycmake Command Compile Benchmark
+
+   Copyright (C) 2023 jppgmx
+   Licensed under MIT License
+
+   Measures how many commands are compiled per second:
+   built and compiled from scratch, compiled again while frozen,
+   and derived with with_() (a build matrix fan-out).
+
+   Usage (from the repository root): python -m benchmarks.bench_commands [count]
+"""
+
+import sys
+import time
+
+from cmake.ccmd import CMakeConfigure
+
+VARIABLES = {f'OPTION_{n}': f'value {n}' for n in range(32)}
+BUILD_TYPES = ['Debug', 'Release', 'RelWithDebInfo', 'MinSizeRel']
+
+def __rate(name: str, count: int, func):
+    started = time.perf_counter()
+    func(count)
+    elapsed = time.perf_counter() - started
+    print(f'{name:<24} {count / elapsed:>12,.0f} commands/s')
+
+def __fresh(count: int):
+    for n in range(count):
+        CMakeConfigure(build_dir=f'build-{n}', generator='Ninja',
+                       variables=VARIABLES).compile()
+
+def __frozen(count: int):
+    command = CMakeConfigure(build_dir='build', generator='Ninja',
+                             variables=VARIABLES).freeze()
+    for _ in range(count):
+        command.compile()
+
+def __derived(count: int):
+    base = CMakeConfigure(generator='Ninja', variables=VARIABLES).freeze()
+    base.compile()
+    for n in range(count):
+        base.with_(build_dir=f'build-{n}',
+                   install_prefix=f'/opt/{BUILD_TYPES[n % len(BUILD_TYPES)]}').compile()
+
+def main():
+    """
+        Runs the benchmark.
+    """
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+    __rate('fresh + compile', count, __fresh)
+    __rate('frozen compile', count, __frozen)
+    __rate('with_() + compile', count, __derived)
+
+if __name__ == '__main__':
+    main()
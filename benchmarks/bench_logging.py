@@ -0,0 +1,53 @@
+"""
+   pycmake Logging Benchmark
+
+   Copyright (C) 2023 jppgmx
+   Licensed under MIT License
+
+   Measures how many messages per second cmakeutils.logging.log takes:
+   below the log level (dropped) and logged to a file.
+
+   Usage (from the repository root): python -m benchmarks.bench_logging [count]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+from cmakeutils import logging as internal_logger
+
+def __rate(name: str, count: int, func):
+    started = time.perf_counter()
+    func(count)
+    elapsed = time.perf_counter() - started
+    print(f'{name:<24} {count / elapsed:>12,.0f} messages/s')
+
+def __dropped(count: int):
+    for _ in range(count):
+        internal_logger.log('dropped message', internal_logger.DEBUG)
+
+def __logged(count: int):
+    for n in range(count):
+        internal_logger.log(f'(pycmake Thread Processor #1) -> [ 42%] Building C object {n}.c.o')
+
+def main():
+    """
+        Runs the benchmark.
+    """
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        logfile = os.path.join(tmpdir, 'pycmake.log')
+        internal_logger.loginit(logfile)
+
+        __rate('below level', count, __dropped)
+        __rate('logged', count, __logged)
+
+        started = time.perf_counter()
+        internal_logger.logshutdown()
+        print(f'{"flush":<24} {time.perf_counter() - started:>12.3f} s')
+
+if __name__ == '__main__':
+    main()
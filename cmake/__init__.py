@@ -26,6 +26,18 @@ from . import coptions
 from . import cbasic
 from . import ccmd
 from . import cconstants
+from . import cadmission
+from . import cjobs
+from . import cprocess
+from . import cscheduler
+from . import cfingerprint
+from . import ccache
+from . import cfileapi
+from . import cartifacts
+from . import cpool
+from . import clease
+from . import cchecks
+from . import ccompilers
 
 from . import internal
 
@@ -46,6 +58,26 @@ CMakeRawCommandArgs = coptions.CMakeRawOptions
 
 CMakeConstants = cconstants
 
+CMakeAdmissionController = cadmission.CMakeAdmissionController
+CMakeAdmissionOptions = cadmission.CMakeAdmissionOptions
+CMakeJobsEstimator = cjobs.CMakeJobsEstimator
+
+CMakeProcessOptions = cprocess.CMakeProcessOptions
+CMakeIOClass = cprocess.CMakeIOClass
+
+CMakeScheduler = cscheduler.CMakeScheduler
+CMakePriority = cscheduler.CMakePriority
+CMakeFailFast = cscheduler.CMakeFailFast
+
+CMakeCache = ccache.CMakeCache
+CMakeFileApi = cfileapi.CMakeFileApi
+CMakeInstallCache = cartifacts.CMakeInstallCache
+CMakeBuildPool = cpool.CMakeBuildPool
+CMakeLeaseManager = clease.CMakeLeaseManager
+CMakeLeaseMode = clease.CMakeLeaseMode
+CMakeCheckCache = cchecks.CMakeCheckCache
+CMakeCompilerCache = ccompilers.CMakeCompilerCache
+
 def cminit(_options: CMakeInitializeOptions = CMakeInitializeOptions()):
     """
     Initializes the package logic, looking for cmake by default and 
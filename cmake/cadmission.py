@@ -0,0 +1,196 @@
+"""
+   pycmake Admission Control
+
+   Copyright (C) 2023 jppgmx
+   Licensed under MIT License
+
+   Delays the start of new cmake invocations while the machine is under pressure,
+   so concurrent builds don't push a shared host into swap.
+"""
+
+import dataclasses
+import threading
+import time
+
+from contextlib import contextmanager
+
+from cmakeutils import sysload, logging as internal_logger
+
+@dataclasses.dataclass
+class CMakeAdmissionOptions: # pylint: disable-msg=R0902
+    """
+        Thresholds used by the admission controller.
+        A threshold set to None is not checked.
+
+        'maxloadpercpu': 1-minute load average divided by the cpu count.
+        'maxcpupressure', 'maxmemorypressure', 'maxiopressure': "some avg10" percentages.
+        'minmemavailable': Minimum available memory, in bytes.
+        'maxconcurrent': Maximum number of admitted invocations running at the same time.
+        'hysteresis': Once throttled, the limits are scaled by this factor until
+                      the machine recovers, to avoid flapping around a threshold.
+        'interval': Seconds between two samples of the machine state while waiting.
+        'spacing': Minimum seconds between two admissions, so the load caused by
+                   the previous invocation shows up before the next one is admitted.
+    """
+
+    maxloadpercpu: float = 1.5
+    maxcpupressure: float = 50.0
+    maxmemorypressure: float = 10.0
+    maxiopressure: float = 50.0
+    minmemavailable: int = 1 << 30
+    maxconcurrent: int = None
+    hysteresis: float = 0.8
+    interval: float = 1.0
+    spacing: float = 0.0
+
+@dataclasses.dataclass
+class CMakeAdmissionStats:
+    """
+        Counters collected by the admission controller. Times are in seconds.
+    """
+
+    admitted: int = 0
+    delayed: int = 0
+    timeouts: int = 0
+    waiting: int = 0
+    running: int = 0
+    queuedtime: float = 0.0
+    maxqueuedtime: float = 0.0
+
+class CMakeAdmissionController:
+    """
+        Gate placed in front of cmake invocations.
+
+        Each invocation calls admit() and only starts when the machine state
+        is under every configured threshold.
+    """
+
+    options: CMakeAdmissionOptions
+    throttled: bool = False
+
+    def __init__(self, options: CMakeAdmissionOptions = None, sampler = sysload.readload):
+        self.options = CMakeAdmissionOptions() if options is None else options
+        self.throttled = False
+
+        self.__sampler = sampler
+        self.__stats = CMakeAdmissionStats()
+        self.__cond = threading.Condition()
+        self.__lastadmit = 0.0
+
+    def overloaded(self, load: sysload.SystemLoad) -> list[str]:
+        """
+            Returns the reasons why the machine is considered overloaded.
+            The list is empty when a new invocation may start.
+        """
+
+        ops = self.options
+        factor = ops.hysteresis if self.throttled else 1.0
+        reasons = []
+
+        def __above(name: str, value, limit):
+            if value is not None and limit is not None and value > limit * factor:
+                reasons.append(f'{name} {value:.2f} > {limit * factor:.2f}')
+
+        __above('load per cpu', load.loadpercpu(), ops.maxloadpercpu)
+        __above('cpu pressure', load.cpupressure, ops.maxcpupressure)
+        __above('memory pressure', load.memorypressure, ops.maxmemorypressure)
+        __above('io pressure', load.iopressure, ops.maxiopressure)
+
+        if load.memavailable is not None and ops.minmemavailable is not None:
+            minimum = ops.minmemavailable / factor
+            if load.memavailable < minimum:
+                reasons.append(f'available memory {load.memavailable} < {int(minimum)}')
+
+        if ops.maxconcurrent is not None and self.__stats.running >= ops.maxconcurrent:
+            reasons.append(f'{self.__stats.running} running invocations')
+
+        return reasons
+
+    def sample(self) -> sysload.SystemLoad:
+        """
+            Reads the machine state with the sampler of the controller.
+        """
+
+        return self.__sampler()
+
+    def acquire(self, timeout: float = None) -> float:
+        """
+            Waits until a new invocation may start and marks it as running.
+            Returns the time spent queued, raises TimeoutError if timeout is exceeded.
+        """
+
+        start = time.monotonic()
+        delayed = False
+
+        with self.__cond:
+            self.__stats.waiting += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    reasons = self.overloaded(self.sample())
+
+                    wait = self.options.interval
+                    if len(reasons) == 0:
+                        spacing = self.__lastadmit + self.options.spacing - now
+                        if spacing <= 0:
+                            break
+                        wait = spacing
+                    else:
+                        if not self.throttled:
+                            internal_logger.log('Delaying invocation: ' + ', '.join(reasons),
+                                                internal_logger.WARN)
+                        self.throttled = True
+
+                    delayed = True
+                    if timeout is not None:
+                        remaining = start + timeout - now
+                        if remaining <= 0:
+                            self.__stats.timeouts += 1
+                            raise TimeoutError('Timed out waiting for admission: ' +
+                                               ', '.join(reasons))
+                        wait = min(wait, remaining)
+
+                    self.__cond.wait(wait)
+            finally:
+                self.__stats.waiting -= 1
+
+            self.throttled = False
+            queued = time.monotonic() - start
+
+            self.__lastadmit = time.monotonic()
+            self.__stats.admitted += 1
+            self.__stats.running += 1
+            self.__stats.delayed += 1 if delayed else 0
+            self.__stats.queuedtime += queued
+            self.__stats.maxqueuedtime = max(self.__stats.maxqueuedtime, queued)
+
+        return queued
+
+    def release(self):
+        """
+            Marks an admitted invocation as finished.
+        """
+
+        with self.__cond:
+            self.__stats.running = max(0, self.__stats.running - 1)
+            self.__cond.notify_all()
+
+    @contextmanager
+    def admit(self, timeout: float = None):
+        """
+            Context manager version of acquire/release. Yields the time spent queued.
+        """
+
+        queued = self.acquire(timeout)
+        try:
+            yield queued
+        finally:
+            self.release()
+
+    def stats(self) -> CMakeAdmissionStats:
+        """
+            Returns a copy of the counters.
+        """
+
+        with self.__cond:
+            return dataclasses.replace(self.__stats)
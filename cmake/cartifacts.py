@@ -0,0 +1,360 @@
+"""
+   pycmake Install Cache
+
+   Copyright (C) 2023 jppgmx
+   Licensed under MIT License
+
+   Content-addressed local cache of install trees.
+   An install tree is keyed by the source content, the configure/build/install
+   arguments, the toolchain and initial cache contents, the environment that
+   selects the compilers and the cmake version; on a hit the install prefix
+   is restored with hardlinks (or reflinks) instead of configuring, building
+   and installing again. Arguments that only set the build parallelism (-j,
+   job pools) are left out of the key: they don't change the installed tree.
+"""
+
+import errno
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+
+from cmakeutils import logging as internal_logger
+from cmakeutils import diskusage
+from cmakeutils.treehash import TreeHasher
+
+from cmake import ccmd as cc
+from cmake import cfingerprint as cfp
+from cmake.cinstance import CMakeInst
+
+ENTRIES_DIR = 'entries'
+STAGING_DIR = 'staging'
+TRASH_DIR = 'trash'
+TREE_DIR = 'tree'
+META_FILE = 'meta.json'
+
+# Linux FICLONE ioctl (reflink a whole file)
+FICLONE = 0x40049409
+
+# Arguments (and the value that follows) that only set the build parallelism
+PARALLEL_ARGS = ('-j', '--parallel')
+PARALLEL_PREFIXES = ('-j', '--parallel=', '-DCMAKE_JOB_POOL')
+
+class CMakeInstallCache:
+    """
+        Local install-tree cache.
+
+        'cachedir': Directory of the cache.
+        'budget': Maximum size of the cached trees in bytes, enforced by evict().
+        'mode': How trees are restored: 'hardlink', 'reflink' or 'copy'.
+                Hardlinked files are shared with the cache and must not be modified.
+        'grace': Entries used less than this many seconds ago are never evicted,
+                 so a concurrent restore is not pulled away.
+    """
+
+    cachedir: str
+    budget: int
+    mode: str = 'hardlink'
+    grace: float = 300.0
+
+    def __init__(self, cachedir: str, budget: int = 10 << 30, mode: str = 'hardlink',
+                 grace: float = 300.0, hasher: TreeHasher = None):
+        if mode not in ('hardlink', 'reflink', 'copy'):
+            raise ValueError('Invalid mode: ' + mode)
+
+        self.cachedir = os.path.abspath(cachedir)
+        self.budget = budget
+        self.mode = mode
+        self.grace = grace
+        self.hasher = TreeHasher(os.path.join(self.cachedir, 'hashcache.json')) \
+            if hasher is None else hasher
+
+        for directory in (ENTRIES_DIR, STAGING_DIR, TRASH_DIR):
+            os.makedirs(os.path.join(self.cachedir, directory), exist_ok=True)
+
+    def key(self, cmake: CMakeInst, configure: cc.CMakeConfigure,
+            build: cc.CMakeBuildCommand = None, install: cc.CMakeInstallCommand = None) -> str:
+        """
+            Computes the cache key of an install: the source content, the arguments,
+            the contents of the toolchain and initial cache files (with the parts
+            pycmake seeded), the environment of the instance a configure depends on
+            (cfingerprint.configureenv) and the cmake version.
+            The source and build dir paths are left out of the arguments,
+            so the same project built in another workspace gets the same key,
+            and so is the build parallelism.
+        """
+
+        source = cfp.sourcedir(configure)
+        builddir = cfp.builddir(configure)
+
+        def __normalize(args: list[str]) -> list[str]:
+            normalized = []
+            skipnext = False
+            for arg in args:
+                if skipnext:
+                    skipnext = False
+                    continue
+                if arg in PARALLEL_ARGS:
+                    skipnext = True
+                    continue
+                if arg.startswith(PARALLEL_PREFIXES):
+                    continue
+
+                if os.path.abspath(arg) == builddir:
+                    arg = '<build>'
+                elif os.path.abspath(arg) == source:
+                    arg = '<source>'
+                else:
+                    for path, name in ((builddir, '<build>'), (source, '<source>')):
+                        arg = arg.replace(path, name)
+                normalized.append(arg)
+            return normalized
+
+        skip = [builddir]
+        if configure['install_prefix'] is not None:
+            skip.append(configure['install_prefix'])
+        if install is not None and install['prefix'] is not None:
+            skip.append(install['prefix'])
+
+        toolchain = configure['toolchain']
+        # The seeded script only includes the other files, by their path in the build dir
+        seeded = os.path.join(builddir, cfp.FINGERPRINT_DIR, cfp.SEED_FILE)
+        components = {
+            'source': self.hasher.hashtree(source, skip).digest,
+            'cmake': cmake.version,
+            'configure': __normalize(configure.compile()),
+            'build': [] if build is None else __normalize(build.compile()),
+            'install': [] if install is None else __normalize(install.compile()),
+            'toolchain': None if toolchain is None else cfp.filedigest(toolchain),
+            'initial_cache': [
+                cfp.filedigest(path) for path in cfp.initialcache(configure) if path != seeded
+            ],
+            'env': cfp.configureenv(cmake.environ)
+        }
+        self.hasher.save()
+
+        encoded = json.dumps(components, sort_keys=True).encode('utf-8')
+        return hashlib.sha256(encoded).hexdigest()
+
+    def contains(self, key: str) -> bool:
+        """
+            Checks whether an install tree is cached.
+        """
+
+        return os.path.isfile(os.path.join(self.__entry(key), META_FILE))
+
+    def restore(self, key: str, prefix: str) -> bool:
+        """
+            Restores a cached install tree as the prefix. Returns False on a miss.
+            The tree is placed in a staging dir next to the prefix and swapped in,
+            so no file of a previous install is left in the prefix.
+        """
+
+        tree = os.path.join(self.__entry(key), TREE_DIR)
+        if not self.contains(key):
+            return False
+
+        self.__touch(key)
+        prefix = os.path.abspath(prefix)
+        suffix = uuid.uuid4().hex
+        staging = f'{prefix}.{suffix}.staging'
+        count = 0
+        try:
+            if not os.path.isdir(tree):
+                # Evicted since contains()
+                raise FileNotFoundError(errno.ENOENT, 'No install tree', tree)
+
+            for directory, _, files in os.walk(tree):
+                target = os.path.join(staging, os.path.relpath(directory, tree))
+                os.makedirs(target, exist_ok=True)
+
+                for name in files:
+                    self.__place(os.path.join(directory, name), os.path.join(target, name))
+                    count += 1
+
+            self.__swap(staging, prefix, f'{prefix}.{suffix}.old')
+        except OSError as err:
+            # The entry was evicted or is unreadable, or the prefix is in use: a miss.
+            internal_logger.log(f'Could not restore {key}: {err}', internal_logger.WARN)
+            shutil.rmtree(staging, ignore_errors=True)
+            return False
+
+        internal_logger.log(f'Restored install tree {key} into {prefix} ({count} files)')
+        return True
+
+    def store(self, key: str, prefix: str) -> bool:
+        """
+            Publishes a copy of the prefix under the key.
+            The tree is staged first and renamed into place, so readers never see
+            a partial entry. Returns False if another process published it first.
+        """
+
+        if self.contains(key):
+            return False
+
+        staging = os.path.join(self.cachedir, STAGING_DIR, f'{key}.{uuid.uuid4().hex}')
+        tree = os.path.join(staging, TREE_DIR)
+
+        try:
+            shutil.copytree(prefix, tree, symlinks=True)
+
+            size = diskusage.treesize(tree)
+
+            with open(os.path.join(staging, META_FILE), 'w', encoding='utf-8') as fh:
+                json.dump({'key': key, 'size': size, 'created': time.time()}, fh)
+
+            try:
+                os.rename(staging, self.__entry(key))
+            except OSError as err:
+                if err.errno in (errno.EEXIST, errno.ENOTEMPTY):
+                    return False
+                raise
+        finally:
+            if os.path.isdir(staging):
+                shutil.rmtree(staging, ignore_errors=True)
+
+        internal_logger.log(f'Stored install tree {key} ({size} bytes)')
+        self.evict()
+
+        return True
+
+    def evict(self) -> list[str]:
+        """
+            Removes the least recently used entries until the cache fits the budget.
+            Returns the evicted keys.
+        """
+
+        entries = []
+        total = 0
+        for key in os.listdir(os.path.join(self.cachedir, ENTRIES_DIR)):
+            meta = self.__meta(key)
+            if meta is None:
+                continue
+            entries.append((self.__lastused(key), key, meta.get('size', 0)))
+            total += meta.get('size', 0)
+
+        evicted = []
+        now = time.time()
+        for lastused, key, size in sorted(entries):
+            if total <= self.budget:
+                break
+            if now - lastused < self.grace:
+                continue
+
+            trash = os.path.join(self.cachedir, TRASH_DIR, f'{key}.{uuid.uuid4().hex}')
+            try:
+                os.rename(self.__entry(key), trash)
+            except OSError:
+                continue
+
+            shutil.rmtree(trash, ignore_errors=True)
+            total -= size
+            evicted.append(key)
+
+        if len(evicted) > 0:
+            internal_logger.log(f'Evicted {len(evicted)} install tree(s)')
+
+        return evicted
+
+    def cachedinstall(self, cmake: CMakeInst, configure: cc.CMakeConfigure,
+                      build: cc.CMakeBuildCommand, install: cc.CMakeInstallCommand) -> bool:
+        """
+            Restores the install tree from the cache or, on a miss, configures,
+            builds and installs, then stores the result.
+            The install prefix is taken from the install command ('prefix') or from
+            the configure command ('install_prefix'). Returns True on a hit.
+        """
+
+        prefix = install['prefix']
+        if prefix is None:
+            prefix = configure['install_prefix']
+        if prefix is None:
+            raise ValueError('An install prefix is required to cache the install tree.')
+
+        key = self.key(cmake, configure, build, install)
+        if self.restore(key, prefix):
+            return True
+
+        for command in (configure, build, install):
+            cmake.invoke(command)
+            if cmake.lastreturncode != 0:
+                raise RuntimeError(f'{command.commandName} failed with code ' +
+                                   str(cmake.lastreturncode))
+
+        self.store(key, prefix)
+        return False
+
+    @staticmethod
+    def __swap(staging: str, prefix: str, old: str):
+        if not os.path.lexists(prefix):
+            os.makedirs(os.path.dirname(prefix), exist_ok=True)
+            os.rename(staging, prefix)
+            return
+
+        os.rename(prefix, old)
+        try:
+            os.rename(staging, prefix)
+        except OSError:
+            os.rename(old, prefix)
+            raise
+
+        shutil.rmtree(old, ignore_errors=True)
+
+    def __entry(self, key: str) -> str:
+        return os.path.join(self.cachedir, ENTRIES_DIR, key)
+
+    def __meta(self, key: str) -> dict:
+        try:
+            with open(os.path.join(self.__entry(key), META_FILE), 'r', encoding='utf-8') as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return None
+
+    def __touch(self, key: str):
+        try:
+            os.utime(os.path.join(self.__entry(key), META_FILE))
+        except OSError:
+            pass
+
+    def __lastused(self, key: str) -> float:
+        try:
+            return os.stat(os.path.join(self.__entry(key), META_FILE)).st_mtime
+        except OSError:
+            return 0.0
+
+    def __place(self, src: str, dst: str):
+        if os.path.islink(src):
+            os.symlink(os.readlink(src), dst)
+            return
+
+        if self.mode == 'hardlink':
+            try:
+                os.link(src, dst)
+                return
+            except OSError as err:
+                if err.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+                    raise
+        elif self.mode == 'reflink' and self.__reflink(src, dst):
+            return
+
+        shutil.copy2(src, dst)
+
+    @staticmethod
+    def __reflink(src: str, dst: str) -> bool:
+        try:
+            import fcntl # pylint: disable-msg=C0415
+        except ImportError:
+            return False
+
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            try:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+            except OSError:
+                fdst.close()
+                os.unlink(dst)
+                return False
+
+        shutil.copystat(src, dst)
+        return True
@@ -7,13 +7,17 @@
 
     It contains a class that encapsulates the data and its types, 
     which are String and Bool, in addition to VarDict, which is a type to encapsulate a dictionary.
+    Strings can be declared as PATH, FILEPATH or INTERNAL; undeclared strings are
+    classified lazily, when a command is compiled (see resolve).
 
 
 """
 import dataclasses
+import os
+import threading
 
 from enum import Enum
-import os
+from types import MappingProxyType
 
 from cmakeutils.typecheck import isdict
 
@@ -29,45 +33,148 @@ class CMakeValType(Enum):
     # Non-official cmake types
     VARDICT = 4
 
-@dataclasses.dataclass
-class CMakeValue:
+    PATH = 5
+    INTERNAL = 6
+
+# Types of the values that are strings
+STRING_TYPES = frozenset({CMakeValType.STRING, CMakeValType.PATH,
+                          CMakeValType.FILEPATH, CMakeValType.INTERNAL})
 
+class CMakeValue:
     """
-        Encapsulates a value.
+        Encapsulates a value. Values are immutable and hashable.
+
+        'vtype' declares the type of a str (STRING, PATH, FILEPATH or INTERNAL).
+        A str given without it is a STRING whose path kind is not known yet:
+        resolve() types the ones that name existing files as FILEPATH.
+        Dicts (VARDICT) map variable names to values and are kept read-only.
     """
-    value = None
-    type: CMakeValType
 
-    def __init__(self, value):
-        vtype = type(value)
-        if vtype is not str and vtype is not bool and not isdict(value, str, CMakeValue):
-            raise ValueError('Invalid value type: ' + str(vtype))
-
-        self.value = value
-
-        if vtype is str:
-            self.type = CMakeValType.STRING
-            if os.path.isfile(value):
-                self.type = CMakeValType.FILEPATH
-        elif vtype is bool:
-            self.type = CMakeValType.BOOL
-        elif isdict(value, str, CMakeValue):
-            self.type = CMakeValType.VARDICT
+    __slots__ = ('value', 'type', 'declared')
+
+    value: str | bool | MappingProxyType
+    type: CMakeValType
+    declared: bool
+
+    def __init__(self, value, vtype: CMakeValType = None):
+        vclass = type(value)
+        declared = vtype is not None
+
+        if vclass is str:
+            if vtype is None:
+                vtype = CMakeValType.STRING
+            elif vtype not in STRING_TYPES:
+                raise ValueError(f'Invalid type for a str value: {vtype}')
+        elif vclass is bool:
+            if vtype not in (None, CMakeValType.BOOL):
+                raise ValueError(f'Invalid type for a bool value: {vtype}')
+            vtype = CMakeValType.BOOL
+        elif isinstance(value, (dict, MappingProxyType)):
+            value = dict(value)
+            if not isdict(value, str, CMakeValue):
+                raise ValueError('Invalid dict value, expected dict[str, CMakeValue]')
+            if vtype not in (None, CMakeValType.VARDICT):
+                raise ValueError(f'Invalid type for a dict value: {vtype}')
+            vtype = CMakeValType.VARDICT
+            value = MappingProxyType(value)
         else:
-            raise ValueError('Value not supported -> ' + str(vtype))
+            raise ValueError('Invalid value type: ' + str(vclass))
+
+        object.__setattr__(self, 'value', value)
+        object.__setattr__(self, 'type', vtype)
+        object.__setattr__(self, 'declared', declared)
+
+    def __setattr__(self, name, value):
+        raise dataclasses.FrozenInstanceError(f'cannot assign to field {name!r}')
+
+    def __delattr__(self, name):
+        raise dataclasses.FrozenInstanceError(f'cannot delete field {name!r}')
 
     def __eq__(self, __value: object) -> bool:
         if not isinstance(__value, CMakeValue):
             return False
 
-        return self.type == __value.type and self.value == self.value
+        return self.type == __value.type and self.value == __value.value
 
     def __ne__(self, __value: object) -> bool:
         return not self == __value
 
     def __hash__(self) -> int:
+        if self.type == CMakeValType.VARDICT:
+            return hash((self.type, frozenset(self.value.items())))
+
         return hash((self.type, self.value))
 
+    def __repr__(self) -> str:
+        value = dict(self.value) if self.type == CMakeValType.VARDICT else self.value
+        return f'CMakeValue({value!r}, {self.type})'
+
+    def __reduce__(self):
+        value = dict(self.value) if self.type == CMakeValType.VARDICT else self.value
+        return (CMakeValue, (value, self.type if self.declared else None))
+
+__paths__: dict[str, bool] = {}
+__pathsgeneration__ = {'generation': 0}
+__pathslock__ = threading.Lock()
+
+def resolve(values: dict[str, CMakeValue]) -> dict[str, CMakeValue]:
+    """
+        Returns the values with the undeclared strings that name existing files
+        typed as FILEPATH. The paths not seen since the last clearpaths() are
+        checked in one pass; the results are kept until then.
+    """
+
+    undeclared = [
+        val.value for val in values.values()
+        if val is not None and not val.declared and val.type == CMakeValType.STRING
+    ]
+    if len(undeclared) == 0:
+        return values
+
+    with __pathslock__:
+        unknown = [path for path in set(undeclared) if path not in __paths__]
+    found = {path: path != '' and os.path.isfile(path) for path in unknown}
+    with __pathslock__:
+        __paths__.update(found)
+        files = {path for path in undeclared if __paths__.get(path, False)}
+
+    if len(files) == 0:
+        return values
+
+    return {
+        name: CMakeValue(val.value, CMakeValType.FILEPATH)
+        if val is not None and not val.declared and val.type == CMakeValType.STRING
+        and val.value in files else val
+        for name, val in values.items()
+    }
+
+def clearpaths():
+    """
+        Forgets the path kinds resolve() found. CMakeInst.invoke calls it before compiling.
+    """
+
+    with __pathslock__:
+        __paths__.clear()
+        __pathsgeneration__['generation'] += 1
+
+def pathsgeneration() -> int:
+    """
+        Returns how many times clearpaths() was called. Arguments compiled from
+        resolve() results are only valid within one generation.
+    """
+
+    with __pathslock__:
+        return __pathsgeneration__['generation']
+
+def compatible(expected: CMakeValType, actual: CMakeValType) -> bool:
+    """
+        Checks whether a value type fits an option type.
+        A STRING option takes any string value (PATH, FILEPATH or INTERNAL).
+    """
+
+    return expected == actual or \
+        (expected == CMakeValType.STRING and actual in STRING_TYPES)
+
 def castbool(boolean: bool):
     """
         Convert boolean to cmake ON/OFF.
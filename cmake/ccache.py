@@ -0,0 +1,377 @@
+"""
+   pycmake CMake Cache
+
+   Copyright (C) 2023 jppgmx
+   Licensed under MIT License
+
+   Reads and writes CMakeCache.txt without running cmake.
+   The file is parsed in a single pass over a memory map and only
+   parsed again when its modification time or size change.
+"""
+
+import dataclasses
+import mmap
+import os
+
+from cmake.cbasic import CMakeValType, CMakeValue
+
+CACHE_FILE = 'CMakeCache.txt'
+
+# Properties CMake stores as <NAME>-<PROPERTY>:INTERNAL entries
+PROPERTIES = ('ADVANCED', 'MODIFIED', 'STRINGS')
+
+FALSE_CONSTANTS = {'', '0', 'OFF', 'NO', 'FALSE', 'N', 'IGNORE', 'NOTFOUND'}
+
+__HEADER__ = [
+    '# This is the CMakeCache file.',
+    '# You can edit this file to change values found and used by cmake.',
+    '# If you do not want to change any of the values, simply exit the editor.',
+    '# If you do want to change a value, simply edit, save, and exit the editor.',
+    '# The syntax for the file is as follows:',
+    '# KEY:TYPE=VALUE',
+    '# KEY is the name of a variable in the cache.',
+    '# TYPE is a hint to GUIs for the type of VALUE, DO NOT EDIT TYPE!.',
+    '# VALUE is the current value for the KEY.'
+]
+
+def cmaketruth(value: str) -> bool:
+    """
+        Evaluates a string the way CMake's if() evaluates a constant.
+    """
+
+    upper = value.strip().upper()
+    if upper in FALSE_CONSTANTS or upper.endswith('-NOTFOUND'):
+        return False
+
+    try:
+        return float(upper) != 0
+    except ValueError:
+        return True
+
+@dataclasses.dataclass
+class CMakeCacheEntry:
+    """
+        An entry of the cache.
+
+        'type' is the CMake cache type: BOOL, STRING, PATH, FILEPATH,
+        INTERNAL, STATIC or UNINITIALIZED.
+    """
+
+    name: str
+    type: str
+    value: str
+    help: str = None
+    properties: dict[str, str] = dataclasses.field(default_factory=dict)
+
+    @property
+    def advanced(self) -> bool:
+        """
+            Whether the entry is marked as advanced.
+        """
+
+        return cmaketruth(self.properties.get('ADVANCED', '0'))
+
+    def tovalue(self) -> CMakeValue:
+        """
+            Converts the entry to a CMakeValue.
+        """
+
+        if self.type == 'BOOL':
+            return CMakeValue(cmaketruth(self.value))
+        if self.type in ('PATH', 'FILEPATH', 'INTERNAL'):
+            return CMakeValue(self.value, CMakeValType[self.type])
+
+        return CMakeValue(self.value, CMakeValType.STRING)
+
+@dataclasses.dataclass
+class CMakeCacheDiff:
+    """
+        Differences between two caches. 'changed' maps names to (old, new) entries.
+    """
+
+    added: dict[str, CMakeCacheEntry] = dataclasses.field(default_factory=dict)
+    removed: dict[str, CMakeCacheEntry] = dataclasses.field(default_factory=dict)
+    changed: dict[str, tuple[CMakeCacheEntry, CMakeCacheEntry]] = \
+        dataclasses.field(default_factory=dict)
+
+    def empty(self) -> bool:
+        """
+            Checks whether there is no difference.
+        """
+
+        return len(self.added) == 0 and len(self.removed) == 0 and len(self.changed) == 0
+
+class CMakeCache:
+    """
+        Model of a CMakeCache.txt. The path can be the file or the build dir.
+    """
+
+    path: str
+    entries: dict[str, CMakeCacheEntry] = None
+    header: list[str] = None
+
+    def __init__(self, path: str, load: bool = True):
+        self.path = os.path.join(path, CACHE_FILE) if os.path.isdir(path) else path
+        self.entries = {}
+        self.header = list(__HEADER__)
+        self.__stamp = None
+
+        if load and os.path.isfile(self.path):
+            self.load()
+
+    def load(self):
+        """
+            Parses the file, replacing every entry.
+        """
+
+        stat = os.stat(self.path)
+        with open(self.path, 'rb') as fh:
+            if stat.st_size == 0:
+                self.__parse(b'')
+            else:
+                with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    self.__parse(data)
+
+        self.__stamp = (stat.st_mtime_ns, stat.st_size)
+        return self
+
+    def changed(self) -> bool:
+        """
+            Checks whether the file on disk changed since the last load or write.
+        """
+
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return self.__stamp is not None
+
+        return self.__stamp != (stat.st_mtime_ns, stat.st_size)
+
+    def reload(self) -> bool:
+        """
+            Parses the file again only if it changed on disk. Returns True if it did.
+        """
+
+        if not self.changed():
+            return False
+
+        if not os.path.isfile(self.path):
+            self.entries = {}
+            self.__stamp = None
+        else:
+            self.load()
+
+        return True
+
+    def entry(self, name: str) -> CMakeCacheEntry:
+        """
+            Returns an entry or None.
+        """
+
+        return self.entries.get(name)
+
+    def get(self, name: str, default: str = None) -> str:
+        """
+            Returns the value of an entry or the default.
+        """
+
+        entry = self.entries.get(name)
+        return default if entry is None else entry.value
+
+    def set(self, name: str, value: str | bool, vtype: str = None, helpstr: str = None):
+        """
+            Creates or changes an entry. Boolean values are written as ON/OFF.
+        """
+
+        if isinstance(value, bool):
+            vtype = 'BOOL' if vtype is None else vtype
+            value = 'ON' if value else 'OFF'
+
+        entry = self.entries.get(name)
+        if entry is None:
+            entry = CMakeCacheEntry(name, 'STRING' if vtype is None else vtype, str(value))
+            self.entries[name] = entry
+        else:
+            entry.value = str(value)
+            entry.type = entry.type if vtype is None else vtype
+
+        if helpstr is not None:
+            entry.help = helpstr
+
+        return self
+
+    def remove(self, name: str):
+        """
+            Removes an entry, if present.
+        """
+
+        self.entries.pop(name, None)
+        return self
+
+    def diff(self, other: 'CMakeCache') -> CMakeCacheDiff:
+        """
+            Compares this cache (old) with another (new) by type and value.
+        """
+
+        result = CMakeCacheDiff()
+        for name, entry in self.entries.items():
+            newentry = other.entries.get(name)
+            if newentry is None:
+                result.removed[name] = entry
+            elif newentry.value != entry.value or newentry.type != entry.type:
+                result.changed[name] = (entry, newentry)
+
+        for name, entry in other.entries.items():
+            if name not in self.entries:
+                result.added[name] = entry
+
+        return result
+
+    def write(self, path: str = None):
+        """
+            Writes the cache atomically (temporary file + rename).
+        """
+
+        path = self.path if path is None else path
+        tmppath = f'{path}.{os.getpid()}.tmp'
+
+        external = [e for e in self.entries.values() if e.type != 'INTERNAL']
+        internal = [e for e in self.entries.values() if e.type == 'INTERNAL']
+
+        lines = list(self.header)
+        lines += ['', '########################', '# EXTERNAL cache entries',
+                  '########################', '']
+        for entry in external:
+            lines += self.__format(entry) + ['']
+
+        lines += ['', '########################', '# INTERNAL cache entries',
+                  '########################', '']
+        for entry in external + internal:
+            if entry.type == 'INTERNAL':
+                lines += self.__format(entry)
+            for prop, val in entry.properties.items():
+                lines.append(f'//{prop} property for variable: {entry.name}')
+                lines.append(f'{self.__quote(entry.name + "-" + prop)}:INTERNAL={val}')
+
+        with open(tmppath, 'w', encoding='utf-8', newline='\n') as fh:
+            fh.write('\n'.join(lines) + '\n\n')
+        os.replace(tmppath, path)
+
+        if path == self.path:
+            stat = os.stat(path)
+            self.__stamp = (stat.st_mtime_ns, stat.st_size)
+
+        return self
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.entries
+
+    def __getitem__(self, name: str) -> str:
+        return self.entries[name].value
+
+    def __setitem__(self, name: str, value: str | bool):
+        self.set(name, value)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __parse(self, data):
+        entries: dict[str, CMakeCacheEntry] = {}
+        header = []
+        helpstr = []
+        start = 0
+        end = len(data)
+
+        while start < end:
+            newline = data.find(b'\n', start)
+            newline = end if newline < 0 else newline
+            line = data[start:newline].rstrip(b'\r').decode('utf-8', errors='replace')
+            start = newline + 1
+
+            if line.startswith('//'):
+                helpstr.append(line[2:])
+                continue
+            if line.startswith('#'):
+                if len(entries) == 0 and not line.startswith('##') and \
+                        not line.startswith('# EXTERNAL') and not line.startswith('# INTERNAL'):
+                    header.append(line)
+                continue
+            if line.strip() == '':
+                helpstr = []
+                continue
+
+            parsed = self.__parseentry(line)
+            if parsed is not None:
+                entry = CMakeCacheEntry(parsed[0], parsed[1], parsed[2],
+                                        ''.join(helpstr) if len(helpstr) > 0 else None)
+                entries[entry.name] = entry
+            helpstr = []
+
+        # Attach <NAME>-<PROPERTY> entries to their variable
+        for name in list(entries.keys()):
+            base, _, prop = name.rpartition('-')
+            if prop in PROPERTIES and base in entries and entries[name].type == 'INTERNAL':
+                entries[base].properties[prop] = entries.pop(name).value
+
+        self.entries = entries
+        self.header = header if len(header) > 0 else list(__HEADER__)
+
+    @staticmethod
+    def __parseentry(line: str) -> tuple[str, str, str]:
+        if line.startswith('"'):
+            close = line.find('"', 1)
+            if close < 0:
+                return None
+            name = line[1:close]
+            rest = line[close + 1:]
+            if not rest.startswith(':'):
+                return None
+            rest = rest[1:]
+        else:
+            name, colon, rest = line.partition(':')
+            if not colon:
+                return None
+
+        vtype, equal, value = rest.partition('=')
+        if not equal:
+            return None
+
+        if len(value) >= 2 and value[0] == '"' and value[-1] == '"':
+            value = value[1:-1]
+
+        return (name, vtype.strip(), value)
+
+    @staticmethod
+    def __quote(name: str) -> str:
+        return f'"{name}"' if ':' in name or '=' in name else name
+
+    def __format(self, entry: CMakeCacheEntry) -> list[str]:
+        lines = []
+        if entry.help is not None:
+            lines += ['//' + chunk for chunk in self.__wraphelp(entry.help)]
+
+        value = entry.value
+        if value.endswith(' ') or value.startswith('"'):
+            value = f'"{value}"'
+
+        lines.append(f'{self.__quote(entry.name)}:{entry.type}={value}')
+        return lines
+
+    @staticmethod
+    def __wraphelp(helpstr: str, width: int = 70) -> list[str]:
+        # Continuation chunks start with the space they were split on,
+        # so joining the lines back gives the original text.
+        chunks = []
+        rest = helpstr.replace('\n', ' ')
+        while len(rest) > width:
+            split = rest.find(' ', width)
+            if split < 0:
+                break
+            chunks.append(rest[:split])
+            rest = rest[split:]
+
+        chunks.append(rest)
+        return chunks
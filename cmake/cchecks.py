@@ -0,0 +1,303 @@
+"""
+   pycmake Check Results Cache
+
+   Copyright (C) 2023 jppgmx
+   Licensed under MIT License
+
+   Shares the results of configure checks (check_include_file,
+   check_symbol_exists, check_function_exists, check_<lang>_source_compiles...)
+   between build dirs that use the same toolchain.
+   The results are harvested from the CMakeCache.txt of a finished configure
+   into a store keyed by the toolchain selection, and given back to later
+   configures as a -C script through the 'initial_cache' option, so CMake
+   finds them defined and skips the probes. The compilers that produced the
+   results are recorded and checked: a key holds one record per set of
+   compilers, so machines that find different compilers keep their own
+   results, and a configure is only seeded with the record of the compilers
+   it will use.
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+
+from cmakeutils import logging as internal_logger
+
+from cmake import ccmd as cc
+from cmake import cfingerprint as cfp
+from cmake.ccache import CMakeCache, CMakeCacheEntry
+from cmake.cinstance import CMakeInst
+
+SEED_NAME = 'check-results'
+
+# Help strings the CMake check modules give their result entries
+CHECK_HELP = re.compile(r'^(Have (include|includes|symbol|function|variable|library|'
+                        r'prototype|struct member)\b|Test )')
+
+COMPILER_VAR = re.compile(r'^CMAKE_([A-Za-z0-9]+)_COMPILER$')
+
+# Configure variables and environment that select the toolchain
+KEY_VARIABLES = re.compile(r'^CMAKE_([A-Za-z0-9]+_)?(COMPILER\w*|FLAGS\w*|SYSROOT|'
+                           r'OSX_\w+|SYSTEM_\w+|CROSSCOMPILING\w*|TRY_COMPILE\w*)$')
+KEY_ENVIRON = {'CC', 'CXX', 'FC', 'OBJC', 'OBJCXX', 'CUDACXX', 'HIPCXX', 'ASM',
+               'CFLAGS', 'CXXFLAGS', 'CPPFLAGS', 'LDFLAGS', 'FFLAGS', 'CUDAFLAGS',
+               'SDKROOT', 'MACOSX_DEPLOYMENT_TARGET'}
+
+def ischeck(entry: CMakeCacheEntry) -> bool:
+    """
+        Checks whether a cache entry is the result of a configure check.
+    """
+
+    return entry.type == 'INTERNAL' and entry.help is not None and \
+        CHECK_HELP.match(entry.help) is not None
+
+def compilers(cache: CMakeCache) -> dict[str, str]:
+    """
+        Returns the digests of the compilers of a configured cache, by path.
+    """
+
+    result = {}
+    for name in cache:
+        if COMPILER_VAR.match(name) is not None:
+            path = cache.get(name)
+            if path and os.path.isfile(path):
+                result[os.path.abspath(path)] = cfp.statdigest(path)
+
+    return result
+
+def variant(found: dict[str, str]) -> str:
+    """
+        Names the record of a set of compilers (path -> digest) within a key.
+    """
+
+    encoded = json.dumps(found, sort_keys=True).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
+class CMakeCheckCache:
+    """
+        Store of check results.
+
+        'storedir': Directory of the store.
+        'extra': Names of other INTERNAL entries to share (e.g. results of custom checks).
+    """
+
+    storedir: str
+    extra: set[str] = None
+
+    def __init__(self, storedir: str, extra: list[str] = None):
+        self.storedir = os.path.abspath(storedir)
+        self.extra = set() if extra is None else set(extra)
+
+        os.makedirs(self.storedir, exist_ok=True)
+
+    def key(self, cmake: CMakeInst, configure: cc.CMakeConfigure,
+            environ: dict[str, str] = None) -> str:
+        """
+            Computes the store key of a configure: cmake version, generator,
+            toolchain file and the compiler/flag selection of the variables and
+            environment. The compilers themselves are validated by their digests.
+        """
+
+        environ = cmake.environ if environ is None else environ
+        variables = configure['variables'] or {}
+        toolchain = configure['toolchain']
+
+        components = {
+            'cmake': cmake.version,
+            'generator': [configure['generator'], configure['platform_name'],
+                          configure['toolset_spec']],
+            'toolchain': None if toolchain is None else cfp.filedigest(toolchain),
+            'variables': {
+                name: str(val.value) for name, val in sorted(variables.items())
+                if KEY_VARIABLES.match(name) is not None
+            },
+            'env': {name: val for name, val in sorted(environ.items()) if name in KEY_ENVIRON}
+        }
+        encoded = json.dumps(components, sort_keys=True).encode('utf-8')
+
+        return hashlib.sha256(encoded).hexdigest()
+
+    def harvest(self, cmake: CMakeInst, configure: cc.CMakeConfigure) -> int:
+        """
+            Adds the check results of a configured build dir to the store.
+            Returns the number of results stored.
+        """
+
+        cache = CMakeCache(cfp.builddir(configure))
+        found = compilers(cache)
+        entries = {
+            entry.name: [entry.type, entry.value, entry.help]
+            for entry in cache.entries.values()
+            if ischeck(entry) or entry.name in self.extra
+        }
+        if len(entries) == 0:
+            return 0
+
+        key = self.key(cmake, configure)
+        record = self.__load(key, variant(found))
+        if record is None:
+            record = {'compilers': found, 'entries': {}}
+
+        record['entries'].update(entries)
+        record['updated'] = time.time()
+        self.__store(key, variant(found), record)
+
+        internal_logger.log(f'Stored {len(entries)} check result(s) under {key}')
+        return len(entries)
+
+    def seed(self, cmake: CMakeInst, configure: cc.CMakeConfigure) -> int:
+        """
+            Adds the stored results of a configure to the initial cache pycmake seeds
+            it with (see cfingerprint.seedscript); an initial cache given by the user is
+            included first, so its values win. The results are those of the compilers
+            the build dir was configured with, or on a fresh build dir, of the only
+            record whose compilers are all present, unchanged, here. Nothing is seeded
+            when no record (or several, on a fresh build dir) matches.
+            Returns the number of results seeded.
+        """
+
+        key = self.key(cmake, configure)
+        existing = CMakeCache(cfp.builddir(configure))
+        record = self.__match(key, compilers(existing))
+        if record is None:
+            return 0
+
+        lines = []
+        for name, (vtype, value, helpstr) in sorted(record['entries'].items()):
+            if name not in existing:
+                lines.append(f'set({name} {cfp.cmakestring(value)} CACHE {vtype} '
+                             f'{cfp.cmakestring(helpstr or "")})')
+
+        cfp.seedscript(configure, SEED_NAME, lines)
+        seeded = len(lines)
+        internal_logger.log(f'Seeded {seeded} check result(s) from {key}')
+
+        return seeded
+
+    def validate(self, cmake: CMakeInst, configure: cc.CMakeConfigure,
+                 seeded: dict[str, str] = None) -> bool:
+        """
+            Checks, after a configure, that the compilers it found are the ones the
+            seeded results came from ('seeded': their compilers, those of the record
+            seed() picks for a fresh build dir when None). The store is left alone:
+            the next harvest adds the results of the compilers found as their own record.
+        """
+
+        found = compilers(CMakeCache(cfp.builddir(configure)))
+        if seeded is None:
+            record = self.__match(self.key(cmake, configure), {})
+            if record is None:
+                return True
+            seeded = record['compilers']
+
+        if found == seeded:
+            return True
+
+        internal_logger.log('The compilers found differ from the ones of the seeded check '
+                            'results.', internal_logger.WARN)
+        return False
+
+    def invalidate(self, key: str):
+        """
+            Removes the stored results of a key (every compiler set).
+        """
+
+        shutil.rmtree(os.path.join(self.storedir, key), ignore_errors=True)
+        return self
+
+    def configure(self, cmake: CMakeInst, configure: cc.CMakeConfigure) -> int:
+        """
+            Configures with the stored results: seeds them, invokes the configure,
+            validates the compilers and harvests the new results.
+            When the compilers do not match, the seeded entries are removed from
+            the cache and the configure runs again without them.
+            Returns the return code of the configure.
+        """
+
+        key = self.key(cmake, configure)
+        record = self.__match(key, compilers(CMakeCache(cfp.builddir(configure))))
+        seeded = self.seed(cmake, configure)
+
+        cmake.invoke(configure)
+        if cmake.lastreturncode == 0 and seeded > 0 and \
+                not self.validate(cmake, configure, record['compilers']):
+            cache = CMakeCache(cfp.builddir(configure))
+            part = os.path.join(cfp.builddir(configure), cfp.FINGERPRINT_DIR,
+                                SEED_NAME + '.cmake')
+            for name in self.__unseed(part):
+                cache.remove(name)
+            cache.write()
+
+            cmake.invoke(configure)
+
+        if cmake.lastreturncode == 0:
+            self.harvest(cmake, configure)
+
+        return cmake.lastreturncode
+
+    def __path(self, key: str, name: str) -> str:
+        return os.path.join(self.storedir, key, name + '.json')
+
+    def __load(self, key: str, name: str) -> dict:
+        try:
+            with open(self.__path(key, name), 'r', encoding='utf-8') as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return None
+
+    def __store(self, key: str, name: str, record: dict):
+        path = self.__path(key, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmppath = f'{path}.{os.getpid()}.tmp'
+        with open(tmppath, 'w', encoding='utf-8') as fh:
+            json.dump(record, fh, indent=1, sort_keys=True)
+        os.replace(tmppath, path)
+
+    def __match(self, key: str, configured: dict[str, str]) -> dict:
+        # The record of the compilers a build dir was configured with, or when it
+        # was not, the only one whose compilers are all present and unchanged here.
+        if len(configured) > 0:
+            return self.__load(key, variant(configured))
+
+        try:
+            names = sorted(os.listdir(os.path.join(self.storedir, key)))
+        except OSError:
+            return None
+
+        matches = []
+        for name in names:
+            record = None
+            if name.endswith('.json'):
+                record = self.__load(key, name[:-len('.json')])
+            if record is None:
+                continue
+
+            if all(cfp.statdigest(path) == digest
+                   for path, digest in record.get('compilers', {}).items()):
+                matches.append(record)
+
+        if len(matches) == 1:
+            return matches[0]
+
+        if len(matches) > 1:
+            internal_logger.log(f'{len(matches)} check result records of {key} match the '
+                                'compilers here, not seeding any.', internal_logger.WARN)
+        elif len(names) > 0:
+            internal_logger.log(f'The compilers of the check results {key} differ here, '
+                                'not seeding them.', internal_logger.WARN)
+        return None
+
+    @staticmethod
+    def __unseed(script: str) -> list[str]:
+        # Empties a seed script and returns the names it set.
+        with open(script, 'r', encoding='utf-8') as fh:
+            lines = fh.read().splitlines()
+
+        names = [line[4:].split(' ', 1)[0] for line in lines if line.startswith('set(')]
+        with open(script, 'w', encoding='utf-8') as fh:
+            fh.write('\n'.join(line for line in lines if not line.startswith('set(')) + '\n')
+
+        return names
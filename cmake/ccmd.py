@@ -8,13 +8,63 @@
     Contains the commands that are passed to cmake.
 """
 
+import dataclasses
+import os
+
 from abc import ABC, abstractmethod
+from types import MappingProxyType
 
-from cmake.cbasic import CMakeValType, CMakeValue
+from cmake.cbasic import CMakeValType, CMakeValue, compatible, pathsgeneration
+from cmake import cfingerprint as cfp
 from cmake import coptions as ops
 from cmake.coptions import CMakeBaseOption
 
-from cmakeutils.typecheck import isdict
+from cmakeutils import tracing
+
+
+class CMakeCommandSchema:
+    """
+        The options of a command class, built once per class from get_options():
+        the options in order, their position by (lowercase) name and the value
+        types each option accepts.
+    """
+
+    __slots__ = ('options', 'defaults', 'index', 'positions', 'accepts')
+
+    def __init__(self, options: dict[ops.CMakeBaseOption, CMakeValue]):
+        self.options = tuple(options)
+        self.defaults = tuple(options.values())
+        self.index = {option.name.lower(): n for n, option in enumerate(self.options)}
+        self.positions = {id(option): n for n, option in enumerate(self.options)}
+        self.accepts = tuple(
+            frozenset(vtype for vtype in CMakeValType if compatible(option.type, vtype))
+            for option in self.options
+        )
+
+    def find(self, key: str) -> int:
+        """
+            Returns the position of an option by name.
+        """
+
+        position = self.index.get(key)
+        if position is None:
+            position = self.index.get(key.lower())
+            if position is None:
+                raise KeyError('option not found: ' + key)
+
+        return position
+
+    def check(self, position: int, value: CMakeValue):
+        """
+            Raises ValueError if a value does not fit the option at a position.
+        """
+
+        if value is not None and value.type not in self.accepts[position]:
+            option = self.options[position]
+            raise ValueError('Incompatible types between option ' + option.name +
+                             f'({option.type}) and value ({value.type}).')
+
+__schemas__: dict[type, CMakeCommandSchema] = {}
 
 class CMakeCommand(ABC):
     """
@@ -22,46 +72,57 @@ class CMakeCommand(ABC):
 
         Not all options are implemented in every command, only some that are "main".
         Option values are passed into the constructor as a name/value dictionary.
+
+        The options of each command class are read once (see schema) and the values
+        are kept by position. The arguments of each option are compiled once and kept
+        until its value changes.
+        A frozen command (see freeze) can't be changed, keeps its whole argument list and
+        is equal to (and hashes like) the frozen commands with the same type and values;
+        with_() derives a changed copy that only compiles the changed options.
+        Unfrozen commands compare and hash by identity, so their hash changes when they
+        are frozen: freeze a command before using it as a key.
     """
 
-    commandName: str
-    __options__: dict[ops.CMakeBaseOption, CMakeValue] = None
+    __slots__ = ('frozen', '__schema', '__values', '__compiled', '__argv', '__generation')
+
+    commandName = None
 
     def __init__(self, **kwargs):
-        self.__options__ = self.get_options()
+        schema = __schemas__.get(type(self))
+        if schema is None:
+            schema = __schemas__.setdefault(type(self), CMakeCommandSchema(self.get_options()))
+        values = list(schema.defaults)
 
         for key, val in kwargs.items():
-            for def_op in self.__options__.keys():
-                if key == def_op.name:
-                    if isinstance(val, dict):
-                        val2 = {}
-                        for k1, v1 in val.items():
-                            val2[k1] = CMakeValue(v1)
-                    else:
-                        val2 = val
-                    value = CMakeValue(val2)
-                    if def_op.type != value.type:
-                        raise ValueError(f'Incompatible types between value ({value.type})' +
-                                         f'and option {def_op.name} ({def_op.type})')
-                    self.__options__[def_op] = value
-
+            position = schema.index.get(key)
+            if position is not None:
+                value = self.__tovalue(val)
+                schema.check(position, value)
+                values[position] = value
 
+        self.__setparts(schema, values, [None] * len(values), False, pathsgeneration())
 
     @abstractmethod
     def get_options(self) -> dict[ops.CMakeBaseOption,]:
         """
             Returns a dictionary containing the command options to be assigned.
+            It is read once per command class, by its first instance (see schema).
         """
 
+    def schema(self) -> CMakeCommandSchema:
+        """
+            Returns the option schema of the command class.
+        """
+
+        return self.__schema
+
     def validate(self):
         """
             Validates the values assigned to the options.
         """
-        for option, value in self.__options__.items():
-            if value is not None:
-                if value.type != option.type:
-                    raise ValueError('Invalid value type for option "' + option.name + '": '
-                                     + value.type)
+        with tracing.span('CMakeCommand.validate', command=self.commandName):
+            for position, value in enumerate(self.__values):
+                self.__schema.check(position, value)
 
     def compile(self) -> list[str]:
         """
@@ -69,48 +130,170 @@ class CMakeCommand(ABC):
             to be passed to the executable.
         """
 
-        _args = []
-        for option, value in self.__options__.items():
-            compval = list(option.compile(value))
-            _args += compval
+        self.__checkpaths()
+        if self.__argv is not None:
+            return list(self.__argv)
+
+        with tracing.span('CMakeCommand.compile', command=self.commandName):
+            _args = []
+            for option, value in zip(self.__schema.options, self.__values):
+                _args += self.compileoption(option, value)
+
+            if self.frozen and self.__cacheable():
+                self.__argv = tuple(_args)
 
         return _args
 
-    def __getitem__(self, key: str) -> str | bool | dict[str, CMakeValue]:
-        if not isinstance(key, str):
-            raise ValueError('key must be a str.')
+    def compileoption(self, option: ops.CMakeBaseOption, value: CMakeValue) -> list[str]:
+        """
+            Returns the arguments of an option, compiled at most once per value.
+        """
 
-        selop = None
-        for option in self.__options__:
-            if option.name.lower() == key.lower():
-                selop = option
-                break
+        self.__checkpaths()
+        position = self.__schema.positions.get(id(option))
+        if position is not None:
+            compiled = self.__compiled[position]
+            if compiled is not None:
+                return compiled
 
-        if selop is None:
-            raise KeyError('option not found: ' + key)
+        compiled = option.compile(value)
+        compiled = [compiled] if isinstance(compiled, str) else list(compiled)
 
-        opvalue = self.__options__[selop]
-        return None if opvalue is None else opvalue.value
+        if position is not None and option.cacheable(value):
+            self.__compiled[position] = compiled
 
-    def __setitem__(self, key, value):
-        if not isinstance(value, (str, bool)) and not isdict(value, str, CMakeValue):
-            raise ValueError('value must be a str, bool or dict[str, str].')
+        return compiled
 
-        selop = None
-        for option in self.__options__:
-            if option.name.lower() == key.lower():
-                selop = option
-                break
+    def freeze(self):
+        """
+            Makes the command immutable (and hashable by value). Returns the command.
+        """
+
+        self.frozen = True
+        return self
+
+    def with_(self, **kwargs):
+        """
+            Returns a copy of the command with some option values changed
+            (by option name, like the constructor). The copy keeps the compiled
+            arguments of the other options and is frozen if this command is.
+        """
+
+        schema = self.__schema
+        values = list(self.__values)
+        compiled = list(self.__compiled)
+
+        for key, val in kwargs.items():
+            position = schema.find(key)
+            value = self.__tovalue(val)
+            schema.check(position, value)
+            values[position] = value
+            compiled[position] = None
+
+        return type(self).__fromparts(schema, values, compiled, self.frozen, self.__generation)
+
+    def key(self) -> tuple:
+        """
+            Returns a hashable description of the command (its type and option values,
+            with the type of the values declared with one).
+        """
+
+        def __describe(value: CMakeValue):
+            if value is None:
+                return None
+            if value.declared:
+                return (value.value, value.type.name)
+            return value.value
+
+        values = []
+        for option, value in zip(self.__schema.options, self.__values):
+            if value is not None and value.type == CMakeValType.VARDICT:
+                values.append((option.name, tuple(sorted(
+                    (name, __describe(val)) for name, val in value.value.items()
+                ))))
+            else:
+                values.append((option.name, __describe(value)))
+
+        return (type(self).__name__, tuple(values))
 
-        if selop is None:
-            raise KeyError('option not found: ' + key)
+    def __eq__(self, __value: object) -> bool:
+        if not isinstance(__value, CMakeCommand):
+            return False
+        if not (self.frozen and __value.frozen):
+            # Commands that can still change compare (and hash) by identity
+            return self is __value
 
-        val = CMakeValue(value)
-        if selop.type != val.type:
-            raise ValueError('Incompatible types between option ' + selop.name +
-                             f'({selop.type}) and value ({val.type}).')
+        return self.key() == __value.key()
 
-        self.__options__[selop] = val
+    def __hash__(self) -> int:
+        if not self.frozen:
+            return object.__hash__(self)
+
+        return hash(self.key())
+
+    def __getitem__(self, key: str) -> str | bool | MappingProxyType:
+        if not isinstance(key, str):
+            raise ValueError('key must be a str.')
+
+        opvalue = self.__values[self.__schema.find(key)]
+        if opvalue is None:
+            return None
+
+        return opvalue.value
+
+    def __setitem__(self, key, value):
+        if self.frozen:
+            raise dataclasses.FrozenInstanceError('Cannot change a frozen command, use with_().')
+        position = self.__schema.find(key)
+
+        val = self.__tovalue(value)
+        self.__schema.check(position, val)
+
+        self.__values[position] = val
+        self.__compiled[position] = None
+
+    @classmethod
+    def __fromparts(cls, schema: CMakeCommandSchema, values: list[CMakeValue],
+                    compiled: list[list[str]], frozen: bool, generation: int):
+        command = cls.__new__(cls)
+        command.__setparts(schema, values, compiled, frozen, generation)
+        return command
+
+    def __setparts(self, schema: CMakeCommandSchema, values: list[CMakeValue],
+                   compiled: list[list[str]], frozen: bool, generation: int):
+        self.frozen = frozen
+        self.__schema = schema
+        self.__values = values
+        self.__compiled = compiled
+        self.__argv = None
+        self.__generation = generation
+
+    def __checkpaths(self):
+        # Variables are compiled with the path kinds of resolve(): once clearpaths()
+        # forgets them, a STRING may have become a FILEPATH (or the other way round).
+        generation = pathsgeneration()
+        if generation == self.__generation:
+            return
+
+        for position, value in enumerate(self.__values):
+            if value is not None and value.type == CMakeValType.VARDICT:
+                self.__compiled[position] = None
+                self.__argv = None
+        self.__generation = generation
+
+    def __cacheable(self) -> bool:
+        return all(option.cacheable(value)
+                   for option, value in zip(self.__schema.options, self.__values))
+
+    @staticmethod
+    def __tovalue(val) -> CMakeValue:
+        if isinstance(val, CMakeValue):
+            return val
+        if isinstance(val, dict):
+            val = {k1: v1 if isinstance(v1, CMakeValue) else CMakeValue(v1)
+                   for k1, v1 in val.items()}
+
+        return CMakeValue(val)
 
 class CMakeConfigure(CMakeCommand):
     """
@@ -131,12 +314,16 @@ class CMakeConfigure(CMakeCommand):
 
         'variables': (Optional) A dictionary of variables to set.
         'remove_vars': (Optional) A dictionary of variables to unset. (Set value to None by default)
+        'job_pools': (Optional) Size the Ninja compile/link job pools from the cpus and the
+                     available memory. Only used by Ninja generators. (default: False)
 
         There are more options besides these, 
         see https://cmake.org/cmake/help/latest/manual/cmake.1.html and 
         pass by calling the invoke method.
     """
 
+    __slots__ = ()
+
     commandName: str = 'configure'
     __generators__ = [
         'Ninja', 
@@ -173,9 +360,21 @@ class CMakeConfigure(CMakeCommand):
                                           '{option}{ssp}{value}', CMakeValType.STRING): None,
 
             ops.CMakeVariablesOption(): None,
-            ops.CMakeVariablesOption(True): None
+            ops.CMakeVariablesOption(True): None,
+            ops.CMakeJobPoolsOption(): None
         }
 
+    def compileoption(self, option: ops.CMakeBaseOption, value: CMakeValue) -> list[str]:
+        if isinstance(option, ops.CMakeJobPoolsOption):
+            generator = self['generator']
+            if generator is not None and 'Ninja' not in str(generator):
+                return []
+        if isinstance(option, ops.CMakeVariablesOption) and not option.cacheable(value):
+            # Spilled variables are written next to the fingerprint, in the build dir
+            return option.compile(value, os.path.join(cfp.builddir(self), cfp.FINGERPRINT_DIR))
+
+        return super().compileoption(option, value)
+
 class CMakeBuildCommand(CMakeCommand):
     """
         Implementation of the build command.
@@ -186,6 +385,7 @@ class CMakeBuildCommand(CMakeCommand):
         'build_path': Project binary directory to be built. (default: '.')
 
         'max_jobs': (Optional) The maximum number of concurrent processes to use when building.
+                    Use 'auto' to derive it from the cpus and the available memory.
         'configuration': (Optional) For multi-configuration tools, choose configuration.
         'verbose': (Optional) Enable verbose output if supported.
 
@@ -194,6 +394,8 @@ class CMakeBuildCommand(CMakeCommand):
         pass by calling the invoke method.
     """
 
+    __slots__ = ()
+
     commandName: str = 'build'
 
     def get_options(self) -> dict[ops.CMakeBaseOption,]:
@@ -201,8 +403,7 @@ class CMakeBuildCommand(CMakeCommand):
             ops.CMakeSimpleOption('build_path', '--build',
                                   '{option}{ssp}{q}{value}{q}', CMakeValType.STRING, '.'): None,
 
-            ops.CMakeOptionalSimpleOption('max_jobs', '-j',
-                                          '{option}{ssp}{value}', CMakeValType.STRING): None,
+            ops.CMakeJobsOption('max_jobs', '-j', '{option}{ssp}{value}'): None,
 
             ops.CMakeOptionalSimpleOption('configuration', '--config',
                                           '{option}{ssp}{value}', CMakeValType.STRING): None,
@@ -230,6 +431,9 @@ class CMakeInstallCommand(CMakeCommand):
         'verbose': (Optional) Enable verbose output.
         'strip': (Optional) Strip before installing.
     """
+
+    __slots__ = ()
+
     commandName: str = 'install'
 
     def get_options(self) -> dict[CMakeBaseOption,]:
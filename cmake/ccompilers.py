@@ -0,0 +1,301 @@
+"""
+   pycmake Compiler Identification Cache
+
+   Copyright (C) 2023 jppgmx
+   Licensed under MIT License
+
+   Skips compiler identification and ABI detection on fresh build dirs.
+   After a configure, the platform files CMake generated
+   (CMakeFiles/<version>/CMakeSystem.cmake, CMake<LANG>Compiler.cmake and the
+   ABI binaries) are captured into a store, keyed by the cmake version, the
+   compilers (path and binary digest) and the target and flag selection that
+   changes what is detected (the variables and environment cchecks keys on,
+   and PATH). Before the configure of a fresh build dir they are copied back
+   and CMAKE_PLATFORM_INFO_INITIALIZED is seeded, so CMake loads them instead
+   of detecting the compilers again.
+   Compilers found by CMake (not given explicitly) may differ between the
+   machines sharing a store, so a key holds one record per set of compilers
+   and a machine only uses the record of the compilers it has; when the
+   compilers of several records are present, none is used, as the one CMake
+   would find can not be told.
+"""
+
+import glob
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+import uuid
+
+from cmakeutils import logging as internal_logger
+
+from cmake import ccmd as cc
+from cmake import cchecks
+from cmake import cconstants as cconst
+from cmake import cfingerprint as cfp
+from cmake.ccache import CMakeCache
+from cmake.cinstance import CMakeInst
+
+SEED_NAME = 'compiler-id'
+FILES_DIR = 'files'
+RECORD_FILE = 'record.json'
+
+# Platform files worth keeping (the CompilerId* dirs are not read back)
+PLATFORM_FILES = ('CMakeSystem.cmake', 'CMake*Compiler.cmake', 'CMakeDetermineCompilerABI_*.bin')
+
+COMPILER_VAR = re.compile(r'^CMAKE_([A-Za-z0-9]+)_COMPILER$')
+
+# Cache entries of the tools found with the compilers, restored along with them
+TOOL_VARS = re.compile(r'^CMAKE_(([A-Za-z0-9]+_)?COMPILER(_AR|_RANLIB)?|AR|RANLIB|LINKER|NM|'
+                       r'OBJCOPY|OBJDUMP|READELF|STRIP|ADDR2LINE|DLLTOOL|MT|'
+                       r'EXECUTABLE_FORMAT|UNAME)$')
+
+# Environment that selects the compilers and what they target
+KEY_ENVIRON = cchecks.KEY_ENVIRON | {'RC', 'PATH'}
+
+def explicitcompilers(configure: cc.CMakeConfigure) -> dict[str, str]:
+    """
+        Returns the compilers a configure sets explicitly (CMAKE_<LANG>_COMPILER), by variable.
+    """
+
+    variables = configure['variables'] or {}
+    return {
+        name: str(val.value) for name, val in variables.items()
+        if COMPILER_VAR.match(name) is not None
+    }
+
+def platformdir(build: str, version: str) -> str:
+    """
+        Returns the platform dir of a build dir (CMakeFiles/<version>).
+    """
+
+    return os.path.join(build, 'CMakeFiles', version)
+
+def platformfiles(build: str, version: str) -> list[str]:
+    """
+        Lists the platform files worth keeping of a configured build dir.
+    """
+
+    source = platformdir(build, version)
+    files = []
+    for pattern in PLATFORM_FILES:
+        files += glob.glob(os.path.join(glob.escape(source), pattern))
+
+    return files
+
+def toolentries(cache: CMakeCache) -> tuple[dict[str, list], dict[str, str]]:
+    """
+        Returns the cache entries of the tools of a configured cache, by name,
+        and the digests of its compilers, by path.
+    """
+
+    tools = {}
+    compilers = {}
+    for name, entry in cache.entries.items():
+        if TOOL_VARS.match(name) is None:
+            continue
+        tools[name] = [entry.type, entry.value, entry.help]
+        if COMPILER_VAR.match(name) is not None and os.path.isfile(entry.value):
+            compilers[os.path.abspath(entry.value)] = cfp.statdigest(entry.value)
+
+    return (tools, compilers)
+
+class CMakeCompilerCache:
+    """
+        Store of compiler identification results.
+
+        'storedir': Directory of the store.
+    """
+
+    storedir: str
+
+    def __init__(self, storedir: str):
+        self.storedir = os.path.abspath(storedir)
+        os.makedirs(self.storedir, exist_ok=True)
+
+    def key(self, cmake: CMakeInst, configure: cc.CMakeConfigure,
+            environ: dict[str, str] = None) -> str:
+        """
+            Computes the store key of a configure: cmake version, generator,
+            toolchain file, the compilers it selects and the compiler, flag, sysroot
+            and target system selection of the variables and environment (PATH
+            included). Compilers given in CMAKE_C_COMPILER/CMAKE_CXX_COMPILER (or
+            another language) are keyed by path and binary digest; compilers found
+            by CMake are validated against the digests of the record.
+        """
+
+        environ = cmake.environ if environ is None else environ
+        variables = configure['variables'] or {}
+        toolchain = configure['toolchain']
+
+        selected = {}
+        for name, value in sorted(explicitcompilers(configure).items()):
+            path = shutil.which(value) or value
+            selected[name] = [path, cfp.statdigest(path)]
+
+        components = {
+            'cmake': [cmake.executablepath, cmake.version],
+            'generator': [configure['generator'], configure['platform_name'],
+                          configure['toolset_spec']],
+            'toolchain': None if toolchain is None else cfp.filedigest(toolchain),
+            'compilers': selected,
+            'variables': {
+                name: str(val.value) for name, val in sorted(variables.items())
+                if cchecks.KEY_VARIABLES.match(name) is not None
+            },
+            'env': {name: val for name, val in sorted(environ.items()) if name in KEY_ENVIRON}
+        }
+        encoded = json.dumps(components, sort_keys=True).encode('utf-8')
+
+        return hashlib.sha256(encoded).hexdigest()
+
+    def capture(self, cmake: CMakeInst, configure: cc.CMakeConfigure) -> bool:
+        """
+            Stores the platform files of a configured build dir, as the record of
+            its compilers. Records of other compilers are kept.
+            Returns False if there is nothing to capture or it is already stored.
+        """
+
+        build = cfp.builddir(configure)
+        cache = CMakeCache(build)
+        files = platformfiles(build, cmake.version)
+        if len(files) == 0 or len(cache) == 0:
+            return False
+
+        tools, compilers = toolentries(cache)
+        if len(compilers) == 0:
+            return False
+
+        key = self.key(cmake, configure)
+        entry = self.__entry(key, cchecks.variant(compilers))
+        if os.path.isdir(entry):
+            return False
+
+        staging = os.path.join(self.storedir, f'.{key}.{uuid.uuid4().hex}')
+        os.makedirs(os.path.join(staging, FILES_DIR))
+        try:
+            for path in files:
+                shutil.copy2(path, os.path.join(staging, FILES_DIR))
+
+            record = {'compilers': compilers, 'tools': tools, 'version': cmake.version,
+                      'files': sorted(os.path.basename(path) for path in files),
+                      'created': time.time()}
+            with open(os.path.join(staging, RECORD_FILE), 'w', encoding='utf-8') as fh:
+                json.dump(record, fh, indent=1)
+
+            os.makedirs(os.path.dirname(entry), exist_ok=True)
+            try:
+                os.rename(staging, entry)
+            except OSError:
+                # Another process captured it first
+                return False
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+        internal_logger.log(f'Captured the compiler identification {key} ({len(files)} files)')
+        return True
+
+    def seed(self, cmake: CMakeInst, configure: cc.CMakeConfigure) -> bool:
+        """
+            Seeds a fresh build dir (no CMakeCache.txt yet) with the platform files
+            of the store: the record whose compilers are all present, unchanged, here.
+            Nothing is seeded when several records match.
+            Returns True if the build dir was seeded.
+        """
+
+        build = cfp.builddir(configure)
+        if os.path.isfile(os.path.join(build, 'CMakeCache.txt')):
+            return False
+
+        key = self.key(cmake, configure)
+        entry, record = self.__match(key)
+        if record is None:
+            return False
+
+        target = platformdir(build, cmake.version)
+        os.makedirs(target, exist_ok=True)
+        try:
+            for name in record['files']:
+                shutil.copy2(os.path.join(entry, FILES_DIR, name), target)
+        except OSError as err:
+            internal_logger.log(f'Could not seed the compiler identification: {err}',
+                                internal_logger.WARN)
+            shutil.rmtree(target, ignore_errors=True)
+            return False
+
+        lines = [f'set({cconst.CMAKE_PLATFORM_INFO_INITIALIZED} 1 CACHE INTERNAL "")']
+        for name, (vtype, value, helpstr) in sorted(record['tools'].items()):
+            lines.append(f'set({name} {cfp.cmakestring(value)} CACHE {vtype} '
+                         f'{cfp.cmakestring(helpstr or "")})')
+        cfp.seedscript(configure, SEED_NAME, lines)
+
+        internal_logger.log(f'Seeded the compiler identification {key} into {target}')
+        return True
+
+    def invalidate(self, key: str):
+        """
+            Removes the stored identifications of a key (every compiler set).
+        """
+
+        entry = os.path.join(self.storedir, key)
+        if os.path.isdir(entry):
+            trash = os.path.join(self.storedir, f'.{key}.{uuid.uuid4().hex}')
+            try:
+                os.rename(entry, trash)
+            except OSError:
+                return self
+            shutil.rmtree(trash, ignore_errors=True)
+
+        return self
+
+    def configure(self, cmake: CMakeInst, configure: cc.CMakeConfigure) -> int:
+        """
+            Configures with the stored identification: seeds a fresh build dir,
+            invokes the configure and captures the platform files when they were
+            not seeded. Returns the return code of the configure.
+        """
+
+        seeded = self.seed(cmake, configure)
+
+        cmake.invoke(configure)
+        if cmake.lastreturncode == 0 and not seeded:
+            self.capture(cmake, configure)
+
+        return cmake.lastreturncode
+
+    def __entry(self, key: str, name: str) -> str:
+        return os.path.join(self.storedir, key, name)
+
+    def __match(self, key: str) -> tuple[str, dict]:
+        try:
+            names = sorted(os.listdir(os.path.join(self.storedir, key)))
+        except OSError:
+            return (None, None)
+
+        matches = []
+        for name in names:
+            entry = self.__entry(key, name)
+            try:
+                with open(os.path.join(entry, RECORD_FILE), 'r', encoding='utf-8') as fh:
+                    record = json.load(fh)
+            except (OSError, ValueError):
+                continue
+
+            if all(cfp.statdigest(path) == digest
+                   for path, digest in record['compilers'].items()):
+                matches.append((entry, record))
+
+        if len(matches) == 1:
+            (entry, record) = matches[0]
+            return (entry, record)
+
+        if len(matches) == 0:
+            internal_logger.log(f'No compiler identification of {key} matches the compilers '
+                                'here.', internal_logger.WARN)
+        else:
+            # Seeding one would pin its compilers over the ones CMake would find
+            internal_logger.log(f'{len(matches)} compiler identifications of {key} match the '
+                                'compilers here, not seeding any.', internal_logger.WARN)
+        return (None, None)
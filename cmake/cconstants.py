@@ -20,6 +20,7 @@ CMAKE_CXX_COMPILER = 'CMAKE_CXX_COMPILER'
 CMAKE_MAKE_PROGRAM = 'CMAKE_MAKE_PROGRAM'
 CMAKE_AR = 'CMAKE_AR'
 CMAKE_BUILD_TYPE = 'CMAKE_BUILD_TYPE'
+CMAKE_PLATFORM_INFO_INITIALIZED = 'CMAKE_PLATFORM_INFO_INITIALIZED'
 
 class Configuration(Enum):
     """
@@ -0,0 +1,313 @@
+"""
+   pycmake File API client
+
+   Copyright (C) 2023 jppgmx
+   Licensed under MIT License
+
+   Writes CMake File API queries into a build dir before a configure
+   and reads the replies afterwards. Reply objects are parsed lazily,
+   only when they are first used, and replies are cached by their index file
+   so repeated lookups don't parse the JSON again.
+"""
+
+import glob
+import json
+import os
+import threading
+
+from cmake.ccache import CMakeCacheEntry
+
+API_DIR = os.path.join('.cmake', 'api', 'v1')
+CLIENT = 'pycmake'
+
+CODEMODEL = ('codemodel', 2)
+CACHE = ('cache', 2)
+CMAKEFILES = ('cmakeFiles', 1)
+TOOLCHAINS = ('toolchains', 1)
+
+DEFAULT_KINDS = [CODEMODEL, CACHE, CMAKEFILES, TOOLCHAINS]
+
+class CMakeFileApiReply: # pylint: disable-msg=R0902
+    """
+        A reply of the File API, read from its index file.
+
+        Only the index is parsed on construction; the objects and every
+        target are parsed on first use and kept, and so are the indexes of
+        the targets by name, the directories by path and the targets by source
+        of each configuration. The codemodel lookups raise KeyError when CMake
+        did not produce a codemodel.
+    """
+
+    replydir: str
+    indexfile: str
+    index: dict
+
+    def __init__(self, replydir: str, indexfile: str):
+        self.replydir = replydir
+        self.indexfile = indexfile
+        self.index = self.__loadjson(indexfile)
+
+        self.__lock = threading.RLock()
+        self.__objects: dict[str, dict] = {}
+        self.__targets: dict[str, dict] = {}
+        self.__byname: dict[str, dict[str, str]] = {}
+        self.__bydirectory: dict[str, dict[str, dict]] = {}
+        self.__bysource: dict[str, dict[str, list[str]]] = {}
+
+    def object(self, kind: str) -> dict:
+        """
+            Returns the reply object of a kind (codemodel, cache, cmakeFiles, toolchains),
+            or None if CMake did not produce it.
+        """
+
+        with self.__lock:
+            if kind not in self.__objects:
+                jsonfile = None
+                for obj in self.index.get('objects', []):
+                    if obj.get('kind') == kind:
+                        jsonfile = obj.get('jsonFile')
+                        break
+
+                self.__objects[kind] = None if jsonfile is None else self.__loadjson(jsonfile)
+
+            return self.__objects[kind]
+
+    def configuration(self, name: str = None) -> dict:
+        """
+            Returns a configuration of the codemodel (the first one by default).
+        """
+
+        configs = self.__codemodel().get('configurations', [])
+        for config in configs:
+            if name is None or config.get('name') == name:
+                return config
+
+        raise KeyError('Configuration not found: ' + str(name))
+
+    def targetnames(self, config: str = None) -> list[str]:
+        """
+            Returns the names of the targets, without parsing the target objects.
+        """
+
+        return [target['name'] for target in self.configuration(config).get('targets', [])]
+
+    def target(self, name: str, config: str = None) -> dict:
+        """
+            Returns the target object of a target.
+        """
+
+        with self.__lock:
+            if config not in self.__byname:
+                self.__byname[config] = {
+                    target['name']: target['jsonFile']
+                    for target in self.configuration(config).get('targets', [])
+                }
+
+        jsonfile = self.__byname[config].get(name)
+        if jsonfile is None:
+            raise KeyError('Target not found: ' + name)
+
+        return self.__target(jsonfile)
+
+    def directory(self, path: str, config: str = None) -> dict:
+        """
+            Returns the codemodel entry of a directory, by source or build path,
+            with the names of its targets under 'targetNames'.
+        """
+
+        with self.__lock:
+            if config not in self.__bydirectory:
+                self.__bydirectory[config] = self.__indexdirectories(config)
+
+        directory = self.__bydirectory[config].get(os.path.normcase(os.path.abspath(path)))
+        if directory is None:
+            raise KeyError('Directory not found: ' + path)
+
+        result = dict(directory)
+        result['targetNames'] = list(directory['targetNames'])
+        return result
+
+    def targetsforsource(self, path: str, config: str = None) -> list[str]:
+        """
+            Returns the names of the targets that compile a source file.
+            The first call parses every target object to build the index.
+        """
+
+        with self.__lock:
+            if config not in self.__bysource:
+                self.__bysource[config] = self.__indexsources(config)
+
+        source = self.__codemodel().get('paths', {}).get('source', '')
+        key = os.path.normcase(os.path.abspath(os.path.join(source, path)))
+
+        return list(self.__bysource[config].get(key, []))
+
+    def cache(self) -> dict[str, CMakeCacheEntry]:
+        """
+            Returns the cache entries of the cache reply.
+        """
+
+        result = {}
+        reply = self.object(CACHE[0])
+        for entry in ([] if reply is None else reply.get('entries', [])):
+            props = {prop['name']: prop['value'] for prop in entry.get('properties', [])}
+            helpstr = props.pop('HELPSTRING', None)
+            result[entry['name']] = CMakeCacheEntry(entry['name'], entry['type'],
+                                                    entry['value'], helpstr, props)
+
+        return result
+
+    def cmakefiles(self, includeexternal: bool = True) -> list[str]:
+        """
+            Returns the absolute paths of the CMake input files.
+        """
+
+        reply = self.object(CMAKEFILES[0])
+        if reply is None:
+            return None
+
+        source = reply.get('paths', {}).get('source', '')
+        return [
+            os.path.normpath(os.path.join(source, fl['path']))
+            for fl in reply.get('inputs', [])
+            if includeexternal or not fl.get('isExternal', False)
+        ]
+
+    def toolchains(self) -> dict[str, dict]:
+        """
+            Returns the toolchains by language.
+        """
+
+        reply = self.object(TOOLCHAINS[0])
+        if reply is None:
+            return {}
+
+        return {tc['language']: tc for tc in reply.get('toolchains', [])}
+
+    def __target(self, jsonfile: str) -> dict:
+        with self.__lock:
+            if jsonfile not in self.__targets:
+                self.__targets[jsonfile] = self.__loadjson(jsonfile)
+            return self.__targets[jsonfile]
+
+    def __codemodel(self) -> dict:
+        codemodel = self.object(CODEMODEL[0])
+        if codemodel is None:
+            raise KeyError('The reply has no codemodel.')
+
+        return codemodel
+
+    def __indexdirectories(self, config: str) -> dict[str, dict]:
+        paths = self.__codemodel().get('paths', {})
+        configuration = self.configuration(config)
+        targets = configuration.get('targets', [])
+        index: dict[str, dict] = {}
+
+        for directory in configuration.get('directories', []):
+            entry = dict(directory)
+            entry['targetNames'] = [targets[i]['name'] for i in directory.get('targetIndexes', [])]
+            for root, kind in ((paths.get('source', ''), 'source'),
+                               (paths.get('build', ''), 'build')):
+                path = os.path.join(root, directory.get(kind, ''))
+                index.setdefault(os.path.normcase(os.path.abspath(path)), entry)
+
+        return index
+
+    def __indexsources(self, config: str) -> dict[str, list[str]]:
+        source = self.__codemodel().get('paths', {}).get('source', '')
+        index: dict[str, list[str]] = {}
+
+        for target in self.configuration(config).get('targets', []):
+            for src in self.__target(target['jsonFile']).get('sources', []):
+                key = os.path.normcase(os.path.abspath(os.path.join(source, src['path'])))
+                index.setdefault(key, []).append(target['name'])
+
+        return index
+
+    def __loadjson(self, jsonfile: str) -> dict:
+        with open(os.path.join(self.replydir, jsonfile), 'r', encoding='utf-8') as fh:
+            return json.load(fh)
+
+class CMakeFileApi:
+    """
+        File API client for a build dir.
+    """
+
+    builddir: str
+    client: str
+
+    def __init__(self, builddir: str, client: str = CLIENT):
+        self.builddir = os.path.abspath(builddir)
+        self.client = client
+
+    def querydir(self) -> str:
+        """
+            Returns the query directory.
+        """
+
+        return os.path.join(self.builddir, API_DIR, 'query')
+
+    def replydir(self) -> str:
+        """
+            Returns the reply directory.
+        """
+
+        return os.path.join(self.builddir, API_DIR, 'reply')
+
+    def writequeries(self, kinds: list[tuple[str, int]] = None, stateful: bool = True):
+        """
+            Writes the queries. Stateful queries go to the client's query.json,
+            stateless ones are empty <kind>-v<major> files shared by every client.
+        """
+
+        kinds = DEFAULT_KINDS if kinds is None else kinds
+
+        if stateful:
+            directory = os.path.join(self.querydir(), f'client-{self.client}')
+            os.makedirs(directory, exist_ok=True)
+
+            query = {'requests': [{'kind': kind, 'version': major} for kind, major in kinds]}
+            path = os.path.join(directory, 'query.json')
+            tmppath = f'{path}.{os.getpid()}.tmp'
+            with open(tmppath, 'w', encoding='utf-8') as fh:
+                json.dump(query, fh)
+            os.replace(tmppath, path)
+        else:
+            os.makedirs(self.querydir(), exist_ok=True)
+            for kind, major in kinds:
+                with open(os.path.join(self.querydir(), f'{kind}-v{major}'), 'w',
+                          encoding='utf-8'):
+                    pass
+
+        return self
+
+    def reply(self) -> CMakeFileApiReply:
+        """
+            Returns the latest reply, or None when CMake has not written one.
+            Replies are cached by index file, so this only parses a new index.
+        """
+
+        indexes = glob.glob(os.path.join(glob.escape(self.replydir()), 'index-*.json'))
+        if len(indexes) == 0:
+            return None
+
+        indexfile = os.path.basename(max(indexes))
+
+        with __cachelock__:
+            reply = __replies__.get(self.replydir())
+            if reply is None or reply.indexfile != indexfile:
+                reply = CMakeFileApiReply(self.replydir(), indexfile)
+                __replies__[self.replydir()] = reply
+
+        return reply
+
+# Latest reply of each reply dir
+__replies__: dict[str, CMakeFileApiReply] = {}
+__cachelock__ = threading.Lock()
+
+def latestreply(builddir: str) -> CMakeFileApiReply:
+    """
+        Returns the latest reply of a build dir, or None.
+    """
+
+    return CMakeFileApi(builddir).reply()
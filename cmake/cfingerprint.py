@@ -0,0 +1,395 @@
+"""
+   pycmake Configure Fingerprint
+
+   Copyright (C) 2023 jppgmx
+   Licensed under MIT License
+
+   Fingerprints everything a configure depends on: the option values,
+   the raw arguments, the relevant environment, the toolchain/initial cache
+   files (with the files a seeded initial cache includes) and every CMake
+   input file of the generated build system (from the File API cmakeFiles
+   reply when there is one).
+   The fingerprint of the last successful configure is stored in the build dir
+   so the next configure can be skipped when nothing changed.
+   Option values are hashed rather than the compiled arguments, which can
+   depend on the machine state (job pools sized from the free memory).
+"""
+
+import glob
+import hashlib
+import json
+import os
+import re
+
+from cmakeutils import logging as internal_logger
+from cmakeutils.treehash import TreeHasher, TreeDigest
+
+from cmake import cfileapi
+
+FINGERPRINT_DIR = '.pycmake'
+FINGERPRINT_FILE = 'configure-fingerprint.json'
+SEED_FILE = 'initial-cache.cmake'
+SEED_ORIGINAL = '# original: '
+SEED_PART = '# part: '
+
+# Environment variables that can change the result of a configure.
+ENV_NAMES = {
+    'PATH', 'CC', 'CXX', 'FC', 'ASM', 'RC', 'CUDACXX', 'HIPCXX', 'OBJC', 'OBJCXX',
+    'CFLAGS', 'CXXFLAGS', 'CPPFLAGS', 'LDFLAGS', 'FFLAGS', 'CUDAFLAGS', 'ASMFLAGS',
+    'INCLUDE', 'LIB', 'LIBPATH', 'SDKROOT', 'MACOSX_DEPLOYMENT_TARGET', 'DESTDIR'
+}
+ENV_PREFIXES = ('CMAKE_', 'PKG_CONFIG', 'VCPKG_', 'CONAN_', 'CCACHE_')
+
+def builddir(command) -> str:
+    """
+        Returns the build dir of a configure command.
+    """
+
+    value = command['build_dir']
+    return os.path.abspath('build' if value is None else value)
+
+def sourcedir(command) -> str:
+    """
+        Returns the source dir of a configure command.
+    """
+
+    value = command['source_dir']
+    return os.path.abspath('.' if value is None else value)
+
+def sourcedigest(command, hasher: TreeHasher = None) -> TreeDigest:
+    """
+        Hashes the content of the source dir of a configure command, leaving out
+        the build dir when it is inside. Pass a long-lived hasher to reuse its
+        stat cache between calls.
+    """
+
+    hasher = TreeHasher() if hasher is None else hasher
+    return hasher.hashtree(sourcedir(command), [builddir(command)])
+
+def configureenv(environ: dict[str, str]) -> dict[str, str]:
+    """
+        Returns the variables of an environment that can change the result
+        of a configure (ENV_NAMES and ENV_PREFIXES), sorted by name.
+    """
+
+    return {
+        key: val for key, val in sorted(environ.items())
+        if key.upper() in ENV_NAMES or key.upper().startswith(ENV_PREFIXES)
+    }
+
+def intact(build: str) -> bool:
+    """
+        Checks that the build dir contains a generated build system.
+    """
+
+    if not os.path.isfile(os.path.join(build, 'CMakeCache.txt')):
+        return False
+    if not os.path.isdir(os.path.join(build, 'CMakeFiles')):
+        return False
+
+    for generated in ('build.ninja', 'Makefile'):
+        if os.path.isfile(os.path.join(build, generated)):
+            return True
+
+    return len(glob.glob(os.path.join(glob.escape(build), '*.sln'))) > 0
+
+def filedigest(path: str) -> str:
+    """
+        Returns the sha256 of a file, or None if it can not be read.
+    """
+
+    digest = hashlib.sha256()
+    try:
+        with open(path, 'rb') as fh:
+            for block in iter(lambda: fh.read(1 << 16), b''):
+                digest.update(block)
+    except OSError:
+        return None
+
+    return digest.hexdigest()
+
+# Digests of statdigest, by path: ((size, mtime, inode), digest)
+__digests__: dict[str, tuple[tuple[int, int, int], str]] = {}
+
+def statdigest(path: str) -> str:
+    """
+        Returns the sha256 of a file like filedigest, remembered until the size,
+        mtime or inode of the file change. Meant for large files that are checked
+        often, such as compilers.
+    """
+
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+
+    stamp = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+    cached = __digests__.get(path)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+
+    digest = filedigest(path)
+    if digest is not None:
+        __digests__[path] = (stamp, digest)
+
+    return digest
+
+def inputfiles(build: str) -> list[str]:
+    """
+        Lists the CMake input files of the generated build system,
+        i.e. the files whose change makes the build system re-run cmake.
+    """
+
+    reply = None
+    try:
+        reply = cfileapi.latestreply(build)
+    except (OSError, ValueError) as err:
+        internal_logger.log(f'Ignoring the File API reply: {err}', internal_logger.WARN)
+
+    files = None if reply is None else reply.cmakefiles()
+    if files is None:
+        files = __makefileinputs(build)
+    if files is None:
+        files = __ninjainputs(build)
+    if files is None:
+        return []
+
+    return sorted({os.path.normpath(os.path.join(build, fl)) for fl in files})
+
+# One argument per component of the fingerprint
+def fingerprint(command, executablepath: str, version: str, # pylint: disable-msg=R0913,R0917
+                environ: dict[str, str],
+                inputs: list[str] = None, rawargs: list[str] = None) -> dict:
+    """
+        Computes the fingerprint of a configure command invoked with the
+        given raw arguments. The input files are read from the build dir when not given.
+    """
+
+    build = builddir(command)
+    inputs = inputfiles(build) if inputs is None else inputs
+
+    files = { path: filedigest(path) for path in initialcache(command) }
+    if command['toolchain'] is not None:
+        files[os.path.abspath(command['toolchain'])] = filedigest(command['toolchain'])
+
+    components = {
+        'cmake': [executablepath, version],
+        # Through JSON, so it compares equal to a loaded fingerprint
+        'options': json.loads(json.dumps(command.key())),
+        'rawargs': [] if rawargs is None else list(rawargs),
+        'env': configureenv(environ),
+        'files': files,
+        'inputs': { fl: filedigest(fl) for fl in inputs }
+    }
+    encoded = json.dumps(components, sort_keys=True).encode('utf-8')
+
+    return { 'digest': hashlib.sha256(encoded).hexdigest(), 'components': components }
+
+def load(build: str) -> dict:
+    """
+        Loads the fingerprint stored by the last successful configure, if any.
+    """
+
+    try:
+        with open(os.path.join(build, FINGERPRINT_DIR, FINGERPRINT_FILE),
+                  'r', encoding='utf-8') as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+def store(build: str, value: dict):
+    """
+        Stores a fingerprint in the build dir.
+    """
+
+    directory = os.path.join(build, FINGERPRINT_DIR)
+    os.makedirs(directory, exist_ok=True)
+
+    path = os.path.join(directory, FINGERPRINT_FILE)
+    tmppath = f'{path}.{os.getpid()}.tmp'
+    with open(tmppath, 'w', encoding='utf-8') as fh:
+        json.dump(value, fh, indent=1)
+    os.replace(tmppath, path)
+
+def seedscript(command, name: str, lines: list[str]) -> str:
+    """
+        Writes a part of the initial cache (-C script) pycmake seeds a configure with,
+        as <build>/.pycmake/<name>.cmake, and points 'initial_cache' at a script that
+        includes the initial cache given by the user first, then every part.
+        Returns the path of the part.
+    """
+
+    directory = os.path.join(builddir(command), FINGERPRINT_DIR)
+    os.makedirs(directory, exist_ok=True)
+
+    script = os.path.join(directory, SEED_FILE)
+    part = os.path.join(directory, name + '.cmake')
+    original = command['initial_cache']
+    parts = []
+
+    if original is not None and os.path.abspath(original) == script:
+        (original, parts) = __seeded(script)
+
+    with open(part, 'w', encoding='utf-8') as fh:
+        fh.write('\n'.join(['# Seeded by pycmake, do not edit.'] + lines) + '\n')
+
+    if part not in parts:
+        parts.append(part)
+
+    content = ['# Initial cache seeded by pycmake, do not edit.']
+    if original is not None:
+        original = os.path.abspath(original)
+        content += [SEED_ORIGINAL + original, f'include("{cmakepath(original)}")']
+    for path in parts:
+        content += [SEED_PART + path, f'include("{cmakepath(path)}" OPTIONAL)']
+
+    with open(script, 'w', encoding='utf-8') as fh:
+        fh.write('\n'.join(content) + '\n')
+
+    command['initial_cache'] = script
+    return part
+
+def initialcache(command) -> list[str]:
+    """
+        Lists the files of the initial cache (-C script) of a configure: the script
+        and, when it is the one pycmake seeds (see seedscript), the initial cache
+        given by the user and every part it includes.
+    """
+
+    value = command['initial_cache']
+    if value is None:
+        return []
+
+    script = os.path.abspath(value)
+    if script != os.path.join(builddir(command), FINGERPRINT_DIR, SEED_FILE):
+        return [script]
+
+    (original, parts) = __seeded(script)
+    return [script] + ([] if original is None else [original]) + parts
+
+def cmakepath(path: str) -> str:
+    """
+        Escapes a path for a quoted CMake argument (forward slashes).
+    """
+
+    return path.replace('\\', '/').replace('"', '\\"').replace('$', '\\$')
+
+def cmakestring(value: str) -> str:
+    """
+        Quotes a string as a CMake argument.
+    """
+
+    escaped = value.replace('\\', '\\\\').replace('"', '\\"').replace('$', '\\$')
+    return f'"{escaped}"'
+
+def changes(old: dict, new: dict) -> list[str]:
+    """
+        Describes the differences between two fingerprints.
+    """
+
+    if old is None:
+        return ['no previous successful configure']
+    if old.get('digest') == new['digest']:
+        return []
+
+    before = old.get('components', {})
+    after = new['components']
+    reasons = []
+
+    if before.get('cmake') != after['cmake']:
+        reasons.append('cmake executable or version changed')
+    if before.get('options') != after['options']:
+        reasons.append('options changed')
+    if before.get('rawargs') != after['rawargs']:
+        reasons.append('raw arguments changed')
+
+    for kind in ('env', 'files', 'inputs'):
+        old_items = before.get(kind, {})
+        new_items = after[kind]
+        for key in sorted(set(old_items) | set(new_items)):
+            if key not in new_items:
+                reasons.append(f'{kind}: {key} removed')
+            elif key not in old_items:
+                reasons.append(f'{kind}: {key} added')
+            elif old_items[key] != new_items[key]:
+                reasons.append(f'{kind}: {key} changed')
+
+    return reasons if len(reasons) > 0 else ['fingerprint changed']
+
+def check(command, executablepath: str, version: str, environ: dict[str, str],
+          rawargs: list[str] = None) -> tuple[bool, list[str]]:
+    """
+        Checks whether a configure invoked with the given raw arguments can be skipped.
+        Returns (True, []) when it can, otherwise (False, reasons).
+    """
+
+    build = builddir(command)
+    if not intact(build):
+        return (False, ['build system missing or incomplete'])
+
+    old = load(build)
+    if old is None:
+        return (False, ['no previous successful configure'])
+
+    inputs = list(old.get('components', {}).get('inputs', {}).keys())
+    new = fingerprint(command, executablepath, version, environ, inputs, rawargs)
+    reasons = changes(old, new)
+
+    return (len(reasons) == 0, reasons)
+
+def __seeded(script: str) -> tuple[str, list[str]]:
+    # Reads the initial cache of the user and the parts a seeded script includes.
+    original = None
+    parts = []
+    try:
+        with open(script, 'r', encoding='utf-8') as fh:
+            lines = fh.read().splitlines()
+    except OSError:
+        return (original, parts)
+
+    for line in lines:
+        if line.startswith(SEED_ORIGINAL):
+            original = line[len(SEED_ORIGINAL):]
+        elif line.startswith(SEED_PART):
+            parts.append(line[len(SEED_PART):])
+
+    return (original, parts)
+
+def __makefileinputs(build: str) -> list[str]:
+    path = os.path.join(build, 'CMakeFiles', 'Makefile.cmake')
+    try:
+        with open(path, 'r', encoding='utf-8', errors='replace') as fh:
+            content = fh.read()
+    except OSError:
+        return None
+
+    match = re.search(r'set\(CMAKE_MAKEFILE_DEPENDS(.*?)\)', content, re.S)
+    if match is None:
+        internal_logger.log(f'No CMAKE_MAKEFILE_DEPENDS in {path}', internal_logger.WARN)
+        return []
+
+    return re.findall(r'"([^"]*)"', match.group(1))
+
+def __ninjainputs(build: str) -> list[str]:
+    path = os.path.join(build, 'build.ninja')
+    try:
+        with open(path, 'r', encoding='utf-8', errors='replace') as fh:
+            content = fh.read()
+    except OSError:
+        return None
+
+    content = re.sub(r'\$\r?\n\s*', '', content)
+    for line in content.splitlines():
+        if not line.startswith('build build.ninja') or 'RERUN_CMAKE' not in line:
+            continue
+
+        _, _, deps = line.partition('RERUN_CMAKE')
+        deps = deps.split('||')[0]
+        _, separator, deps = deps.partition('|')
+        if not separator:
+            return []
+
+        deps = deps.replace('$ ', '\0').replace('$:', ':').replace('$$', '$')
+        return [dep.replace('\0', ' ') for dep in deps.split()]
+
+    return []
@@ -10,14 +10,40 @@
 from abc import ABC, abstractmethod
 from threading import Thread
 
+import contextlib
 import subprocess as sp
 import os
 import random
+import sys
+import time
 import cmake.ccmd as cc
+import cmake.cfingerprint as cfp
+import cmake.cfileapi as cfa
+import cmake.cbasic as cb
 
-from cmakeutils import logging as internal_logger
+from cmakeutils import logging as internal_logger, metrics, tracing
+from cmakeutils.eventlog import EventSink, EventStream
 
+from cmake import cjobs
 from cmake.coptions import CMakeRawOptions
+from cmake.cadmission import CMakeAdmissionController
+from cmake.cprocess import CMakeProcessOptions, CMakeProcessControl
+from cmake.clease import CMakeLeaseManager
+
+__invocations__ = metrics.REGISTRY.counter(
+    'pycmake_invocations_total', 'Invocations of cmake, by command and exit code '
+    '(skipped: configure skipped, error: raised).', ('command', 'code'))
+__duration__ = metrics.REGISTRY.histogram(
+    'pycmake_invocation_duration_seconds', 'Duration of the invocations.', ('command',))
+__queuewait__ = metrics.REGISTRY.histogram(
+    'pycmake_queue_wait_seconds', 'Time waited for admission.', ('command',))
+__outputlines__ = metrics.REGISTRY.counter(
+    'pycmake_output_lines_total', 'Lines of output of the invocations.', ('command',))
+__outputbytes__ = metrics.REGISTRY.counter(
+    'pycmake_output_bytes_total', 'Bytes of output of the invocations.', ('command',))
+__callbacks__ = metrics.REGISTRY.histogram(
+    'pycmake_worker_callback_seconds', 'Time spent in the worker callbacks.', ('callback',),
+    metrics.LATENCY_BUCKETS)
 
 class CMakeWorker(ABC):
     """
@@ -41,7 +67,12 @@ class CMakeWorker(ABC):
             Gets the executable's return code.
         """
 
-class CMakeInst:
+    def onstart(self, process):
+        """
+            Gets the process right after it has been started. (Optional)
+        """
+
+class CMakeInst: # pylint: disable-msg=R0902
     """
     Represents an instance of cmake.
     Note: attributes with a "scope" prefix are used PER CALL,
@@ -52,23 +83,70 @@ class CMakeInst:
     environ: dict[str, str] = None
     version: str
 
-    scopeworkers: list[CMakeWorker] = []
-    scopeenviron: dict[str, str] = {}
-    scopepaths: list[str] = []
+    admission: CMakeAdmissionController = None
+    events: EventSink = None
+    configureskip: bool = False
+    leases: CMakeLeaseManager = None
+    fileapikinds: list[tuple[str, int]] = None
+    lastreturncode: int = None
+    lastqueuedtime: float = 0.0
+    lastoutputlines: int = 0
+    lastoutputbytes: int = 0
+    lastskipped: bool = False
+    lastpeakrss: int = None
+    laststeps: set[str] = None
+    lastreasons: list[str] = None
+
+    scopeworkers: list[CMakeWorker] = None
+    scopeenviron: dict[str, str] = None
+    scopepaths: list[str] = None
+    scopeprocess: CMakeProcessOptions = None
+    scopeevents: EventStream = None
 
     def __init__(self, executablepath: str, version: str):
         self.executablepath = executablepath
         self.environ = os.environ
         self.version = version
+        self.leases = CMakeLeaseManager()
+
+        self.scopeworkers = []
+        self.scopeenviron = {}
+        self.scopepaths = []
 
     def invoke(self, command: cc.CMakeCommand, rawargs: CMakeRawOptions = CMakeRawOptions()):
         """
             Invokes the cmake instance with the specified command.
         """
+
+        started = time.perf_counter()
+        code = 'error'
+        try:
+            with tracing.span('CMakeInst.invoke', command=command.commandName) as span:
+                self.__invoke(command, rawargs)
+                span.set(returncode=self.lastreturncode, skipped=self.lastskipped)
+            code = 'skipped' if self.lastskipped else str(self.lastreturncode)
+        finally:
+            self.__measure(command.commandName, code, time.perf_counter() - started)
+
+        return self.__cleanscope()
+
+    def __measure(self, name: str, code: str, elapsed: float):
+        __invocations__.inc(command=name, code=code)
+        __duration__.observe(elapsed, command=name)
+        if code in ('skipped', 'error'):
+            return
+
+        if self.admission is not None:
+            __queuewait__.observe(self.lastqueuedtime, command=name)
+        __outputlines__.inc(self.lastoutputlines, command=name)
+        __outputbytes__.inc(self.lastoutputbytes, command=name)
+
+    def __invoke(self, command: cc.CMakeCommand, rawargs: CMakeRawOptions):
         args: list[str] = None
 
         internal_logger.log('Validating arguments...')
         command.validate()
+        cb.clearpaths()
         args = [self.executablepath]
         args += command.compile()
         args += rawargs.args
@@ -78,36 +156,71 @@ class CMakeInst:
         spaths = self.scopepaths if self.scopepaths is not None else []
         newpaths = env['PATH'] + os.pathsep + os.pathsep.join(spaths)
         env['PATH'] = newpaths
-        internal_logger.log('Invoking cmake executable with arguments: \n[\n    ' +
-                            '\n    '.join(args) + '\n]')
 
-        with sp.Popen(
-            args, stdout=sp.PIPE, stderr=sp.STDOUT,
-            env=dict(sorted(env.items()))
-        ) as proc:
-            stdthreadname = 'pycmake Thread Processor #' + str(random.randint(1, 99))
-            stdprocessor = Thread(
-                name=stdthreadname,
-                args=[proc, self.scopeworkers, stdthreadname],
-                daemon=True,
-                target=self.__doprocess_outputs
-            )
+        lease = contextlib.nullcontext()
+        if self.leases is not None:
+            lease = self.leases.forcommand(command)
+
+        if self.events is not None:
+            self.scopeevents = self.events.open({'command': command.commandName, 'args': args})
+            self.scopeevents.emit('invoke', args=args, cwd=os.getcwd())
+
+        failed = True
+        try:
+            with contextlib.ExitStack() as stack:
+                with tracing.span('CMakeInst.lease'):
+                    stack.enter_context(lease)
+                self.__invokeleased(command, args, env, rawargs.args)
+            failed = False
+        finally:
+            if self.scopeevents is not None:
+                self.scopeevents.close(returncode=None if failed else self.lastreturncode,
+                                       skipped=self.lastskipped, queued=self.lastqueuedtime)
+
+    def clone(self):
+        """
+            Returns a new instance with the same configuration (environment, admission,
+            configure skip, File API, leases and event log), without the per-call scope
+            and last results. Workers registered for the next call are not copied.
+        """
 
-            internal_logger.log('Starting ' + stdprocessor.name +
-                                ' and waiting executable finishes...')
-            stdprocessor.start()
-            proc.wait()
-            stdprocessor.join()
+        inst = CMakeInst(self.executablepath, self.version)
+        inst.environ = self.environ
+        inst.admission = self.admission
+        inst.events = self.events
+        inst.configureskip = self.configureskip
+        inst.leases = self.leases
+        inst.fileapikinds = self.fileapikinds
+        return inst
 
-        internal_logger.log('Cleaning workers...')
-        self.scopeworkers.clear()
+    def setadmission(self, controller: CMakeAdmissionController = None):
+        """
+            Sets the admission controller that every invocation waits on before starting.
+            Passing None disables admission control.
+        """
 
-        internal_logger.log('Cleaning environ...')
-        self.scopeenviron.clear()
+        self.admission = controller
+        return self
 
-        internal_logger.log('Cleaning paths...')
-        self.scopepaths.clear()
+    def setconfigureskip(self, enabled: bool = True):
+        """
+            Skips configure invocations whose fingerprint (options, raw arguments, environment,
+            toolchain/initial cache and CMake input files) matches the last successful one
+            and whose build system is intact. The reasons for reconfiguring are kept in
+            lastreasons.
+        """
 
+        self.configureskip = enabled
+        return self
+
+    def setfileapi(self, kinds: list[tuple[str, int]] = None, enabled: bool = True):
+        """
+            Writes File API queries (codemodel, cache, cmakeFiles and toolchains by default)
+            into the build dir before every configure. The replies are read with
+            cmake.cfileapi.latestreply(build_dir).
+        """
+
+        self.fileapikinds = (cfa.DEFAULT_KINDS if kinds is None else kinds) if enabled else None
         return self
 
     def registerworker(self, worker: CMakeWorker):
@@ -171,7 +284,183 @@ class CMakeInst:
 
         return self
 
-    def __doprocess_outputs(self, process, workers, name):
+    def setleases(self, manager: CMakeLeaseManager = None, enabled: bool = True):
+        """
+            Sets how the build/install dirs of every invocation are leased, so
+            processes sharing them wait for each other. invoke takes the leases
+            by default, with a manager of the per-user lock dir.
+            'manager': The lease manager (one with the per-user lock dir when None).
+            Pass enabled=False to invoke without leases, e.g. when every process
+            works in its own dirs or the lock dir can not be written.
+        """
+
+        self.leases = (CMakeLeaseManager() if manager is None else manager) if enabled else None
+        return self
+
+    def seteventlog(self, log: EventSink = None):
+        """
+            Sends the events of every invocation (phases, output lines and
+            return code) to an event sink: an EventLog writes them as JSON lines,
+            a FlightRecorder keeps them in memory and writes only the invocations
+            that fail, a LogArchive compresses the output. Use an EventTee for
+            several. Passing None disables the event log.
+        """
+
+        self.events = log
+        return self
+
+    def setprocessoptions(self, options: CMakeProcessOptions = None):
+        """
+            Sets the scheduling controls (cpu pinning, nice, I/O class)
+            of the next invocation.
+        """
+
+        self.scopeprocess = options
+        return self
+
+    def __invokeleased(self, command: cc.CMakeCommand, args: list[str], env: dict[str, str],
+                       rawargs: list[str]):
+        configure = self.configureskip and isinstance(command, cc.CMakeConfigure)
+        self.lastskipped = False
+        self.lastreasons = None
+        self.lastoutputlines = 0
+        self.lastoutputbytes = 0
+        self.lastpeakrss = None
+        self.laststeps = set()
+
+        if configure:
+            with tracing.span('CMakeInst.fingerprint'):
+                (skip, self.lastreasons) = cfp.check(command, self.executablepath,
+                                                     self.version, env, rawargs)
+            if skip:
+                internal_logger.log('Skipping configure, the fingerprint is unchanged.')
+                self.__emit('skip')
+                self.lastskipped = True
+                self.lastreturncode = 0
+                self.lastqueuedtime = 0.0
+                for wk in self.scopeworkers:
+                    wk.retcode(0)
+                return
+
+            internal_logger.log('Configuring because: ' + '; '.join(self.lastreasons))
+
+        if self.fileapikinds is not None and isinstance(command, cc.CMakeConfigure):
+            internal_logger.log('Writing File API queries...')
+            cfa.CMakeFileApi(cfp.builddir(command)).writequeries(self.fileapikinds)
+
+        admission = contextlib.nullcontext(0.0)
+        if self.admission is not None:
+            internal_logger.log('Waiting for admission...')
+            admission = self.admission.admit()
+
+        with contextlib.ExitStack() as stack:
+            with tracing.span('CMakeInst.admission'):
+                queued = stack.enter_context(admission)
+            self.lastqueuedtime = queued
+            self.__emit('admitted', queued=queued)
+            self.lastreturncode = self.__run(args, env)
+
+        if configure and self.lastreturncode == 0:
+            internal_logger.log('Storing the configure fingerprint...')
+            cfp.store(cfp.builddir(command),
+                      cfp.fingerprint(command, self.executablepath, self.version, env,
+                                      rawargs=rawargs))
+
+        if isinstance(command, cc.CMakeBuildCommand) and self.lastreturncode == 0 and \
+                self.lastpeakrss is not None and len(self.laststeps) == 1:
+            # The biggest process of the build can only be told apart by kind
+            # when the build ran a single kind of step
+            cjobs.default().record(next(iter(self.laststeps)), self.lastpeakrss)
+
+    def __cleanscope(self):
+        internal_logger.log('Cleaning workers...')
+        self.scopeworkers.clear()
+
+        internal_logger.log('Cleaning environ...')
+        self.scopeenviron.clear()
+
+        internal_logger.log('Cleaning paths...')
+        self.scopepaths.clear()
+        self.scopeprocess = None
+        self.scopeevents = None
+
+        return self
+
+    def __run(self, args: list[str], env: dict[str, str]) -> int:
+        internal_logger.log('Invoking cmake executable with arguments: \n[\n    ' +
+                            '\n    '.join(args) + '\n]')
+
+        control = None
+        popenargs = {}
+        if self.scopeprocess is not None:
+            control = CMakeProcessControl(self.scopeprocess)
+            popenargs = control.popenargs()
+
+        try:
+            return self.__spawn(args, env, popenargs, control)
+        finally:
+            if control is not None:
+                control.finished()
+
+    def __spawn(self, args: list[str], env: dict[str, str], popenargs: dict,
+                control: CMakeProcessControl) -> int:
+        span = tracing.current()
+        with tracing.span('CMakeInst.spawn'):
+            proc = sp.Popen( # pylint: disable-msg=R1732
+                args, stdout=sp.PIPE, stderr=sp.STDOUT,
+                env=dict(sorted(env.items())), **popenargs
+            )
+        with proc:
+            if control is not None:
+                control.started(proc)
+            self.__emit('spawn', pid=proc.pid)
+            span.event('spawn', pid=proc.pid)
+            for wk in self.scopeworkers:
+                wk.onstart(proc)
+
+            stdthreadname = 'pycmake Thread Processor #' + str(random.randint(1, 99))
+            stdprocessor = Thread(
+                name=stdthreadname,
+                args=[proc, self.scopeworkers, stdthreadname, self.scopeevents, span],
+                daemon=True,
+                target=self.__doprocess_outputs
+            )
+
+            internal_logger.log('Starting ' + stdprocessor.name +
+                                ' and waiting executable finishes...')
+            stdprocessor.start()
+            with tracing.span('CMakeInst.wait', pid=proc.pid):
+                self.lastpeakrss = self.__reap(proc)
+                stdprocessor.join()
+
+        self.__emit('exit', returncode=proc.returncode)
+        return proc.returncode
+
+    @staticmethod
+    def __reap(proc) -> int:
+        # Waits for the process, returning the peak RSS (bytes) of the biggest process
+        # among it and the descendants it waited for, None where it is unknown.
+        if not hasattr(os, 'wait4'):
+            proc.wait()
+            return None
+
+        try:
+            _, status, usage = os.wait4(proc.pid, 0)
+        except ChildProcessError:
+            # Reaped by a poll() of another thread (repin, cancellation)
+            proc.wait()
+            return None
+        proc.returncode = os.waitstatus_to_exitcode(status)
+
+        # Kilobytes on Linux, bytes on macOS
+        return usage.ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+
+    def __emit(self, phase: str, **payload):
+        if self.scopeevents is not None:
+            self.scopeevents.emit(phase, **payload)
+
+    def __doprocess_outputs(self, process, workers, name, events: EventStream = None,
+                            span: tracing.Span = tracing.NOSPAN):
 
         def __keep_reading() -> (bool, str):
             out = process.stdout.readline()
@@ -183,6 +472,7 @@ class CMakeInst:
         internal_logger.log(f'({name}) -> Listening output...')
 
         stdoutlines = []
+        outputbytes = 0
 
         while (pipe := __keep_reading())[0]:
 
@@ -191,18 +481,34 @@ class CMakeInst:
             )
 
             stdoutlines.append(outline)
-
-            if outline != '':
+            outputbytes += 0 if pipe[1] is None else len(pipe[1])
+            kind = cjobs.stepkind(outline)
+            if kind is not None:
+                self.laststeps.add(kind)
+            if len(stdoutlines) == 1:
+                span.event('first output')
+            if events is not None and outline != '':
+                events.emit('line', text=outline.rstrip('\r\n'))
+
+            if outline != '' and internal_logger.enabled():
                 internal_logger.log(f'({name}) -> {outline}')
 
             for wk in (workers if workers is not None else []):
                 if outline != '':
-                    wk.onprocess(stdoutlines, outline)
+                    started = time.perf_counter()
+                    with tracing.span('CMakeWorker.onprocess', span, worker=wk.id):
+                        wk.onprocess(stdoutlines, outline)
+                    __callbacks__.observe(time.perf_counter() - started, callback='onprocess')
 
         internal_logger.log(f'({name}) -> Process ended with code {process.returncode}')
         for wk in (workers if workers is not None else []):
-            wk.retcode(process.returncode)
+            started = time.perf_counter()
+            with tracing.span('CMakeWorker.retcode', span, worker=wk.id):
+                wk.retcode(process.returncode)
+            __callbacks__.observe(time.perf_counter() - started, callback='retcode')
 
+        self.lastoutputlines = len(stdoutlines)
+        self.lastoutputbytes = outputbytes
         stdoutlines.clear()
         process.stdout.close()
 
@@ -0,0 +1,169 @@
+"""
+   pycmake Build Parallelism
+
+   Copyright (C) 2023 jppgmx
+   Licensed under MIT License
+
+   Computes how many compile and link jobs the machine can run at once,
+   from the usable cpus and the available memory divided by the peak
+   memory (RSS) that compile and link steps used in previous builds.
+   CMakeInst records the peak RSS of the successful builds that ran a single
+   kind of step (POSIX only), so a link never counts as a compile.
+"""
+
+import dataclasses
+import json
+import os
+import threading
+
+from cmakeutils import sysload, logging as internal_logger
+
+COMPILE = 'compile'
+LINK = 'link'
+
+# Progress lines of the Ninja and Makefile generators, by step kind
+STEP_PREFIXES = {COMPILE: 'Building ', LINK: 'Linking '}
+
+def stepkind(line: str) -> str:
+    """
+        Returns the kind of build step a line of build output announces, or None.
+    """
+
+    for kind, prefix in STEP_PREFIXES.items():
+        if prefix in line:
+            return kind
+
+    return None
+
+@dataclasses.dataclass
+class CMakeJobs:
+    """
+        Result of an estimation.
+
+        'jobs': Value for the build -j option.
+        'compilejobs': Size of the Ninja "compile" job pool.
+        'linkjobs': Size of the Ninja "link" job pool.
+    """
+
+    jobs: int
+    compilejobs: int
+    linkjobs: int
+
+class CMakeJobsEstimator:
+    """
+        Estimates the build parallelism.
+
+        Peak RSS samples are recorded per kind (compile or link) and,
+        when a history file is given, persisted between runs.
+        The estimation uses the highest of the last 'samples' values of each kind.
+    """
+
+    historyfile: str = None
+    samples: int = 32
+    defaults: dict[str, int] = None
+    reserve: int = 512 << 20
+
+    def __init__(self, historyfile: str = None, samples: int = 32,
+                 compilerss: int = 1 << 30, linkrss: int = 4 << 30, sampler = sysload.readload):
+        self.historyfile = historyfile
+        self.samples = samples
+        self.defaults = { COMPILE: compilerss, LINK: linkrss }
+
+        self.__sampler = sampler
+        self.__lock = threading.Lock()
+        self.__history: dict[str, list[int]] = { COMPILE: [], LINK: [] }
+
+        if historyfile is not None and os.path.isfile(historyfile):
+            self.__load()
+
+    def record(self, kind: str, rss: int):
+        """
+            Records the peak RSS (in bytes) of a compile or link step.
+        """
+
+        if kind not in self.__history:
+            raise ValueError('Invalid kind: ' + str(kind))
+        if rss <= 0:
+            return self
+
+        with self.__lock:
+            self.__history[kind].append(int(rss))
+            del self.__history[kind][:-self.samples]
+
+            if self.historyfile is not None:
+                self.__save()
+
+        return self
+
+    def peak(self, kind: str) -> int:
+        """
+            Returns the peak RSS used to size the jobs of a kind.
+        """
+
+        with self.__lock:
+            history = self.__history[kind]
+            return max(history) if len(history) > 0 else self.defaults[kind]
+
+    def estimate(self) -> CMakeJobs:
+        """
+            Computes the build parallelism for the current machine state.
+        """
+
+        load = self.__sampler()
+        cpus = max(1, load.cpucount)
+
+        compilejobs = cpus
+        linkjobs = cpus
+
+        if load.memavailable is not None:
+            memory = max(0, load.memavailable - self.reserve)
+            compilejobs = min(cpus, memory // self.peak(COMPILE))
+            linkjobs = min(cpus, memory // self.peak(LINK))
+
+        jobs = CMakeJobs(max(1, compilejobs), max(1, compilejobs), max(1, linkjobs))
+        internal_logger.log(f'Estimated parallelism: {jobs} ' +
+                            f'(cpus {cpus}, available memory {load.memavailable})')
+
+        return jobs
+
+    def __load(self):
+        try:
+            with open(self.historyfile, 'r', encoding='utf-8') as fh:
+                data = json.load(fh)
+        except (OSError, ValueError) as err:
+            internal_logger.log(f'Ignoring jobs history {self.historyfile}: {err}',
+                                internal_logger.WARN)
+            return
+
+        for kind in self.__history:
+            values = data.get(kind, []) if isinstance(data, dict) else []
+            self.__history[kind] = [int(v) for v in values if isinstance(v, int) and v > 0]
+            del self.__history[kind][:-self.samples]
+
+    def __save(self):
+        tmpfile = f'{self.historyfile}.{os.getpid()}.tmp'
+        with open(tmpfile, 'w', encoding='utf-8') as fh:
+            json.dump(self.__history, fh)
+        os.replace(tmpfile, self.historyfile)
+
+__defaultEstimator__: CMakeJobsEstimator = None
+
+def default() -> CMakeJobsEstimator:
+    """
+        Gets the estimator used by the 'auto' max_jobs and the job pools option.
+    """
+
+    global __defaultEstimator__ # pylint: disable-msg=W0603
+    if __defaultEstimator__ is None:
+        __defaultEstimator__ = CMakeJobsEstimator()
+
+    return __defaultEstimator__
+
+def setdefault(estimator: CMakeJobsEstimator):
+    """
+        Replaces the estimator used by the 'auto' max_jobs and the job pools option,
+        for example with one that persists its history.
+    """
+
+    global __defaultEstimator__ # pylint: disable-msg=W0603
+    __defaultEstimator__ = estimator
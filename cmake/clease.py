@@ -0,0 +1,177 @@
+"""
+   pycmake Directory Leases
+
+   Copyright (C) 2023 jppgmx
+   Licensed under MIT License
+
+   Cross-process leases on build and install dirs, so processes that share
+   a build dir wait for each other while unrelated builds run concurrently.
+   Configure and build take the build dir exclusively; install reads the
+   build dir (shared) and writes the install prefix (exclusive).
+   The lock files live in a lock dir outside the leased dirs, named after
+   the real path of each dir, so a dir can be leased before it exists.
+   The default lock dir is per user; processes of different users sharing
+   a build dir must be given the same lockdir.
+"""
+
+import hashlib
+import os
+import time
+
+from enum import Enum
+
+from cmakeutils import logging as internal_logger
+from cmakeutils import filelock
+
+from cmake import ccmd as cc
+from cmake import cfingerprint as cfp
+from cmake.ccache import CMakeCache
+
+LockTimeout = filelock.LockTimeout
+
+class CMakeLeaseMode(Enum):
+    """
+        Lease modes. SHARED is for read-only use (queries, install sources),
+        EXCLUSIVE for anything that writes (configure, build, install prefix).
+    """
+
+    SHARED = 'shared'
+    EXCLUSIVE = 'exclusive'
+
+class CMakeLease:
+    """
+        A set of dir leases, acquired in path order so two leases
+        never wait on each other. Used as a context manager it waits
+        at most 'timeout' seconds.
+    """
+
+    def __init__(self, locks: list[tuple[str, filelock.FileLock]], timeout: float = None):
+        self.locks = sorted(locks, key=lambda item: item[0])
+        self.timeout = timeout
+
+    def paths(self) -> list[str]:
+        """
+            Returns the leased dirs.
+        """
+
+        return [path for path, _ in self.locks]
+
+    def acquire(self, timeout: float = None):
+        """
+            Acquires every lease. On timeout the leases taken so far are released
+            and LockTimeout is raised.
+        """
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        taken = []
+        try:
+            for path, lock in self.locks:
+                remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+                lock.acquire(remaining)
+                taken.append(lock)
+                mode = 'shared' if lock.shared else 'exclusive'
+                internal_logger.log(f'Leased {path} ({mode})')
+        except BaseException:
+            for lock in reversed(taken):
+                lock.release()
+            raise
+
+        return self
+
+    def release(self):
+        """
+            Releases every lease.
+        """
+
+        for _, lock in reversed(self.locks):
+            lock.release()
+
+        return self
+
+    def __enter__(self):
+        return self.acquire(self.timeout)
+
+    def __exit__(self, exctype, excvalue, traceback):
+        self.release()
+
+class CMakeLeaseManager:
+    """
+        Creates the leases of a lock dir.
+
+        'lockdir': Directory of the lock files. (default: <temp>/pycmake-locks-<user>)
+        'timeout': Default seconds to wait for a lease. (None waits forever)
+    """
+
+    lockdir: str
+    timeout: float = None
+
+    def __init__(self, lockdir: str = None, timeout: float = None):
+        self.lockdir = os.path.abspath(filelock.userdir('pycmake-locks')
+                                       if lockdir is None else lockdir)
+        self.timeout = timeout
+
+    def lockfile(self, directory: str) -> str:
+        """
+            Returns the lock file of a dir.
+        """
+
+        real = os.path.normcase(os.path.realpath(directory))
+        digest = hashlib.sha256(real.encode('utf-8', 'surrogateescape')).hexdigest()
+
+        return os.path.join(self.lockdir, digest[:32] + '.lock')
+
+    def lease(self, dirs: dict[str, CMakeLeaseMode]) -> CMakeLease:
+        """
+            Creates a lease over dirs (not acquired yet). A dir listed twice by
+            different paths is leased once, exclusively if either asks for it.
+        """
+
+        modes: dict[str, tuple[str, CMakeLeaseMode]] = {}
+        for directory, mode in dirs.items():
+            lockfile = self.lockfile(directory)
+            if lockfile not in modes or mode == CMakeLeaseMode.EXCLUSIVE:
+                modes[lockfile] = (os.path.abspath(directory), mode)
+
+        return CMakeLease([
+            (directory, filelock.FileLock(lockfile, mode == CMakeLeaseMode.SHARED))
+            for lockfile, (directory, mode) in modes.items()
+        ], self.timeout)
+
+    def forcommand(self, command: cc.CMakeCommand) -> CMakeLease:
+        """
+            Creates the lease a command needs.
+        """
+
+        return self.lease(dirsfor(command))
+
+    def prune(self, age: float = 7 * 24 * 3600.0) -> list[str]:
+        """
+            Removes the lock files of dirs not leased in the last 'age' seconds.
+        """
+
+        return filelock.prune(self.lockdir, age)
+
+def dirsfor(command: cc.CMakeCommand) -> dict[str, CMakeLeaseMode]:
+    """
+        Returns the dirs a command writes or reads, with the lease mode each needs.
+    """
+
+    if isinstance(command, cc.CMakeConfigure):
+        return {cfp.builddir(command): CMakeLeaseMode.EXCLUSIVE}
+
+    if isinstance(command, cc.CMakeBuildCommand):
+        return {os.path.abspath(command['build_path'] or '.'): CMakeLeaseMode.EXCLUSIVE}
+
+    if isinstance(command, cc.CMakeInstallCommand):
+        build = os.path.abspath(command['install_path'] or '_install')
+        dirs = {build: CMakeLeaseMode.SHARED}
+
+        prefix = command['prefix']
+        if prefix is None:
+            prefix = CMakeCache(build).get('CMAKE_INSTALL_PREFIX')
+        if prefix is not None:
+            dirs[os.path.abspath(prefix)] = CMakeLeaseMode.EXCLUSIVE
+
+        return dirs
+
+    return {}
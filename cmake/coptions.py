@@ -9,9 +9,34 @@
 #          to be recognized as Hashable types, even if they were defined in the base class.
 
 import dataclasses
+import glob
+import hashlib
+import os
+import threading
 
 from abc import ABC, abstractmethod
-from cmake.cbasic import CMakeValType, CMakeValue, castbool
+from cmake.cbasic import CMakeValType, CMakeValue, castbool, resolve
+from cmake import cjobs
+
+# Above this many variables, they are passed in a -C script instead of -D arguments
+SPILL_THRESHOLD = 256
+
+__spill__ = {'threshold': SPILL_THRESHOLD, 'directory': None}
+__templates__: dict[str, list[str]] = {}
+__spilled__: dict[tuple, str] = {}
+__spilllock__ = threading.Lock()
+
+def setspill(threshold: int = SPILL_THRESHOLD, directory: str = None):
+    """
+        Sets how many configure variables are passed as -D arguments before they are
+        spilled to a -C script (None never spills), and a shared directory for the
+        scripts (default: <build dir>/.pycmake, where a new script replaces the old one).
+    """
+
+    with __spilllock__:
+        __spill__['threshold'] = threshold
+        __spill__['directory'] = directory
+        __spilled__.clear()
 
 @dataclasses.dataclass
 class CMakeInitOptions:
@@ -41,6 +66,14 @@ class CMakeBaseOption(ABC):
             Constructs the option with value in the form of a string or a list of strings.
         """
 
+    def cacheable(self, value: CMakeValue) -> bool: # pylint: disable-msg=W0613
+        """
+            Whether the compiled arguments only depend on the value, so commands
+            can keep them until the value changes.
+        """
+
+        return True
+
     def __eq__(self, __value: object) -> bool:
         if not isinstance(__value, CMakeBaseOption):
             return False
@@ -65,22 +98,31 @@ class CMakeSimpleOption(CMakeBaseOption):
 
         if value is None:
             val = self.default
+        if not isinstance(val, CMakeValue):
+            val = CMakeValue(val)
 
         valstr = castbool(val.value) if val.type == CMakeValType.BOOL else f'{str(val.value)}'
-        ssep = '<#-nl-#>'
+        fields = {
+            'option': self.cmdoption,
+            'type': self.type.name.upper(),
+            'value': valstr,
+            'q': ('"' if ' ' in valstr else '')
+        }
 
-        optstring = self.format.format(
-            option=self.cmdoption,
-            type=self.type.name.upper(),
-            value=valstr,
-            ssp=ssep,
-            q=('"' if ' ' in valstr else '')
-            )
+        parts = self.__parts()
+        if len(parts) == 1:
+            return parts[0].format(**fields)
 
-        if ssep in optstring:
-            return optstring.split('<#-nl-#>')
+        return [part.format(**fields) for part in parts]
 
-        return optstring
+    def __parts(self) -> list[str]:
+        # The format split at {ssp} (the separator between arguments), once per format
+        parts = __templates__.get(self.format)
+        if parts is None:
+            parts = self.format.split('{ssp}')
+            __templates__[self.format] = parts
+
+        return parts
 
     def __eq__(self, __value: object) -> bool:
         return super().__eq__(__value)
@@ -114,10 +156,82 @@ class CMakeOptionalSimpleOption(CMakeSimpleOption):
     def __hash__(self) -> int:
         return super().__hash__()
 
+@dataclasses.dataclass
+class CMakeJobsOption(CMakeOptionalSimpleOption):
+    """
+        Parallel jobs option. Example: -j 8
+
+        The value 'auto' is replaced by the parallelism estimated
+        from the cpus and the available memory.
+    """
+
+    def __init__(self, name: str, cmd: str, fmt: str):
+        super().__init__(name, cmd, fmt, CMakeValType.STRING)
+
+    def compile(self, value: CMakeValue) -> str | list[str]:
+        if value is not None and str(value.value).lower() == 'auto':
+            value = CMakeValue(str(cjobs.default().estimate().jobs))
+        return super().compile(value)
+
+    def cacheable(self, value: CMakeValue) -> bool:
+        return value is None or str(value.value).lower() != 'auto'
+
+    def __eq__(self, __value: object) -> bool:
+        return super().__eq__(__value)
+
+    def __ne__(self, __value: object) -> bool:
+        return super().__ne__(__value)
+
+    def __hash__(self) -> int:
+        return super().__hash__()
+
+@dataclasses.dataclass
+class CMakeJobPoolsOption(CMakeBaseOption):
+    """
+        Ninja job pools sized from the estimated parallelism.
+        Example: -DCMAKE_JOB_POOLS:STRING=compile=16;link=2 -DCMAKE_JOB_POOL_LINK:STRING=link
+    """
+
+    def __init__(self):
+        super().__init__('job_pools', '-D', '{option}{varname}:STRING={value}',
+                         CMakeValType.BOOL, False)
+
+    def compile(self, value: CMakeValue) -> str | list[str]:
+        if value is None or value.type != CMakeValType.BOOL or not value.value:
+            return []
+
+        jobs = cjobs.default().estimate()
+        pools = {
+            'CMAKE_JOB_POOLS': f'{cjobs.COMPILE}={jobs.compilejobs};{cjobs.LINK}={jobs.linkjobs}',
+            'CMAKE_JOB_POOL_COMPILE': cjobs.COMPILE,
+            'CMAKE_JOB_POOL_LINK': cjobs.LINK
+        }
+
+        return [
+            self.format.format(option=self.cmdoption, varname=name, value=val)
+            for name, val in pools.items()
+        ]
+
+    def cacheable(self, value: CMakeValue) -> bool:
+        return value is None or value.type != CMakeValType.BOOL or not value.value
+
+    def __eq__(self, __value: object) -> bool:
+        return super().__eq__(__value)
+
+    def __ne__(self, __value: object) -> bool:
+        return super().__ne__(__value)
+
+    def __hash__(self) -> int:
+        return super().__hash__()
+
 @dataclasses.dataclass
 class CMakeVariablesOption(CMakeBaseOption):
     """
         CMake configure variables. Example: -DFOO -DBAR ...
+
+        More variables than the spill threshold (see setspill) are written to
+        a set(... CACHE ... FORCE) script passed with -C, which keeps the
+        command line short. The script goes to 'directory' (see compile).
     """
 
     def __init__(self, remove = False):
@@ -127,7 +241,12 @@ class CMakeVariablesOption(CMakeBaseOption):
             super().__init__('variables', '-D', '{option}{varname}:{type}={value}',
                              CMakeValType.VARDICT, {})
 
-    def compile(self, value: CMakeValue) -> str | list[str]:
+    def compile(self, value: CMakeValue, directory: str = None) -> str | list[str]:
+        """
+            Compiles the variables. 'directory' receives a spilled script when
+            setspill has no directory (the configure command passes its build dir).
+        """
+
         _vars = []
         if value is None:
             return _vars
@@ -135,7 +254,16 @@ class CMakeVariablesOption(CMakeBaseOption):
         if value.type != CMakeValType.VARDICT:
             raise ValueError('Invalid value: ' + value.value)
 
-        for key, val in value.value.items():
+        variables = value.value
+        if self.cmdoption == '-D':
+            # Strings that name existing files are passed as FILEPATH
+            variables = resolve(variables)
+
+        threshold = __spill__['threshold']
+        if self.cmdoption == '-D' and threshold is not None and len(variables) > threshold:
+            return ['-C', self.__spill(variables, directory)]
+
+        for key, val in variables.items():
             _value = val.value
             if self.cmdoption == '-U':
                 _value = ''
@@ -157,6 +285,76 @@ class CMakeVariablesOption(CMakeBaseOption):
 
         return _vars
 
+    def cacheable(self, value: CMakeValue) -> bool:
+        # Spilled scripts are replaced (or removed with the build dir) meanwhile
+        threshold = __spill__['threshold']
+        return value is None or self.cmdoption != '-D' or threshold is None or \
+            value.type != CMakeValType.VARDICT or len(value.value) <= threshold
+
+    @staticmethod
+    def __spill(variables: dict[str, CMakeValue], directory: str = None) -> str:
+        # Scripts are named by their content, so an unchanged variable set
+        # reuses its script (and keeps the same arguments). In a build dir,
+        # a new script removes the older ones: only the last set is in use.
+        items = []
+        for key, val in variables.items():
+            if val is None:
+                raise ValueError(f'Variable {key} is empty!')
+            if val.type == CMakeValType.VARDICT:
+                raise ValueError('Invalid value type: VARDICT')
+            items.append((key.upper(), val.type.name, val.value))
+        items = tuple(items)
+
+        owned = __spill__['directory'] is None
+        if not owned:
+            directory = __spill__['directory']
+        elif directory is None:
+            raise ValueError('Spilled variables need a directory, see setspill.')
+        directory = os.path.abspath(directory)
+
+        with __spilllock__:
+            path = __spilled__.get((directory, items))
+        if path is not None and os.path.isfile(path):
+            return path
+
+        def __quote(text: str) -> str:
+            return '"' + text.replace('\\', '\\\\').replace('"', '\\"').replace('$', '\\$') + '"'
+
+        lines = ['# Variables spilled by pycmake, do not edit.']
+        lines += [
+            f'set({key} {__quote(castbool(val) if vtype == "BOOL" else str(val))} CACHE {vtype} '
+            '"No help, variable specified on the command line." FORCE)'
+            for key, vtype, val in items
+        ]
+        content = '\n'.join(lines) + '\n'
+
+        digest = hashlib.sha256(content.encode('utf-8')).hexdigest()
+        path = os.path.join(directory, 'spill-' + digest[:32] + '.cmake')
+
+        if not os.path.isfile(path):
+            os.makedirs(directory, exist_ok=True)
+            tmppath = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmppath, 'w', encoding='utf-8') as fh:
+                fh.write(content)
+            os.replace(tmppath, path)
+
+        def __prune():
+            for stale in glob.glob(os.path.join(glob.escape(directory), 'spill-*.cmake')):
+                if stale != path:
+                    try:
+                        os.remove(stale)
+                    except OSError:
+                        pass
+            for key in [key for key in __spilled__ if key[0] == directory]:
+                del __spilled__[key]
+
+        with __spilllock__:
+            if owned:
+                __prune()
+            __spilled__[(directory, items)] = path
+
+        return path
+
     def __eq__(self, __value: object) -> bool:
         return super().__eq__(__value)
 
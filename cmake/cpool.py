@@ -0,0 +1,285 @@
+"""
+   pycmake Build Pool
+
+   Copyright (C) 2023 jppgmx
+   Licensed under MIT License
+
+   Pool of persistent (warm) build dirs, for workspaces that start empty.
+   A configure leases the closest idle build dir of the pool, i.e. one made
+   from the same source dir, generator and toolchain (preferably with the same
+   configuration), so the build is incremental; the dir goes back to the pool
+   when the lease is released. Idle dirs are evicted, least recently used
+   first, to keep the pool under a disk budget.
+   Leases are file locks (see cmakeutils.filelock), so the lease of a process
+   that dies is dropped with it.
+"""
+
+import json
+import os
+import shutil
+import time
+import uuid
+
+from cmakeutils import logging as internal_logger
+from cmakeutils import diskusage, filelock
+
+from cmake import ccmd as cc
+from cmake import cfingerprint as cfp
+
+BUILD_DIR = 'build'
+LOCKS_DIR = '.locks'
+META_FILE = 'pool.json'
+TRASH_DIR = '.trash'
+
+# Components that must match to reuse a build dir, CMake refuses
+# to reconfigure a build dir with another source dir or generator.
+REQUIRED = ('source', 'generator', 'toolchain')
+
+class CMakeBuildLease:
+    """
+        A build dir leased from a pool.
+
+        'path': Build dir to configure and build in.
+        'warm': Whether the dir was already used (False for a new, empty dir).
+        'exact': Whether the configuration matched too.
+    """
+
+    entry: str
+    path: str
+    warm: bool
+    exact: bool
+
+    def __init__(self, pool: 'CMakeBuildPool', entry: str, key: dict, warm: bool, exact: bool):
+        self.pool = pool
+        self.entry = entry
+        self.key = key
+        self.path = os.path.join(pool.pooldir, entry, BUILD_DIR)
+        self.warm = warm
+        self.exact = exact
+        self.released = False
+
+    def release(self, keep: bool = True):
+        """
+            Gives the build dir back to the pool. With keep=False (e.g. after a
+            failed build that left the dir unusable) the dir is discarded.
+        """
+
+        if not self.released:
+            self.released = True
+            self.pool.release(self, keep)
+
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exctype, excvalue, traceback):
+        self.release(exctype is None)
+
+class CMakeBuildPool:
+    """
+        Pool of warm build dirs.
+
+        'pooldir': Directory of the pool.
+        'budget': Maximum size of the idle build dirs in bytes, enforced by evict().
+        'maxentries': (Optional) Maximum number of build dirs.
+    """
+
+    pooldir: str
+    budget: int
+    maxentries: int = None
+
+    def __init__(self, pooldir: str, budget: int = 50 << 30, maxentries: int = None):
+        self.pooldir = os.path.abspath(pooldir)
+        self.budget = budget
+        self.maxentries = maxentries
+
+        self.__locks: dict[str, filelock.FileLock] = {}
+        os.makedirs(os.path.join(self.pooldir, TRASH_DIR), exist_ok=True)
+
+    @staticmethod
+    def key(configure: cc.CMakeConfigure) -> dict:
+        """
+            Returns the pool key of a configure command.
+        """
+
+        toolchain = configure['toolchain']
+        variables = configure['variables'] or {}
+        buildtype = variables.get('CMAKE_BUILD_TYPE')
+
+        return {
+            'source': os.path.normcase(os.path.realpath(cfp.sourcedir(configure))),
+            'generator': [configure['generator'] or 'Ninja', configure['platform_name'],
+                          configure['toolset_spec']],
+            'toolchain': None if toolchain is None else cfp.filedigest(toolchain),
+            'configuration': None if buildtype is None else str(buildtype.value)
+        }
+
+    def lease(self, configure: cc.CMakeConfigure) -> CMakeBuildLease:
+        """
+            Leases the closest idle build dir (a new one if none fits) and
+            points the 'build_dir' of the configure command at it.
+            Use the result as a context manager or call release().
+        """
+
+        key = self.key(configure)
+        candidates = []
+        for entry, meta in self.entries():
+            if any(meta.get('key', {}).get(name) != key[name] for name in REQUIRED):
+                continue
+
+            exact = meta['key'].get('configuration') == key['configuration']
+            candidates.append((exact, meta.get('lastused', 0.0), entry))
+
+        lease = None
+        for exact, _, entry in sorted(candidates, reverse=True):
+            if self.__acquire(entry):
+                lease = CMakeBuildLease(self, entry, key, True, exact)
+                break
+
+        if lease is None:
+            entry = uuid.uuid4().hex
+            os.makedirs(os.path.join(self.pooldir, entry, BUILD_DIR))
+            self.__acquire(entry)
+            self.__writemeta(entry, {'key': key, 'created': time.time(),
+                                     'lastused': time.time(), 'size': 0})
+            lease = CMakeBuildLease(self, entry, key, False, False)
+
+        internal_logger.log(f'Leased {"warm" if lease.warm else "new"} build dir {lease.path}')
+        configure['build_dir'] = lease.path
+
+        return lease
+
+    def release(self, lease: CMakeBuildLease, keep: bool = True):
+        """
+            Returns a leased build dir to the pool, measuring its size, then evicts.
+        """
+
+        if keep:
+            size = diskusage.treesize(lease.path)
+            meta = self.__meta(lease.entry) or {}
+            self.__writemeta(lease.entry, {'key': lease.key, 'created': meta.get('created'),
+                                           'lastused': time.time(), 'size': size})
+            self.__unlock(lease.entry)
+            internal_logger.log(f'Released build dir {lease.path} ({size} bytes)')
+        else:
+            self.__discard(lease.entry)
+            internal_logger.log(f'Discarded build dir {lease.path}')
+
+        self.evict()
+        return self
+
+    def entries(self) -> list[tuple[str, dict]]:
+        """
+            Returns the idle (not leased) build dirs with their metadata.
+        """
+
+        result = []
+        for entry in os.listdir(self.pooldir):
+            if entry in (TRASH_DIR, LOCKS_DIR) or self.__leased(entry):
+                continue
+
+            meta = self.__meta(entry)
+            if meta is not None:
+                result.append((entry, meta))
+
+        return result
+
+    def usage(self) -> int:
+        """
+            Returns the size of the idle build dirs, as measured on release.
+        """
+
+        return sum(meta.get('size', 0) for _, meta in self.entries())
+
+    def evict(self) -> list[str]:
+        """
+            Removes the least recently used idle build dirs until the pool fits
+            the budget (and maxentries). Returns the evicted entries.
+        """
+
+        idle = sorted(self.entries(), key=lambda item: item[1].get('lastused', 0.0))
+        total = sum(meta.get('size', 0) for _, meta in idle)
+        count = len([e for e in os.listdir(self.pooldir) if e not in (TRASH_DIR, LOCKS_DIR)])
+
+        evicted = []
+        for entry, meta in idle:
+            over = self.maxentries is not None and count > self.maxentries
+            if total <= self.budget and not over:
+                break
+            if not self.__acquire(entry):
+                continue
+
+            self.__discard(entry)
+            total -= meta.get('size', 0)
+            count -= 1
+            evicted.append(entry)
+
+        if len(evicted) > 0:
+            internal_logger.log(f'Evicted {len(evicted)} build dir(s)')
+        # Lock files of the discarded dirs
+        filelock.prune(os.path.join(self.pooldir, LOCKS_DIR), 0.0)
+
+        return evicted
+
+    def __acquire(self, entry: str) -> bool:
+        lock = filelock.FileLock(self.__lockpath(entry))
+        try:
+            lock.acquire(0)
+        except filelock.LockTimeout:
+            return False
+
+        # Discarded by another process since it was listed
+        if not os.path.isdir(os.path.join(self.pooldir, entry)):
+            lock.release()
+            return False
+
+        self.__locks[entry] = lock
+        return True
+
+    def __leased(self, entry: str) -> bool:
+        if entry in self.__locks:
+            return True
+
+        probe = filelock.FileLock(self.__lockpath(entry), shared=True)
+        try:
+            probe.acquire(0)
+        except filelock.LockTimeout:
+            return True
+
+        probe.release()
+        return False
+
+    def __unlock(self, entry: str):
+        lock = self.__locks.pop(entry, None)
+        if lock is not None:
+            lock.release()
+
+    def __lockpath(self, entry: str) -> str:
+        return os.path.join(self.pooldir, LOCKS_DIR, entry + '.lock')
+
+    def __discard(self, entry: str):
+        # Moved away while still leased, so nobody leases it meanwhile
+        trash = os.path.join(self.pooldir, TRASH_DIR, f'{entry}.{uuid.uuid4().hex}')
+        try:
+            os.rename(os.path.join(self.pooldir, entry), trash)
+        except OSError:
+            self.__unlock(entry)
+            return
+
+        self.__unlock(entry)
+        shutil.rmtree(trash, ignore_errors=True)
+
+    def __meta(self, entry: str) -> dict:
+        try:
+            with open(os.path.join(self.pooldir, entry, META_FILE), 'r', encoding='utf-8') as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return None
+
+    def __writemeta(self, entry: str, meta: dict):
+        path = os.path.join(self.pooldir, entry, META_FILE)
+        tmppath = f'{path}.{os.getpid()}.tmp'
+        with open(tmppath, 'w', encoding='utf-8') as fh:
+            json.dump(meta, fh)
+        os.replace(tmppath, path)
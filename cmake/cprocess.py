@@ -0,0 +1,274 @@
+"""
+   pycmake Process Controls
+
+   Copyright (C) 2023 jppgmx
+   Licensed under MIT License
+
+   Scheduling controls applied to the cmake process of an invocation:
+   cpu pinning, nice level and I/O priority class.
+   They are set on the process right after it is spawned, so the processes
+   it starts afterwards (compilers, linkers) inherit them.
+"""
+
+import ctypes
+import dataclasses
+import os
+import platform
+import threading
+
+from enum import Enum
+
+import cmakeutils.platcheck as pc
+
+from cmakeutils import sysload, logging as internal_logger
+
+class CMakeIOClass(Enum):
+    """
+        I/O scheduling classes (Linux ioprio).
+    """
+
+    REALTIME = 1
+    BESTEFFORT = 2
+    IDLE = 3
+
+@dataclasses.dataclass
+class CMakeProcessOptions:
+    """
+        Scheduling controls for one invocation.
+
+        'cpus': (Optional) Cpus the process is pinned to.
+        'nice': (Optional) Nice increment. On Windows it selects the priority class.
+        'ioclass': (Optional) I/O scheduling class (Linux only).
+        'iolevel': I/O priority inside the class, 0 (highest) to 7. (default: 4)
+        'partition': Pin the process to an even share of the cpus, split between
+                     every running invocation that also asks for a partition.
+                     If 'cpus' is given it is the set being shared.
+        'processgroup': Start cmake in its own process group (session on POSIX),
+                        so it can be signaled together with everything it started.
+    """
+
+    cpus: list[int] = None
+    nice: int = None
+    ioclass: CMakeIOClass = None
+    iolevel: int = 4
+    partition: bool = False
+    processgroup: bool = False
+
+# Linux ioprio_set syscall numbers
+__IOPRIO_SYSCALLS__ = {
+    'x86_64': 251,
+    'amd64': 251,
+    'i386': 289,
+    'i686': 289,
+    'aarch64': 30,
+    'arm64': 30,
+    'armv7l': 314,
+    'ppc64le': 273,
+    's390x': 282,
+    'riscv64': 30
+}
+
+__IOPRIO_WHO_PROCESS__ = 1
+__IOPRIO_CLASS_SHIFT__ = 13
+
+__CREATE_NEW_PROCESS_GROUP__ = 0x00000200
+
+def setioprio(pid: int, ioclass: CMakeIOClass, level: int = 4):
+    """
+        Sets the I/O priority of a process (0 is the calling process). Linux only.
+    """
+
+    number = __IOPRIO_SYSCALLS__.get(platform.machine().lower())
+    if number is None:
+        raise OSError('ioprio_set is not supported on ' + platform.machine())
+
+    libc = ctypes.CDLL(None, use_errno=True)
+    prio = (ioclass.value << __IOPRIO_CLASS_SHIFT__) | max(0, min(7, level))
+
+    if libc.syscall(number, __IOPRIO_WHO_PROCESS__, pid, prio) != 0:
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err))
+
+def partitioncpus(cpus: list[int], slot: int, slots: int) -> list[int]:
+    """
+        Returns the share of the cpus that belongs to a slot,
+        when the cpus are split evenly in the given number of slots.
+    """
+
+    cpus = sorted(cpus)
+    if slots <= 0 or len(cpus) == 0:
+        return cpus
+    if slots > len(cpus):
+        return [cpus[slot % len(cpus)]]
+
+    begin = slot * len(cpus) // slots
+    end = (slot + 1) * len(cpus) // slots
+
+    return cpus[begin:end]
+
+class CMakeProcessControl:
+    """
+        Applies the process options to the process of one invocation.
+
+        popenargs() gives the extra Popen arguments, started() must be called
+        with the process once it has been spawned and finished() when it ends.
+    """
+
+    options: CMakeProcessOptions
+    cpus: list[int] = None
+
+    def __init__(self, options: CMakeProcessOptions):
+        self.options = options
+        self.cpus = None if options.cpus is None else sorted(options.cpus)
+        self.__process = None
+
+        if options.partition:
+            __partitions__.join(self)
+
+    def popenargs(self) -> dict:
+        """
+            Returns the keyword arguments to pass to Popen.
+        """
+
+        if pc.iswindows():
+            flags = self.__priorityclass()
+            if self.options.processgroup:
+                flags |= __CREATE_NEW_PROCESS_GROUP__
+            return { 'creationflags': flags }
+
+        # No preexec_fn: it is not safe with threads, the controls are set in started().
+        return { 'start_new_session': True } if self.options.processgroup else {}
+
+    def started(self, process):
+        """
+            Applies the controls to the process, right after it has been spawned.
+            A control that can not be applied is logged and skipped.
+        """
+
+        self.__process = process
+        if pc.iswindows():
+            if self.cpus is not None:
+                self.__winaffinity()
+            return
+
+        pid = process.pid
+        controls = []
+        if self.cpus is not None and hasattr(os, 'sched_setaffinity'):
+            controls.append(('cpus', lambda: os.sched_setaffinity(pid, self.cpus)))
+        if self.options.nice is not None:
+            controls.append(('nice', lambda: os.setpriority(
+                os.PRIO_PROCESS, pid, os.getpriority(os.PRIO_PROCESS, pid) + self.options.nice
+            )))
+        if self.options.ioclass is not None:
+            controls.append(('ioclass', lambda: setioprio(pid, self.options.ioclass,
+                                                          self.options.iolevel)))
+
+        for name, control in controls:
+            try:
+                control()
+            except OSError as err:
+                internal_logger.log(f'Could not set {name} of process {pid}: {err}',
+                                    internal_logger.WARN)
+
+    def finished(self):
+        """
+            Releases the cpu partition of the invocation, if any.
+        """
+
+        self.__process = None
+        if self.options.partition:
+            __partitions__.leave(self)
+
+    def repin(self, cpus: list[int]):
+        """
+            Moves the process to another set of cpus.
+            Processes that cmake already started keep their previous set.
+        """
+
+        self.cpus = sorted(cpus)
+        if self.__process is None or self.__process.poll() is not None:
+            return
+
+        try:
+            if pc.iswindows():
+                self.__winaffinity()
+            elif hasattr(os, 'sched_setaffinity'):
+                os.sched_setaffinity(self.__process.pid, self.cpus)
+        except OSError as err:
+            internal_logger.log(f'Could not repin process {self.__process.pid}: {err}',
+                                internal_logger.WARN)
+
+    def __winaffinity(self):
+        from cmakeutils import win32 # pylint: disable-msg=C0415
+
+        mask = 0
+        for cpu in self.cpus:
+            mask |= 1 << cpu
+        win32.kernel.SetProcessAffinityMask(self.__process._handle, mask) # pylint: disable-msg=W0212
+
+    def __priorityclass(self) -> int:
+        from cmakeutils import win32 # pylint: disable-msg=C0415
+
+        nice = self.options.nice
+        if nice is None or nice == 0:
+            return 0
+        if nice >= 10:
+            return win32.kernel.PriorityClass.PC_IDLE
+        if nice > 0:
+            return win32.kernel.PriorityClass.PC_BELOW_NORMAL
+        if nice > -10:
+            return win32.kernel.PriorityClass.PC_ABOVE_NORMAL
+
+        return win32.kernel.PriorityClass.PC_HIGH
+
+class CMakeCpuPartitions:
+    """
+        Keeps the invocations that share the cpus of the host and
+        rebalances them whenever one joins or leaves.
+    """
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__members: list[CMakeProcessControl] = []
+        self.__pools: dict[int, list[int]] = {}
+
+    def join(self, control: CMakeProcessControl):
+        """
+            Adds an invocation and gives it its share of the cpus.
+        """
+
+        with self.__lock:
+            pool = control.cpus if control.cpus is not None else self.__hostcpus()
+            self.__pools[id(control)] = pool
+            self.__members.append(control)
+            self.__rebalance(control)
+
+    def leave(self, control: CMakeProcessControl):
+        """
+            Removes an invocation and spreads its cpus over the others.
+        """
+
+        with self.__lock:
+            if control in self.__members:
+                self.__members.remove(control)
+                del self.__pools[id(control)]
+                self.__rebalance(None)
+
+    def __rebalance(self, joining: CMakeProcessControl):
+        slots = len(self.__members)
+        for slot, member in enumerate(self.__members):
+            cpus = partitioncpus(self.__pools[id(member)], slot, slots)
+            if member is joining:
+                member.cpus = cpus
+            elif cpus != member.cpus:
+                member.repin(cpus)
+
+        internal_logger.log(f'Cpus partitioned between {slots} invocation(s)')
+
+    def __hostcpus(self) -> list[int]:
+        if hasattr(os, 'sched_getaffinity'):
+            return sorted(os.sched_getaffinity(0))
+
+        return list(range(sysload.cpucount()))
+
+__partitions__ = CMakeCpuPartitions()
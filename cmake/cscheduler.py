@@ -0,0 +1,610 @@
+"""
+   pycmake Scheduler
+
+   Copyright (C) 2023 jppgmx
+   Licensed under MIT License
+
+   Runs cmake invocations concurrently with priority classes.
+   When the machine is saturated and a job of higher priority is waiting,
+   the process groups of just enough of the lowest-priority running jobs to
+   admit it are suspended (SIGSTOP) and resumed (SIGCONT) once capacity frees.
+   Jobs submitted through a batch can be cancelled together (fail-fast).
+"""
+# pylint: disable-msg=R0902
+# -> Note: Jobs, batches and the scheduler expose their state and timings as
+#          plain attributes, read by the callers.
+
+import dataclasses
+import itertools
+import os
+import re
+import signal
+import subprocess
+import threading
+import time
+
+from enum import Enum, IntEnum
+from threading import Thread
+
+from cmakeutils import sysload, logging as internal_logger
+
+from cmake import ccmd as cc
+from cmake.cinstance import CMakeInst, CMakeWorker
+from cmake.cadmission import CMakeAdmissionController
+from cmake.coptions import CMakeRawOptions
+from cmake.cprocess import CMakeProcessOptions
+
+class CMakePriority(IntEnum):
+    """
+        Priority classes of scheduled jobs. Higher values are more important.
+    """
+
+    BACKGROUND = 0
+    LOW = 1
+    NORMAL = 2
+    HIGH = 3
+
+class CMakeJobState(Enum):
+    """
+        States of a scheduled job.
+    """
+
+    QUEUED = 1
+    RUNNING = 2
+    SUSPENDED = 3
+    DONE = 4
+    FAILED = 5
+    CANCELLED = 6
+
+class CMakeFailFast(Enum):
+    """
+        What a batch does after its first failure.
+
+        NONE: Nothing, every job runs.
+        CANCEL: Terminate the running jobs and cancel the queued ones.
+        DRAIN: Let the running jobs finish but start nothing new.
+    """
+
+    NONE = 0
+    CANCEL = 1
+    DRAIN = 2
+
+# Compiler, linker and build tool error lines (GCC/Clang, MSVC, Ninja, Make)
+COMPILER_ERROR = re.compile(
+    r'(\b(fatal )?error( [A-Z]+\d+)?:|^FAILED: |\bundefined reference to\b|' +
+    r'\berror LNK\d+|^make(\[\d+\])?: \*\*\*)'
+)
+
+@dataclasses.dataclass(eq=False)
+class CMakeJob:
+    """
+        A cmake invocation submitted to the scheduler.
+        Times are in seconds.
+    """
+
+    command: cc.CMakeCommand
+    priority: CMakePriority = CMakePriority.NORMAL
+    name: str = None
+    rawargs: CMakeRawOptions = None
+    workers: list[CMakeWorker] = None
+    environ: dict[str, str] = None
+    paths: list[str] = None
+    processoptions: CMakeProcessOptions = None
+    batch: 'CMakeBatch' = None
+
+    seq: int = 0
+    state: CMakeJobState = CMakeJobState.QUEUED
+    returncode: int = None
+    error: BaseException = None
+    cancelled: bool = False
+    process = None
+
+    submitted: float = 0.0
+    started: float = None
+    finished: float = None
+    suspensions: int = 0
+    suspendedtime: float = 0.0
+    suspendedsince: float = None
+
+    def __post_init__(self):
+        self.__done = threading.Event()
+
+    def queuedtime(self) -> float:
+        """
+            Time between the submission and the start of the job.
+        """
+
+        end = self.started if self.started is not None else time.monotonic()
+        return end - self.submitted
+
+    def runtime(self) -> float:
+        """
+            Time since the job started (until it finished), suspended time included.
+        """
+
+        if self.started is None:
+            return 0.0
+
+        end = self.finished if self.finished is not None else time.monotonic()
+        return end - self.started
+
+    def done(self) -> bool:
+        """
+            Checks whether the job has finished.
+        """
+
+        return self.__done.is_set()
+
+    def wait(self, timeout: float = None) -> bool:
+        """
+            Waits until the job finishes. Returns False on timeout.
+        """
+
+        return self.__done.wait(timeout)
+
+    def succeeded(self) -> bool:
+        """
+            Checks whether the job finished with return code 0.
+        """
+
+        return self.state == CMakeJobState.DONE and self.returncode == 0
+
+    def setdone(self):
+        """
+            Wakes up whoever waits on the job. Used by the scheduler.
+        """
+
+        self.__done.set()
+
+class CMakeJobWorker(CMakeWorker):
+    """
+        Internal worker that connects a job to its running process.
+    """
+
+    def __init__(self, scheduler, job: CMakeJob):
+        super().__init__()
+        self.id = -job.seq
+        self.scheduler = scheduler
+        self.job = job
+
+    def onstart(self, process):
+        self.scheduler.onstart(self.job, process)
+
+    def onprocess(self, totallines: list[str], currentln: str):
+        batch = self.job.batch
+        if batch is None or not batch.detecterrors or batch.tripped:
+            return
+
+        if COMPILER_ERROR.search(currentln):
+            self.scheduler.trip(batch, self.job, 'error in output: ' + currentln.strip())
+
+    def retcode(self, code: int):
+        pass
+
+class CMakeBatch:
+    """
+        Group of jobs sharing a fail-fast policy.
+
+        The batch trips on the first job that fails or, with 'detecterrors',
+        on the first compiler error seen in the output of one of its jobs.
+        Running jobs that are cancelled get SIGTERM on their process group,
+        then SIGKILL after 'grace' seconds (on Windows, their process tree is killed).
+    """
+
+    policy: CMakeFailFast
+    detecterrors: bool
+    grace: float
+    tripped: bool = False
+    reason: str = None
+    failedjob: CMakeJob = None
+
+    def __init__(self, scheduler, policy: CMakeFailFast = CMakeFailFast.CANCEL,
+                 detecterrors: bool = False, grace: float = 10.0):
+        self.scheduler = scheduler
+        self.policy = policy
+        self.detecterrors = detecterrors
+        self.grace = grace
+        self.tripped = False
+        self.reason = None
+        self.failedjob = None
+        self.members: list[CMakeJob] = []
+
+    def submit(self, command: cc.CMakeCommand, priority: CMakePriority = CMakePriority.NORMAL,
+               name: str = None, **kwargs) -> CMakeJob:
+        """
+            Queues a command as part of the batch. See CMakeScheduler.submit.
+        """
+
+        return self.scheduler.submit(command, priority, name, batch=self, **kwargs)
+
+    def cancel(self, reason: str = 'cancelled'):
+        """
+            Trips the batch explicitly, applying its policy.
+        """
+
+        self.scheduler.trip(self, None, reason)
+        return self
+
+    def wait(self, timeout: float = None) -> list[CMakeJob]:
+        """
+            Waits until every job of the batch finishes.
+        """
+
+        return self.scheduler.wait(list(self.members), timeout)
+
+    def succeeded(self) -> bool:
+        """
+            Checks whether every job of the batch succeeded.
+        """
+
+        return not self.tripped and all(job.succeeded() for job in self.members)
+
+class CMakeScheduler:
+    """
+        Runs jobs on copies of a cmake instance, at most 'capacity' at a time.
+
+        Jobs are started by priority (then by submission order).
+        With 'preempt' enabled, a waiting job suspends running jobs of lower
+        priority when there is no free capacity. The admission controller,
+        if given, also counts as saturation while the machine is overloaded.
+        Preemption needs POSIX signals; on other platforms jobs just wait.
+    """
+
+    cmake: CMakeInst
+    capacity: int
+    preempt: bool = True
+    admission: CMakeAdmissionController = None
+    interval: float = 0.5
+
+    def __init__(self, cmake: CMakeInst, capacity: int = None, preempt: bool = True,
+                 admission: CMakeAdmissionController = None, interval: float = 0.5):
+        self.cmake = cmake
+        self.capacity = max(1, sysload.cpucount() if capacity is None else capacity)
+        self.preempt = preempt and hasattr(signal, 'SIGSTOP') and hasattr(os, 'killpg')
+        self.admission = admission
+        self.interval = interval
+
+        self.__cond = threading.Condition()
+        self.__seq = itertools.count(1)
+        self.__jobs: list[CMakeJob] = []
+        self.__dispatcher: threading.Thread = None
+        self.__closed = False
+
+        if preempt and not self.preempt:
+            internal_logger.log('Preemption is not supported on this platform.',
+                                internal_logger.WARN)
+
+    def batch(self, policy: CMakeFailFast = CMakeFailFast.CANCEL,
+              detecterrors: bool = False, grace: float = 10.0) -> CMakeBatch:
+        """
+            Creates a batch of jobs with a fail-fast policy.
+        """
+
+        return CMakeBatch(self, policy, detecterrors, grace)
+
+    def submit(self, command: cc.CMakeCommand, priority: CMakePriority = CMakePriority.NORMAL,
+               name: str = None, **kwargs) -> CMakeJob:
+        """
+            Queues a command. Extra keyword arguments are the CMakeJob fields
+            rawargs, workers, environ, paths, processoptions and batch.
+        """
+
+        with self.__cond:
+            if self.__closed:
+                raise RuntimeError('Scheduler already shut down.')
+
+            job = CMakeJob(command, CMakePriority(priority), name, **kwargs)
+            job.seq = next(self.__seq)
+            job.name = job.name if job.name is not None else f'{command.commandName}#{job.seq}'
+            job.submitted = time.monotonic()
+
+            self.__jobs.append(job)
+            if job.batch is not None:
+                job.batch.members.append(job)
+                if job.batch.tripped and job.batch.policy != CMakeFailFast.NONE:
+                    self.__cancelqueued(job)
+                    return job
+            internal_logger.log(f'Job {job.name} queued with priority {job.priority.name}')
+
+            if self.__dispatcher is None:
+                self.__dispatcher = Thread(name='pycmake Scheduler', daemon=True,
+                                           target=self.__dispatch)
+                self.__dispatcher.start()
+
+            self.__cond.notify_all()
+
+        return job
+
+    def wait(self, jobs: list[CMakeJob] = None, timeout: float = None) -> list[CMakeJob]:
+        """
+            Waits until the jobs (all submitted jobs by default) finish.
+            Returns the jobs that finished.
+        """
+
+        with self.__cond:
+            jobs = list(self.__jobs) if jobs is None else list(jobs)
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for job in jobs:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if not job.wait(remaining):
+                break
+
+        return [job for job in jobs if job.done()]
+
+    def jobs(self) -> list[CMakeJob]:
+        """
+            Returns every job submitted to the scheduler.
+        """
+
+        with self.__cond:
+            return list(self.__jobs)
+
+    def shutdown(self, wait: bool = True):
+        """
+            Stops accepting jobs and, optionally, waits for the submitted ones.
+        """
+
+        with self.__cond:
+            self.__closed = True
+            self.__cond.notify_all()
+
+        if wait:
+            self.wait()
+
+    def onstart(self, job: CMakeJob, process):
+        """
+            Called from the job's invocation once its process exists.
+        """
+
+        with self.__cond:
+            job.process = process
+            if job.cancelled:
+                self.__kill(job, process, 'SIGKILL')
+            self.__cond.notify_all()
+
+    def suspend(self, job: CMakeJob) -> bool:
+        """
+            Suspends the process group of a running job.
+        """
+
+        with self.__cond:
+            if job.state != CMakeJobState.RUNNING or not self.__signal(job, 'SIGSTOP'):
+                return False
+
+            job.state = CMakeJobState.SUSPENDED
+            job.suspensions += 1
+            job.suspendedsince = time.monotonic()
+            self.__cond.notify_all()
+
+        internal_logger.log(f'Job {job.name} suspended')
+        return True
+
+    def resume(self, job: CMakeJob) -> bool:
+        """
+            Resumes the process group of a suspended job.
+        """
+
+        with self.__cond:
+            if job.state != CMakeJobState.SUSPENDED or not self.__signal(job, 'SIGCONT'):
+                return False
+
+            job.state = CMakeJobState.RUNNING
+            job.suspendedtime += time.monotonic() - job.suspendedsince
+            job.suspendedsince = None
+            self.__cond.notify_all()
+
+        internal_logger.log(f'Job {job.name} resumed')
+        return True
+
+    def trip(self, batch: CMakeBatch, job: CMakeJob, reason: str):
+        """
+            Marks a batch as failed and applies its fail-fast policy to the other jobs.
+        """
+
+        with self.__cond:
+            if batch.tripped:
+                return
+
+            batch.tripped = True
+            batch.reason = reason
+            batch.failedjob = job
+            internal_logger.log(f'Batch tripped by {"user" if job is None else job.name}: ' +
+                                f'{reason} (policy {batch.policy.name})', internal_logger.ERROR)
+
+            if batch.policy == CMakeFailFast.NONE:
+                return
+
+            for sibling in batch.members:
+                if sibling is job:
+                    continue
+                if sibling.state == CMakeJobState.QUEUED:
+                    self.__cancelqueued(sibling)
+                elif (batch.policy == CMakeFailFast.CANCEL and
+                      sibling.state in (CMakeJobState.RUNNING, CMakeJobState.SUSPENDED)):
+                    self.terminate(sibling, batch.grace)
+
+            self.__cond.notify_all()
+
+    def terminate(self, job: CMakeJob, grace: float = 10.0):
+        """
+            Terminates a running job: SIGTERM to its process group,
+            then SIGKILL if it is still alive after 'grace' seconds.
+        """
+
+        with self.__cond:
+            if job.done() or job.cancelled:
+                return
+
+            job.cancelled = True
+            process = job.process
+            if process is None:
+                # Not spawned yet; the invocation is stopped as soon as it starts.
+                return
+
+            internal_logger.log(f'Terminating job {job.name}', internal_logger.WARN)
+            self.__kill(job, process, 'SIGTERM')
+            if job.state == CMakeJobState.SUSPENDED:
+                self.__signal(job, 'SIGCONT')
+
+        timer = threading.Timer(grace, self.__kill, [job, process, 'SIGKILL'])
+        timer.daemon = True
+        timer.start()
+
+    def __cancelqueued(self, job: CMakeJob):
+        job.state = CMakeJobState.CANCELLED
+        job.cancelled = True
+        job.finished = time.monotonic()
+        internal_logger.log(f'Job {job.name} cancelled before starting', internal_logger.WARN)
+        job.setdone()
+
+    def __kill(self, job: CMakeJob, process, signame: str):
+        if process.poll() is not None:
+            return
+
+        if hasattr(os, 'killpg'):
+            try:
+                os.killpg(process.pid, getattr(signal, signame))
+            except (ProcessLookupError, PermissionError):
+                pass
+            return
+
+        internal_logger.log(f'{signame} -> job {job.name}', internal_logger.WARN)
+        if os.name == 'nt':
+            # Killing cmake.exe alone leaves its build tool and compilers running,
+            # so the whole tree goes (Windows has no graceful termination for them).
+            try:
+                subprocess.run(['taskkill', '/T', '/F', '/PID', str(process.pid)],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                               check=False)
+                return
+            except OSError:
+                pass
+
+        if signame == 'SIGKILL':
+            process.kill()
+        else:
+            process.terminate()
+
+    def __signal(self, job: CMakeJob, signame: str) -> bool:
+        if not hasattr(os, 'killpg') or job.process is None:
+            return False
+
+        try:
+            os.killpg(job.process.pid, getattr(signal, signame))
+        except (ProcessLookupError, PermissionError):
+            return False
+
+        return True
+
+    def __saturated(self, active: int) -> bool:
+        if active >= self.capacity:
+            return True
+        if self.admission is not None and active > 0:
+            return len(self.admission.overloaded(self.admission.sample())) > 0
+
+        return False
+
+    def __dispatch(self):
+        with self.__cond:
+            while True:
+                self.__schedule()
+
+                pending = [job for job in self.__jobs if not job.done()]
+                if self.__closed and len(pending) == 0:
+                    return
+
+                self.__cond.wait(self.interval)
+
+    def __schedule(self):
+        while True:
+            waiting = [
+                job for job in self.__jobs
+                if job.state in (CMakeJobState.QUEUED, CMakeJobState.SUSPENDED)
+            ]
+            if len(waiting) == 0:
+                return
+
+            # Highest priority first, resuming suspended jobs before starting new ones.
+            best = min(waiting, key=lambda job: (
+                -job.priority, job.state != CMakeJobState.SUSPENDED, job.seq
+            ))
+
+            running = [job for job in self.__jobs if job.state == CMakeJobState.RUNNING]
+            if not self.__saturated(len(running)):
+                if not self.__admit(best):
+                    return
+                continue
+
+            if not self.preempt:
+                return
+
+            # Only as many as it takes to admit the job: the ones over capacity,
+            # or one when it is the machine that is overloaded
+            needed = max(1, len(running) - self.capacity + 1)
+            victims = sorted((
+                job for job in running
+                if job.priority < best.priority and job.process is not None
+            ), key=lambda job: (job.priority, -job.seq))[:needed]
+            if len(victims) < needed:
+                return
+
+            for victim in victims:
+                if not self.suspend(victim):
+                    return
+            if not self.__admit(best):
+                return
+
+    def __admit(self, job: CMakeJob) -> bool:
+        # False when a suspended job can not be resumed (its process is gone)
+        if job.state == CMakeJobState.SUSPENDED:
+            return self.resume(job)
+
+        self.__start(job)
+        return True
+
+    def __start(self, job: CMakeJob):
+        job.state = CMakeJobState.RUNNING
+        job.started = time.monotonic()
+
+        Thread(name=f'pycmake Job {job.name}', daemon=True,
+               target=self.__run, args=[job]).start()
+
+    def __run(self, job: CMakeJob):
+        inst = self.cmake.clone()
+
+        options = job.processoptions if job.processoptions is not None else CMakeProcessOptions()
+        inst.setprocessoptions(dataclasses.replace(options, processgroup=True))
+        inst.append_env_variables(job.environ)
+        inst.appendpaths(job.paths)
+
+        inst.registerworker(CMakeJobWorker(self, job))
+        for worker in (job.workers if job.workers is not None else []):
+            inst.registerworker(worker)
+
+        try:
+            inst.invoke(job.command, job.rawargs if job.rawargs is not None else CMakeRawOptions())
+            job.returncode = inst.lastreturncode
+        except Exception as err: # pylint: disable-msg=W0718
+            internal_logger.log(f'Job {job.name} failed: {err}', internal_logger.ERROR)
+            job.error = err
+
+        with self.__cond:
+            job.state = CMakeJobState.DONE if job.error is None else CMakeJobState.FAILED
+            if job.cancelled:
+                job.state = CMakeJobState.CANCELLED
+            if job.suspendedsince is not None:
+                job.suspendedtime += time.monotonic() - job.suspendedsince
+                job.suspendedsince = None
+            job.finished = time.monotonic()
+            job.process = None
+            self.__cond.notify_all()
+
+        if job.batch is not None and not job.cancelled and not job.succeeded():
+            reason = str(job.error) if job.error is not None else f'exit code {job.returncode}'
+            self.trip(job.batch, job, reason)
+
+        internal_logger.log(f'Job {job.name} finished with code {job.returncode} ' +
+                            f'(queued {job.queuedtime():.2f}s, ' +
+                            f'suspended {job.suspendedtime:.2f}s)')
+        job.setdone()
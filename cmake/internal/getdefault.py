@@ -13,13 +13,17 @@ from subprocess import Popen, PIPE
 from cmake import coptions
 from cmake import cinstance
 
-from cmakeutils import platcheck as pc, win32, logging as internal_logger
+from cmakeutils import platcheck as pc, win32, logging as internal_logger, tracing
 
 def cmake_get_default(_options: coptions.CMakeInitOptions):
     """
         Searches for cmake.
     """
 
+    with tracing.span('cmake_get_default'):
+        return __getdefault(_options)
+
+def __getdefault(_options: coptions.CMakeInitOptions):
     internal_logger.log('The module will search for the cmake executable' +
                         ' according to the current system specifications.')
     default = None
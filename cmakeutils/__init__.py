@@ -14,6 +14,16 @@
 from . import platcheck as platfrom2
 from . import typecheck
 from . import logging
+from . import sysload
+from . import treehash
+from . import diskusage
+from . import filelock
+from . import eventlog
+from . import flightrecorder
+from . import logarchive
+from . import logindex
+from . import tracing
+from . import metrics
 
 if platfrom2.iswindows():
     from . import win32
@@ -0,0 +1,100 @@
+"""
+   pycmake Disk Usage
+
+   Copyright (C) 2023 jppgmx
+   Licensed under MIT License
+
+   Measures the size of directory trees (e.g. build dirs) quickly.
+   Directories are scanned with os.scandir on a thread pool, one task per
+   directory, so a deep tree is listed in parallel. The stat results of
+   os.scandir are reused (free on Windows) and hardlinked files are counted once.
+"""
+
+import dataclasses
+import os
+
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from . import logging as internal_logger
+
+@dataclasses.dataclass
+class DiskUsage:
+    """
+        Size of a tree.
+
+        'size': Apparent size of the files in bytes.
+        'allocated': Bytes allocated on disk (the apparent size where unknown).
+        'files': Number of files (symlinks included).
+        'dirs': Number of directories below the root.
+    """
+
+    path: str
+    size: int = 0
+    allocated: int = 0
+    files: int = 0
+    dirs: int = 0
+
+def __scandir(directory: str) -> tuple[list[str], list[tuple[int, int, int, int, int]]]:
+    subdirs = []
+    files = []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                        continue
+
+                    stat = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+
+                blocks = getattr(stat, 'st_blocks', None)
+                allocated = stat.st_size if blocks is None else blocks * 512
+                files.append((stat.st_dev, stat.st_ino, stat.st_nlink,
+                              stat.st_size, allocated))
+    except OSError as err:
+        internal_logger.log(f'Could not scan {directory}: {err}', internal_logger.WARN)
+
+    return (subdirs, files)
+
+def usage(path: str, workers: int = None) -> DiskUsage:
+    """
+        Measures a directory tree. Symlinks are counted but not followed.
+    """
+
+    path = os.path.abspath(path)
+    result = DiskUsage(path)
+    if not os.path.isdir(path):
+        return result
+
+    workers = workers if workers is not None else min(32, (os.cpu_count() or 1) + 4)
+    seen = set()
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='pycmake Scanner') as pool:
+        pending = {pool.submit(__scandir, path)}
+        while len(pending) > 0:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                subdirs, files = future.result()
+                result.dirs += len(subdirs)
+                pending |= {pool.submit(__scandir, subdir) for subdir in subdirs}
+
+                for dev, ino, nlink, size, allocated in files:
+                    if nlink > 1 and ino != 0:
+                        if (dev, ino) in seen:
+                            continue
+                        seen.add((dev, ino))
+
+                    result.files += 1
+                    result.size += size
+                    result.allocated += allocated
+
+    return result
+
+def treesize(path: str, workers: int = None) -> int:
+    """
+        Returns the apparent size of a directory tree in bytes.
+    """
+
+    return usage(path, workers).size
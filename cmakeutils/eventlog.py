@@ -0,0 +1,367 @@
+"""
+   pycmake Event Log
+
+   Copyright (C) 2023 jppgmx
+   Licensed under MIT License
+
+   Structured event log. Every stream of events (one cmake invocation) is
+   written as JSON lines to its own file, under a dir per day, and a line
+   describing each finished stream is appended to an index, so the streams
+   of interest are found without reading them.
+   A background writer takes the events from a queue and writes them in
+   batches; emitting an event never touches the disk.
+"""
+
+import atexit
+import itertools
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+
+from abc import ABC, abstractmethod
+
+from . import logging as internal_logger
+
+INDEX_FILE = 'index.jsonl'
+
+class BaseStream(ABC):
+    """
+        What the streams of every sink have: an id, a file (relative to the
+        directory of the sink), the meta of the index entry, a start time and
+        whether the stream ended.
+    """
+
+    def __init__(self, streamid: str, path: str, meta: dict):
+        self.id = streamid
+        self.path = path
+        self.meta = meta
+        self.started = time.time()
+        self.closed = False
+
+    def entry(self, summary: dict, **fields) -> dict:
+        """
+            Returns the index entry of the stream, ending now.
+        """
+
+        return {'id': self.id, 'file': self.path, 'start': self.started, 'end': time.time(),
+                **fields, **self.meta, **summary}
+
+    @abstractmethod
+    def emit(self, phase: str, **payload):
+        """
+            Adds an event to the stream.
+        """
+
+    @abstractmethod
+    def close(self, **summary):
+        """
+            Ends the stream; 'summary' goes to its index entry.
+        """
+
+class EventStream(BaseStream):
+    """
+        The events of one invocation. Events are dicts with the stream id,
+        a sequence number, a timestamp, the phase and its payload.
+    """
+
+    def __init__(self, log, streamid: str, path: str, meta: dict):
+        super().__init__(streamid, path, meta)
+        self.log = log
+        self.__seq = itertools.count(1)
+
+    def emit(self, phase: str, **payload):
+        """
+            Queues an event. The payload must be JSON serializable.
+        """
+
+        if self.closed:
+            return
+
+        self.log.put(self, {'id': self.id, 'seq': next(self.__seq), 'time': time.time(),
+                            'phase': phase, **payload})
+
+    def close(self, **summary):
+        """
+            Ends the stream and queues its index entry (meta, summary and event count).
+        """
+
+        if self.closed:
+            return
+
+        self.closed = True
+        entry = self.entry(summary, events=next(self.__seq) - 1)
+        self.log.put(self, None, entry)
+
+class EventSink(ABC):
+    """
+        Receives the events of invocations. open() returns a stream with
+        emit(phase, **payload) and close(**summary).
+    """
+
+    @abstractmethod
+    def open(self, meta: dict = None, streamid: str = None):
+        """
+            Starts a stream. 'meta' is copied to its index entry.
+            'streamid' is the id of the stream (a new one when None).
+        """
+
+    def flush(self, timeout: float = None) -> bool: # pylint: disable-msg=W0613
+        """
+            Waits until the events emitted so far are written.
+        """
+
+        return True
+
+    def close(self):
+        """
+            Writes what is pending and releases the sink.
+        """
+
+class TeeStream:
+    """
+        A stream that forwards its events to the streams of several sinks.
+    """
+
+    def __init__(self, streams: list):
+        self.streams = streams
+
+    def emit(self, phase: str, **payload):
+        """
+            Emits an event to every stream.
+        """
+
+        for stream in self.streams:
+            stream.emit(phase, **payload)
+
+    def close(self, **summary):
+        """
+            Closes every stream, even when one fails; the first error is raised after.
+        """
+
+        error = None
+        for stream in self.streams:
+            try:
+                stream.close(**summary)
+            except Exception as err: # pylint: disable-msg=W0718
+                error = err if error is None else error
+
+        if error is not None:
+            raise error
+
+class EventTee(EventSink):
+    """
+        Sends the events to several sinks (e.g. an event log and a log archive).
+        Each invocation has the same stream id in every sink.
+    """
+
+    def __init__(self, *sinks: EventSink):
+        self.sinks = list(sinks)
+
+    def open(self, meta: dict = None, streamid: str = None) -> TeeStream:
+        if streamid is None:
+            streamid, _ = newstream()
+
+        return TeeStream([sink.open(meta, streamid) for sink in self.sinks])
+
+    def flush(self, timeout: float = None) -> bool:
+        # Every sink is flushed, even after one timed out
+        flushed = [sink.flush(timeout) for sink in self.sinks]
+        return all(flushed)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+class EventLog(EventSink):
+    """
+        Writes event streams to a directory.
+
+        'directory': Directory of the stream files and the index.
+        'batch': Maximum number of events written at once.
+    """
+
+    directory: str
+    batch: int = 1024
+
+    def __init__(self, directory: str, batch: int = 1024):
+        self.directory = os.path.abspath(directory)
+        self.batch = batch
+
+        self.__queue = queue.SimpleQueue()
+        self.__writer = None
+        self.__lock = threading.Lock()
+        atexit.register(self.close)
+
+    def open(self, meta: dict = None, streamid: str = None) -> EventStream:
+        """
+            Starts a stream. 'meta' is copied to its index entry.
+        """
+
+        streamid, path = newstream(streamid)
+        stream = EventStream(self, streamid, path, {} if meta is None else dict(meta))
+
+        with self.__lock:
+            if self.__writer is None:
+                self.__writer = threading.Thread(name='pycmake Event Writer',
+                                                 target=self.__write, daemon=True)
+                self.__writer.start()
+
+        return stream
+
+    def put(self, stream: EventStream, event: dict, entry: dict = None):
+        """
+            Queues an event of a stream, or its index entry (when closing it).
+        """
+
+        self.__queue.put((stream, event, entry))
+
+    def flush(self, timeout: float = None) -> bool:
+        """
+            Waits until the events queued so far are written.
+        """
+
+        if self.__writer is None:
+            return True
+
+        done = threading.Event()
+        self.__queue.put((None, done, None))
+        return done.wait(timeout)
+
+    def close(self):
+        """
+            Writes the queued events and stops the writer.
+        """
+
+        with self.__lock:
+            writer, self.__writer = self.__writer, None
+        if writer is not None:
+            self.__queue.put((None, None, None))
+            writer.join()
+
+    def __write(self):
+        files = {}
+        try:
+            while True:
+                batch = [self.__queue.get()]
+                while len(batch) < self.batch:
+                    try:
+                        batch.append(self.__queue.get_nowait())
+                    except queue.Empty:
+                        break
+
+                if not self.__writebatch(batch, files):
+                    return
+        finally:
+            for fh in files.values():
+                fh.close()
+
+    def __writebatch(self, batch: list[tuple], files: dict) -> bool:
+        queued = []
+        entries = []
+        markers = []
+        running = True
+
+        for stream, event, entry in batch:
+            if stream is None:
+                if event is None:
+                    running = False
+                else:
+                    markers.append(event)
+            else:
+                queued.append((stream, event))
+                if event is None:
+                    entries.append((stream, entry))
+
+        try:
+            self.__writeevents(queued, files)
+            if len(entries) > 0:
+                appendindex(self.directory, [entry for _, entry in entries])
+        except Exception as err: # pylint: disable-msg=W0718
+            # The batch is lost, but the writer goes on: flush() and close() must return.
+            internal_logger.log(f'Could not write events to {self.directory}: {err}',
+                                internal_logger.ERROR)
+        finally:
+            for stream, _ in entries:
+                fh = files.pop(stream.id, None)
+                if fh is not None:
+                    fh.close()
+            for marker in markers:
+                marker.set()
+
+        return running
+
+    def __writeevents(self, queued: list[tuple], files: dict):
+        lines: dict[EventStream, list[str]] = {}
+        for stream, event in queued:
+            streamlines = lines.setdefault(stream, [])
+            if event is not None:
+                streamlines.append(json.dumps(event))
+
+        for stream, streamlines in lines.items():
+            fh = files.get(stream.id)
+            if fh is None:
+                path = os.path.join(self.directory, stream.path)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                # Kept open across batches until the stream is closed, see __writebatch
+                fh = files[stream.id] = open(path, 'a', # pylint: disable-msg=R1732
+                                             encoding='utf-8')
+            if len(streamlines) > 0:
+                fh.write('\n'.join(streamlines) + '\n')
+                fh.flush()
+
+def newstream(streamid: str = None) -> tuple[str, str]:
+    """
+        Returns the id of a stream (a new one when None) and its file,
+        relative to the log dir.
+    """
+
+    if streamid is None:
+        streamid = f'{time.strftime("%Y%m%dT%H%M%S")}-{os.getpid()}-{uuid.uuid4().hex[:8]}'
+    return (streamid, os.path.join(time.strftime('%Y-%m-%d'), streamid + '.jsonl'))
+
+def appendindex(directory: str, entries: list[dict]):
+    """
+        Appends index entries to the index of a log dir, in a single write.
+    """
+
+    data = ''.join(json.dumps(entry) + '\n' for entry in entries).encode('utf-8')
+    os.makedirs(directory, exist_ok=True)
+    fd = os.open(os.path.join(directory, INDEX_FILE), os.O_WRONLY | os.O_CREAT | os.O_APPEND,
+                 0o666)
+    try:
+        os.write(fd, data)
+    finally:
+        os.close(fd)
+
+def index(directory: str, since: float = None) -> list[dict]:
+    """
+        Returns the index entries of the finished streams of a directory,
+        optionally only the ones started after 'since' (a timestamp).
+    """
+
+    result = []
+    try:
+        with open(os.path.join(directory, INDEX_FILE), 'r', encoding='utf-8') as fh:
+            for line in fh:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if since is None or entry.get('start', 0) >= since:
+                    result.append(entry)
+    except FileNotFoundError:
+        pass
+
+    return result
+
+def events(directory: str, entry: dict):
+    """
+        Yields the events of a stream, given its index entry.
+    """
+
+    with open(os.path.join(directory, entry['file']), 'r', encoding='utf-8') as fh:
+        for line in fh:
+            yield json.loads(line)
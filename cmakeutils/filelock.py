@@ -0,0 +1,253 @@
+"""
+   pycmake File Locks
+
+   Copyright (C) 2023 jppgmx
+   Licensed under MIT License
+
+   Cross-process reader/writer locks on lock files.
+   Locks are taken with flock (LockFileEx on Windows, on a byte range past
+   the data so the owner record stays readable), so the system drops the
+   locks of a process that dies and a crashed holder never leaves a stale
+   lock behind. Lock files of another user are locked read-only.
+   Waiters pass through a turnstile lock first: a waiting writer holds the
+   turnstile, so readers that come after it can not starve it.
+"""
+
+import getpass
+import json
+import os
+import re
+import socket
+import tempfile
+import time
+
+from . import logging as internal_logger
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    import msvcrt # pylint: disable-msg=E0401
+except ImportError:
+    msvcrt = None
+
+TURNSTILE_SUFFIX = '.turnstile'
+
+# Byte locked by LockFileEx, far past the owner record
+WINDOWS_LOCK_OFFSET = 1 << 62
+
+class LockTimeout(TimeoutError):
+    """
+        Raised when a lock is not acquired in time. 'owner' describes the
+        exclusive holder, when known.
+    """
+
+    def __init__(self, path: str, holder: dict = None):
+        super().__init__(f'Timed out waiting for {path}' +
+                         ('' if holder is None else f' (held by {holder})'))
+        self.path = path
+        self.owner = holder
+
+def userdir(name: str) -> str:
+    """
+        Returns <temp>/<name>-<user>, a dir of the current user, so the users of a
+        shared host never open each other's files.
+    """
+
+    try:
+        user = getpass.getuser()
+    except (OSError, KeyError, ImportError):
+        user = str(os.getuid()) if hasattr(os, 'getuid') else 'default'
+
+    return os.path.join(tempfile.gettempdir(), name + '-' + re.sub(r'[^\w.-]', '_', user))
+
+def trylock(fd: int, shared: bool) -> bool:
+    """
+        Tries to lock an open file without waiting.
+    """
+
+    if fcntl is None:
+        from . import win32 # pylint: disable-msg=C0415
+
+        options = win32.kernel.LockOptions.LO_FAIL_IMMEDIATELY
+        if not shared:
+            options |= win32.kernel.LockOptions.LO_EXCLUSIVE
+        return win32.kernel.LockFileEx(msvcrt.get_osfhandle(fd), options, WINDOWS_LOCK_OFFSET)
+
+    try:
+        fcntl.flock(fd, (fcntl.LOCK_SH if shared else fcntl.LOCK_EX) | fcntl.LOCK_NB)
+    except (BlockingIOError, PermissionError):
+        return False
+
+    return True
+
+def unlock(fd: int):
+    """
+        Unlocks an open file.
+    """
+
+    if fcntl is None:
+        from . import win32 # pylint: disable-msg=C0415
+
+        win32.kernel.UnlockFileEx(msvcrt.get_osfhandle(fd), WINDOWS_LOCK_OFFSET)
+        return
+
+    fcntl.flock(fd, fcntl.LOCK_UN)
+
+def owner(path: str) -> dict:
+    """
+        Returns the owner record written by the last exclusive holder of a lock file.
+    """
+
+    try:
+        with open(path, 'r', encoding='utf-8') as fh:
+            return json.loads(fh.read() or 'null')
+    except (OSError, ValueError):
+        return None
+
+class FileLock:
+    """
+        A reader/writer lock on a lock file, created if missing.
+        Each FileLock is one holder, also between threads of the same process.
+    """
+
+    path: str
+    shared: bool = False
+
+    def __init__(self, path: str, shared: bool = False):
+        self.path = os.path.abspath(path)
+        self.shared = shared
+        self.__fd = None
+        self.__writable = False
+
+    def locked(self) -> bool:
+        """
+            Whether this holder has the lock.
+        """
+
+        return self.__fd is not None
+
+    def acquire(self, timeout: float = None):
+        """
+            Waits for the lock. Raises LockTimeout after 'timeout' seconds (None waits forever).
+        """
+
+        if self.__fd is not None:
+            raise RuntimeError('Lock already acquired: ' + self.path)
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        turnstile, _ = self.__wait(self.path + TURNSTILE_SUFFIX, False, deadline)
+        try:
+            self.__fd, self.__writable = self.__wait(self.path, self.shared, deadline)
+        finally:
+            unlock(turnstile)
+            os.close(turnstile)
+
+        if not self.shared and self.__writable:
+            record = {'pid': os.getpid(), 'host': socket.gethostname(), 'time': time.time()}
+            os.ftruncate(self.__fd, 0)
+            os.lseek(self.__fd, 0, os.SEEK_SET)
+            os.write(self.__fd, json.dumps(record).encode('utf-8'))
+
+        return self
+
+    def release(self):
+        """
+            Releases the lock, if held.
+        """
+
+        if self.__fd is None:
+            return self
+
+        if not self.shared and self.__writable:
+            os.ftruncate(self.__fd, 0)
+
+        fd, self.__fd = self.__fd, None
+        unlock(fd)
+        os.close(fd)
+
+        return self
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, exctype, excvalue, traceback):
+        self.release()
+
+    def __wait(self, path: str, shared: bool, deadline: float) -> tuple[int, bool]:
+        delay = 0.001
+        while True:
+            fd, writable = self.__open(path)
+            try:
+                if trylock(fd, shared):
+                    # The file may have been pruned (unlinked) while we waited on it
+                    if self.__current(fd, path):
+                        return (fd, writable)
+                    unlock(fd)
+            except BaseException:
+                os.close(fd)
+                raise
+
+            os.close(fd)
+
+            if deadline is not None and time.monotonic() >= deadline:
+                holder = owner(self.path)
+                internal_logger.log(f'Timed out waiting for {path}', internal_logger.WARN)
+                raise LockTimeout(self.path, holder)
+
+            time.sleep(delay if deadline is None else
+                       max(0.0, min(delay, deadline - time.monotonic())))
+            delay = min(delay * 2, 0.1)
+
+    @staticmethod
+    def __open(path: str) -> tuple[int, bool]:
+        try:
+            return (os.open(path, os.O_RDWR | os.O_CREAT, 0o666), True)
+        except PermissionError:
+            # Created by another user: still lockable, but the owner record is theirs
+            return (os.open(path, os.O_RDONLY), False)
+
+    @staticmethod
+    def __current(fd: int, path: str) -> bool:
+        try:
+            return os.path.samestat(os.fstat(fd), os.stat(path))
+        except FileNotFoundError:
+            return False
+
+def prune(directory: str, age: float = 7 * 24 * 3600.0) -> list[str]:
+    """
+        Removes lock files of a directory that are older than 'age' seconds
+        and not held. Waiters notice the removal and lock the new file.
+    """
+
+    removed = []
+    now = time.time()
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return removed
+
+    for name in names:
+        path = os.path.join(directory, name)
+        try:
+            if now - os.stat(path).st_mtime < age:
+                continue
+            fd = os.open(path, os.O_RDWR)
+        except OSError:
+            continue
+
+        try:
+            if trylock(fd, False):
+                os.unlink(path)
+                unlock(fd)
+                removed.append(path)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    return removed
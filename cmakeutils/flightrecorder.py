@@ -0,0 +1,240 @@
+"""
+   pycmake Flight Recorder
+
+   Copyright (C) 2023 jppgmx
+   Licensed under MIT License
+
+   Keeps the last events (phases and output lines) of each invocation in an
+   in-memory ring and writes them only when the invocation fails, or when
+   asked to. Green invocations cost no log I/O; failed ones are written like
+   an event log stream (see eventlog), so they are read back the same way.
+   The rings are preallocated and reused between invocations.
+"""
+
+import json
+import os
+import threading
+import time
+
+from . import eventlog
+from . import logging as internal_logger
+
+class RingBuffer:
+    """
+        A fixed-size byte ring keeping the last 'capacity' bytes written.
+    """
+
+    __slots__ = ('data', 'capacity', 'end', 'size', 'written')
+
+    def __init__(self, capacity: int):
+        self.data = bytearray(capacity)
+        self.capacity = capacity
+        self.end = 0
+        self.size = 0
+        self.written = 0
+
+    def write(self, chunk: bytes):
+        """
+            Appends bytes, overwriting the oldest ones when full.
+        """
+
+        count = len(chunk)
+        self.written += count
+        if count >= self.capacity:
+            self.data[:] = chunk[count - self.capacity:]
+            self.end = 0
+            self.size = self.capacity
+            return
+
+        first = min(count, self.capacity - self.end)
+        self.data[self.end:self.end + first] = chunk[:first]
+        self.data[:count - first] = chunk[first:]
+        self.end = (self.end + count) % self.capacity
+        self.size = min(self.capacity, self.size + count)
+
+    def getvalue(self) -> bytes:
+        """
+            Returns the kept bytes, oldest first.
+        """
+
+        if self.size < self.capacity:
+            return bytes(self.data[self.end - self.size:self.end])
+
+        return bytes(self.data[self.end:]) + bytes(self.data[:self.end])
+
+    def clear(self):
+        """
+            Empties the ring, keeping its memory.
+        """
+
+        self.end = 0
+        self.size = 0
+        self.written = 0
+
+class RecordedStream(eventlog.BaseStream):
+    """
+        The events of one invocation, kept in a ring until it ends.
+        Has the interface of eventlog.EventStream.
+    """
+
+    def __init__(self, recorder, streamid: str, path: str, meta: dict, ring: RingBuffer):
+        super().__init__(streamid, path, meta)
+        self.recorder = recorder
+        self.dumped = False
+        self.__ring = ring
+        self.__count = 0
+        self.__lock = threading.Lock()
+
+    def emit(self, phase: str, **payload):
+        """
+            Records an event. The payload must be JSON serializable.
+        """
+
+        if self.closed:
+            return
+
+        with self.__lock:
+            if self.__ring is None:
+                return
+            self.__count += 1
+            self.__ring.write(json.dumps({'id': self.id, 'seq': self.__count, 'time': time.time(),
+                                         'phase': phase, **payload}).encode('utf-8') + b'\n')
+
+    def dump(self, **summary) -> str:
+        """
+            Writes the recorded events now; once the stream ended, its index entry too.
+            A stream dumped while running is written again, complete, when it ends.
+            Returns the path of the written file (None once the ring was released).
+        """
+
+        with self.__lock:
+            if self.__ring is None:
+                return None
+            data = self.__ring.getvalue()
+            dropped = self.__ring.written - len(data)
+            events = self.__count
+
+        if dropped > 0:
+            # The oldest event was partly overwritten
+            cut = data.find(b'\n') + 1
+            data = data[cut:]
+            dropped += cut
+
+        path = os.path.join(self.recorder.directory, self.path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmppath = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmppath, 'wb') as fh:
+            fh.write(data)
+        os.replace(tmppath, path)
+
+        self.dumped = True
+        if self.closed:
+            eventlog.appendindex(self.recorder.directory,
+                                 [self.entry(summary, events=events, dropped=dropped)])
+
+        internal_logger.log(f'Flight recorder wrote {len(data)} bytes of {self.id} to {path}')
+        return path
+
+    def close(self, **summary):
+        """
+            Ends the stream. The events are written if the invocation failed (a
+            'returncode' other than 0, or None when it raised) or a dump was requested.
+        """
+
+        if self.closed:
+            return
+
+        self.closed = True
+        try:
+            if summary.get('returncode') != 0 or self.dumped:
+                self.dump(**summary)
+        finally:
+            self.recorder.release(self)
+
+    def detach(self) -> RingBuffer:
+        """
+            Takes the ring away from the stream, which records and dumps nothing
+            afterwards, so the ring can be reused by another invocation.
+        """
+
+        with self.__lock:
+            ring, self.__ring = self.__ring, None
+
+        return ring
+
+class FlightRecorder(eventlog.EventSink):
+    """
+        Records the events of every invocation in memory and writes the failed ones.
+
+        'directory': Directory of the written streams and their index (like an event log).
+        'capacity': Bytes of events kept per invocation. (default: 4 MiB)
+        'spares': Rings kept allocated between invocations.
+    """
+
+    directory: str
+    capacity: int = 4 << 20
+    spares: int = 2
+
+    def __init__(self, directory: str, capacity: int = 4 << 20, spares: int = 2):
+        self.directory = os.path.abspath(directory)
+        self.capacity = capacity
+        self.spares = spares
+
+        self.__lock = threading.Lock()
+        self.__free = [RingBuffer(capacity) for _ in range(spares)]
+        self.__live: dict[str, RecordedStream] = {}
+
+    def open(self, meta: dict = None, streamid: str = None) -> RecordedStream:
+        """
+            Starts recording an invocation. 'meta' is copied to its index entry.
+        """
+
+        with self.__lock:
+            ring = self.__free.pop() if len(self.__free) > 0 else None
+        if ring is None:
+            ring = RingBuffer(self.capacity)
+
+        streamid, path = eventlog.newstream(streamid)
+        stream = RecordedStream(self, streamid, path, {} if meta is None else dict(meta), ring)
+        with self.__lock:
+            self.__live[streamid] = stream
+
+        return stream
+
+    def release(self, stream: RecordedStream):
+        """
+            Gives the ring of an ended stream back to the recorder.
+        """
+
+        ring = stream.detach()
+        with self.__lock:
+            self.__live.pop(stream.id, None)
+            if ring is not None and len(self.__free) < self.spares:
+                ring.clear()
+                self.__free.append(ring)
+
+    def live(self) -> list[RecordedStream]:
+        """
+            Returns the streams being recorded.
+        """
+
+        with self.__lock:
+            return list(self.__live.values())
+
+    def dump(self) -> list[str]:
+        """
+            Writes the events of every invocation being recorded (e.g. when a build hangs).
+            Returns the paths of the written files.
+        """
+
+        paths = [stream.dump() for stream in self.live()]
+        return [path for path in paths if path is not None]
+
+    def close(self):
+        """
+            Stops recording; the streams still running are dropped.
+        """
+
+        with self.__lock:
+            self.__live.clear()
+            self.__free.clear()
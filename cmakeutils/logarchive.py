@@ -0,0 +1,303 @@
+"""
+   pycmake Log Archive
+
+   Copyright (C) 2023 jppgmx
+   Licensed under MIT License
+
+   Compressed build logs that are written as a stream and read in pieces.
+   The lines are fed to a compressor as they come and cut into blocks: a
+   block ends after 'blockbytes' of text, or 'interval' seconds after its
+   first line (a flush point), and is a complete gzip member (zlib) or xz
+   stream (lzma), so the file is also readable by gzip/xz.
+   A sidecar index (<file>.idx) records the offset, size and first line of
+   every finished block; a line range is read by decompressing only the
+   blocks that hold it, and a running log can be tailed block by block.
+"""
+
+import lzma
+import os
+import struct
+import threading
+import time
+import zlib
+
+from . import eventlog
+
+CODECS = {'zlib': '.log.gz', 'lzma': '.log.xz'}
+INDEX_SUFFIX = '.idx'
+
+# offset, compressed size, first line, line count
+BLOCK = struct.Struct('<QQQI')
+
+def compressor(codec: str, level: int):
+    """
+        Returns a compressor producing one block (a gzip member or an xz stream).
+    """
+
+    if codec == 'zlib':
+        return zlib.compressobj(level, zlib.DEFLATED, 31)
+    if codec == 'lzma':
+        return lzma.LZMACompressor(lzma.FORMAT_XZ, preset=level)
+
+    raise ValueError('Unknown codec: ' + codec)
+
+def decompress(path: str, data: bytes) -> bytes:
+    """
+        Decompresses a block of a log, by the codec of its extension.
+    """
+
+    if path.endswith(CODECS['lzma']):
+        return lzma.decompress(data)
+
+    return zlib.decompress(data, 31)
+
+class LogArchiveWriter: # pylint: disable-msg=R0902
+    """
+        Writes lines to a compressed log.
+
+        'codec': 'zlib' (gzip members) or 'lzma' (xz streams).
+        'level': Compression level (zlib 0-9, lzma preset 0-9).
+        'blockbytes': Bytes of text per block.
+        'interval': Seconds after which a block with pending lines is finished,
+                    so readers see them. (None: only when full or flushed)
+    """
+
+    def __init__(self, path: str, codec: str = 'zlib', level: int = 6,
+                 blockbytes: int = 1 << 18, interval: float = 1.0):
+        self.path = os.path.abspath(path)
+        self.codec = codec
+        self.level = level
+        self.blockbytes = blockbytes
+        self.interval = interval
+        self.lines = 0
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # Both files stay open until close()
+        self.__fh = open(self.path, 'wb') # pylint: disable-msg=R1732
+        try:
+            self.__index = open(self.path + INDEX_SUFFIX, 'wb') # pylint: disable-msg=R1732
+        except OSError:
+            self.__fh.close()
+            raise
+        self.__lock = threading.Lock()
+        self.__encoder = None
+        self.__blockstart = 0
+        self.__blockline = 0
+        self.__blocksize = 0
+        self.__blocktime = 0.0
+        self.__stop = None
+
+        if interval is not None:
+            self.__stop = threading.Event()
+            threading.Thread(name='pycmake Log Archive Flusher', target=self.__flusher,
+                             daemon=True).start()
+
+    def write(self, line: str):
+        """
+            Appends a line (without its newline).
+        """
+
+        data = (line + '\n').encode('utf-8', 'surrogateescape')
+        with self.__lock:
+            if self.__encoder is None:
+                self.__encoder = compressor(self.codec, self.level)
+                self.__blockstart = self.__fh.tell()
+                self.__blockline = self.lines
+                self.__blocksize = 0
+                self.__blocktime = time.monotonic()
+
+            self.__fh.write(self.__encoder.compress(data))
+            self.lines += 1
+            self.__blocksize += len(data)
+
+            if self.__blocksize >= self.blockbytes:
+                self.__finish()
+
+    def flush(self):
+        """
+            Finishes the current block, making its lines readable.
+        """
+
+        with self.__lock:
+            self.__finish()
+
+    def close(self):
+        """
+            Finishes the last block and closes the files.
+        """
+
+        if self.__stop is not None:
+            self.__stop.set()
+
+        with self.__lock:
+            if self.__fh.closed:
+                return
+            self.__finish()
+            self.__fh.close()
+            self.__index.close()
+
+    def __finish(self):
+        if self.__encoder is None:
+            return
+
+        self.__fh.write(self.__encoder.flush())
+        self.__fh.flush()
+        end = self.__fh.tell()
+        self.__index.write(BLOCK.pack(self.__blockstart, end - self.__blockstart,
+                                      self.__blockline, self.lines - self.__blockline))
+        self.__index.flush()
+        self.__encoder = None
+
+    def __flusher(self):
+        while not self.__stop.wait(self.interval):
+            with self.__lock:
+                if self.__encoder is not None and not self.__fh.closed and \
+                        time.monotonic() - self.__blocktime >= self.interval:
+                    self.__finish()
+
+class LogArchiveReader:
+    """
+        Reads a compressed log, also while it is written.
+    """
+
+    def __init__(self, path: str):
+        self.path = os.path.abspath(path)
+
+    def blocks(self) -> list[tuple[int, int, int, int]]:
+        """
+            Returns the finished blocks: (offset, compressed size, first line, line count).
+        """
+
+        with open(self.path + INDEX_SUFFIX, 'rb') as fh:
+            data = fh.read()
+
+        usable = len(data) - len(data) % BLOCK.size
+        return [BLOCK.unpack_from(data, offset) for offset in range(0, usable, BLOCK.size)]
+
+    def count(self) -> int:
+        """
+            Returns the number of readable lines.
+        """
+
+        blocks = self.blocks()
+        return 0 if len(blocks) == 0 else blocks[-1][2] + blocks[-1][3]
+
+    def lines(self, start: int = 0, stop: int = None) -> list[str]:
+        """
+            Returns the lines [start, stop), decompressing only the blocks that hold them.
+        """
+
+        blocks = self.blocks()
+        if stop is None:
+            stop = 0 if len(blocks) == 0 else blocks[-1][2] + blocks[-1][3]
+
+        # First block holding 'start' (blocks are ordered by first line)
+        low, high = 0, len(blocks)
+        while low < high:
+            middle = (low + high) // 2
+            if blocks[middle][2] + blocks[middle][3] <= start:
+                low = middle + 1
+            else:
+                high = middle
+
+        result = []
+        with open(self.path, 'rb') as fh:
+            for offset, size, first, count in blocks[low:]:
+                if first >= stop:
+                    break
+                lines = self.__block(fh, offset, size)
+                result += lines[max(0, start - first):min(count, stop - first)]
+
+        return result
+
+    def tail(self, start: int = 0, interval: float = 0.5, until=None):
+        """
+            Yields the lines from 'start' as their blocks are finished. Stops when
+            'until()' returns True and no lines are left (never when it is None).
+        """
+
+        position = start
+        while True:
+            done = until is not None and until()
+            lines = self.lines(position)
+            yield from lines
+            position += len(lines)
+
+            if done and len(lines) == 0:
+                return
+            if len(lines) == 0:
+                time.sleep(interval)
+
+    def __block(self, fh, offset: int, size: int) -> list[str]:
+        fh.seek(offset)
+        data = decompress(self.path, fh.read(size))
+        return data.decode('utf-8', 'surrogateescape').split('\n')[:-1]
+
+class LogArchiveStream(eventlog.BaseStream):
+    """
+        The output of one invocation, written to a compressed log.
+        Has the interface of eventlog.EventStream; only 'line' events are kept.
+    """
+
+    def __init__(self, archive, streamid: str, path: str, meta: dict):
+        super().__init__(streamid, path, meta)
+        self.archive = archive
+        self.writer = LogArchiveWriter(os.path.join(archive.directory, path), archive.codec,
+                                       archive.level, archive.blockbytes, archive.interval)
+
+    def emit(self, phase: str, **payload):
+        """
+            Writes the text of 'line' events.
+        """
+
+        if phase == 'line' and not self.closed:
+            self.writer.write(payload.get('text', ''))
+
+    def close(self, **summary):
+        """
+            Finishes the log and appends its index entry.
+        """
+
+        if self.closed:
+            return
+
+        self.closed = True
+        self.writer.close()
+        eventlog.appendindex(self.archive.directory,
+                             [self.entry(summary, lines=self.writer.lines)])
+
+class LogArchive(eventlog.EventSink):
+    """
+        Archives the output of every invocation as a compressed log,
+        in the layout of an event log (a dir per day and an index).
+
+        'directory': Directory of the logs and their index.
+        'codec', 'level', 'blockbytes', 'interval': See LogArchiveWriter.
+    """
+
+    def __init__(self, directory: str, codec: str = 'zlib', level: int = 6,
+                 blockbytes: int = 1 << 18, interval: float = 1.0):
+        if codec not in CODECS:
+            raise ValueError('Unknown codec: ' + codec)
+
+        self.directory = os.path.abspath(directory)
+        self.codec = codec
+        self.level = level
+        self.blockbytes = blockbytes
+        self.interval = interval
+
+    def open(self, meta: dict = None, streamid: str = None) -> LogArchiveStream:
+        """
+            Starts the log of an invocation. 'meta' is copied to its index entry.
+        """
+
+        streamid, path = eventlog.newstream(streamid)
+        path = path[:-len('.jsonl')] + CODECS[self.codec]
+        return LogArchiveStream(self, streamid, path, {} if meta is None else dict(meta))
+
+    def reader(self, entry: dict) -> LogArchiveReader:
+        """
+            Returns the reader of a log, given its index entry.
+        """
+
+        return LogArchiveReader(os.path.join(self.directory, entry['file']))
@@ -4,16 +4,24 @@
    Copyright (c) 2023 jppgmx
    Licensed under MIT License
 
+   Messages below the log level return before any work. The caller of log()
+   is found with sys._getframe and cached per code object, and the records are
+   written to the file by a background listener, so logging never waits on disk.
 """
 
+import atexit
 import logging
 import os
+import queue
 import sys
 
-import inspect as ipc
+from logging.handlers import QueueHandler, QueueListener
 
 __loggers__: dict[str, logging.Logger] = None
 __initialized__: bool = False
+__level__: int = sys.maxsize
+__callers__: dict[object, tuple[logging.Logger, str]] = {}
+__listener__: QueueListener = None
 
 INFO     = logging.INFO
 WARN     = logging.WARN
@@ -22,55 +30,103 @@ CRITICAL = logging.CRITICAL
 FATAL    = logging.FATAL
 DEBUG    = logging.DEBUG
 
-def loginit(logfile: str):
+class DeferredQueueHandler(QueueHandler):
+    """
+        Queues records as they are; the listener thread formats them.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+def loginit(logfile: str, level: int = INFO):
     """
         Starts logging system.
     """
 
-    global __initialized__ # pylint: disable-msg=W0603
+    global __initialized__, __level__, __listener__ # pylint: disable-msg=W0603
     if __initialized__:
         return
 
+    fmt = '[%(asctime)s - pycmake API][pkg %(pkgname)s | mod %(name)s][%(levelname)s]: %(message)s'
+
+    # Left at NOTSET: the level is applied before queueing, and setlevel can lower it
     filehandler = logging.FileHandler(logfile, encoding='utf-8')
-    filehandler.level = logging.INFO
+    filehandler.setFormatter(logging.Formatter(fmt, datefmt='%b %d %Y (%H:%M:%S)'))
 
-    fmt = '[%(asctime)s - pycmake API][pkg %(pkgname)s | mod %(name)s][%(levelname)s]: %(message)s'
+    records = queue.SimpleQueue()
+    __listener__ = QueueListener(records, filehandler, respect_handler_level=True)
+    __listener__.start()
+    atexit.register(logshutdown)
 
     logging.basicConfig(
-        format=fmt,
-        datefmt='%b %d %Y (%H:%M:%S)',
-        level=logging.INFO,
+        level=level,
         force=True,
         handlers=[
-                filehandler
+                DeferredQueueHandler(records)
             ]
         )
 
     global __loggers__ # pylint: disable-msg=W0603
     __loggers__ = {}
+    __level__ = level
     __initialized__ = True
     log('Logging started!')
 
-def log(msg, level: int = INFO, modulefile: str = None):
+def logshutdown():
     """
-        Logs pycmake events.
+        Writes the pending records and stops logging. Called at exit.
     """
 
-    if not __initialized__:
-        return
+    global __initialized__, __level__, __listener__ # pylint: disable-msg=W0603
+    __initialized__ = False
+    __level__ = sys.maxsize
 
-    module = ipc.stack()[1].filename if modulefile is None else modulefile
+    if __listener__ is not None:
+        __listener__.stop()
+        for handler in __listener__.handlers:
+            handler.close()
+        __listener__ = None
+
+def enabled(level: int = INFO) -> bool:
+    """
+        Whether a message of this level would be logged.
+        Lets callers skip building messages that would be dropped.
+    """
 
-    modulename = os.path.basename(module)
-    moduleobj = __find_module_from_file(module)
-    modulepackage = 'unnamed' if len(moduleobj.__package__) == 0 else moduleobj.__package__
+    return level >= __level__
 
-    global __loggers__ # pylint: disable-msg=W0602
-    if not modulename in __loggers__:
-        # Setup logger
-        __loggers__[modulename] = logging.getLogger(modulename)
+def setlevel(level: int):
+    """
+        Changes the minimum level of the logged messages.
+    """
+
+    global __level__ # pylint: disable-msg=W0603
+    if __initialized__:
+        __level__ = level
+        logging.getLogger().setLevel(level)
+
+def log(msg, level: int = INFO, modulefile: str = None):
+    """
+        Logs pycmake events.
+    """
 
-    logger = __loggers__[modulename]
+    if level < __level__:
+        return
+
+    if modulefile is None:
+        frame = sys._getframe(1) # pylint: disable-msg=W0212
+        caller = __callers__.get(frame.f_code)
+        if caller is None:
+            caller = __caller(frame.f_code.co_filename, frame.f_globals.get('__package__'))
+            __callers__[frame.f_code] = caller
+    else:
+        caller = __callers__.get(modulefile)
+        if caller is None:
+            moduleobj = __find_module_from_file(modulefile)
+            caller = __caller(modulefile, None if moduleobj is None else moduleobj.__package__)
+            __callers__[modulefile] = caller
+
+    logger, modulepackage = caller
     logger.log(
         level=level,
         msg=msg,
@@ -79,8 +135,18 @@ def log(msg, level: int = INFO, modulefile: str = None):
             }
         )
 
+def __caller(modulefile: str, package: str) -> tuple[logging.Logger, str]:
+    modulename = os.path.basename(modulefile)
+    modulepackage = 'unnamed' if not package else package
+
+    if not modulename in __loggers__:
+        # Setup logger
+        __loggers__[modulename] = logging.getLogger(modulename)
+
+    return (__loggers__[modulename], modulepackage)
+
 def __find_module_from_file(modulefile: str):
-    for key, value in sys.modules.items():
+    for key, value in list(sys.modules.items()):
         if not key in sys.builtin_module_names:
             if hasattr(value, '__file__'):
                 if value.__file__ is None:
@@ -0,0 +1,233 @@
+"""
+   pycmake Log Index
+
+   Copyright (C) 2023 jppgmx
+   Licensed under MIT License
+
+   Full-text index over the output of invocations, in an SQLite database
+   with an FTS5 table (token -> invocation, line). As an event sink it
+   indexes each invocation when it finishes, in one transaction; logs
+   already written by an event log or a log archive can be added with
+   addlog(). Queries use the FTS5 syntax ('undefined reference', "a b",
+   foo*, NEAR(...)) and return the matching lines.
+"""
+
+import dataclasses
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from . import eventlog
+from . import logarchive
+
+SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS invocations (id TEXT PRIMARY KEY, start REAL, end REAL, '
+    'returncode INTEGER, meta TEXT)',
+    'CREATE INDEX IF NOT EXISTS invocations_start ON invocations (start)',
+    # Identifiers such as CMAKE_C_COMPILER are kept as one token
+    'CREATE VIRTUAL TABLE IF NOT EXISTS lines USING fts5(text, invocation UNINDEXED, '
+    'line UNINDEXED, tokenize="unicode61 tokenchars \'_\'")'
+]
+
+@dataclasses.dataclass
+class LogMatch:
+    """
+        A matching line.
+
+        'invocation': Id of the invocation (as in the event log index).
+        'line': Number of the line in the output (from 0).
+        'start': Start time of the invocation.
+        'returncode': Return code of the invocation.
+    """
+
+    invocation: str
+    line: int
+    text: str
+    start: float = None
+    returncode: int = None
+
+def phrase(text: str) -> str:
+    """
+        Quotes text as an FTS5 phrase, to search it literally.
+    """
+
+    return '"' + text.replace('"', '""') + '"'
+
+class LogIndexStream:
+    """
+        The output of one invocation, indexed when it ends.
+        Has the interface of eventlog.EventStream; only 'line' events are kept.
+    """
+
+    def __init__(self, index, streamid: str, meta: dict):
+        self.index = index
+        self.id = streamid
+        self.meta = meta
+        self.started = time.time()
+        self.closed = False
+        self.lines: list[str] = []
+
+    def emit(self, phase: str, **payload):
+        """
+            Keeps the text of 'line' events.
+        """
+
+        if phase == 'line' and not self.closed:
+            self.lines.append(payload.get('text', ''))
+
+    def close(self, **summary):
+        """
+            Indexes the lines.
+        """
+
+        if self.closed:
+            return
+
+        self.closed = True
+        self.index.add({'id': self.id, 'start': self.started, 'end': time.time(),
+                        **self.meta, **summary}, self.lines)
+        self.lines = []
+
+class LogIndex(eventlog.EventSink):
+    """
+        Full-text index of invocation output.
+
+        'path': Path of the SQLite database.
+    """
+
+    path: str
+
+    def __init__(self, path: str):
+        self.path = os.path.abspath(path)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        self.__lock = threading.Lock()
+        self.__db = sqlite3.connect(self.path, check_same_thread=False, timeout=30.0)
+        try:
+            self.__db.execute('PRAGMA journal_mode=WAL')
+            for statement in SCHEMA:
+                self.__db.execute(statement)
+            self.__db.commit()
+        except sqlite3.OperationalError as err:
+            self.__db.close()
+            raise RuntimeError(f'SQLite FTS5 is not available: {err}') from err
+
+    def open(self, meta: dict = None, streamid: str = None) -> LogIndexStream:
+        """
+            Starts collecting the output of an invocation.
+        """
+
+        streamid, _ = eventlog.newstream(streamid)
+        return LogIndexStream(self, streamid, {} if meta is None else dict(meta))
+
+    def add(self, entry: dict, lines: list[str]) -> bool:
+        """
+            Indexes the output of an invocation, described by its index entry
+            (id, start, end, returncode...). An invocation is indexed once.
+            Returns False if it already was.
+        """
+
+        meta = {name: val for name, val in entry.items()
+                if name not in ('id', 'start', 'end', 'returncode')}
+        with self.__lock, self.__db:
+            cursor = self.__db.execute(
+                'INSERT OR IGNORE INTO invocations VALUES (?, ?, ?, ?, ?)',
+                (entry['id'], entry.get('start'), entry.get('end'), entry.get('returncode'),
+                 json.dumps(meta))
+            )
+            if cursor.rowcount == 0:
+                return False
+
+            self.__db.executemany('INSERT INTO lines (text, invocation, line) VALUES (?, ?, ?)',
+                                  ((text, entry['id'], number)
+                                   for number, text in enumerate(lines)))
+
+        return True
+
+    def addlog(self, directory: str) -> int:
+        """
+            Indexes the invocations of an event log or log archive dir that
+            are not indexed yet. Returns the number indexed.
+        """
+
+        added = 0
+        for entry in eventlog.index(directory):
+            if self.indexed(entry['id']):
+                continue
+
+            path = os.path.join(directory, entry['file'])
+            if path.endswith(tuple(logarchive.CODECS.values())):
+                lines = logarchive.LogArchiveReader(path).lines()
+            else:
+                lines = [event.get('text', '') for event in eventlog.events(directory, entry)
+                         if event.get('phase') == 'line']
+
+            added += int(self.add(entry, lines))
+
+        return added
+
+    def indexed(self, invocation: str) -> bool:
+        """
+            Whether an invocation is indexed.
+        """
+
+        with self.__lock:
+            return self.__db.execute('SELECT 1 FROM invocations WHERE id = ?',
+                                     (invocation,)).fetchone() is not None
+
+    def search(self, query: str, since: float = None, failed: bool = None,
+               limit: int = 100) -> list[LogMatch]:
+        """
+            Returns the lines matching an FTS5 query, the last indexed first (ordering
+            by rowid lets FTS5 stop at 'limit' instead of sorting every match).
+            'since' keeps the invocations started after a timestamp,
+            'failed' only the failed (True) or successful (False) ones.
+        """
+
+        sql = ('SELECT lines.invocation, lines.line, lines.text, invocations.start, '
+               'invocations.returncode FROM lines JOIN invocations '
+               'ON invocations.id = lines.invocation WHERE lines MATCH ?')
+        params = [query]
+        if since is not None:
+            sql += ' AND invocations.start >= ?'
+            params.append(since)
+        if failed is not None:
+            sql += ' AND (invocations.returncode IS NULL OR invocations.returncode != 0)' \
+                if failed else ' AND invocations.returncode = 0'
+        sql += ' ORDER BY lines.rowid DESC LIMIT ?'
+        params.append(limit)
+
+        with self.__lock:
+            rows = self.__db.execute(sql, params).fetchall()
+
+        return [LogMatch(*row) for row in rows]
+
+    def invocation(self, invocation: str) -> dict:
+        """
+            Returns the index entry of an indexed invocation.
+        """
+
+        with self.__lock:
+            row = self.__db.execute('SELECT id, start, end, returncode, meta FROM invocations '
+                                    'WHERE id = ?', (invocation,)).fetchone()
+        if row is None:
+            return None
+
+        return {'id': row[0], 'start': row[1], 'end': row[2], 'returncode': row[3],
+                **json.loads(row[4])}
+
+    def optimize(self):
+        """
+            Merges the index segments, making it smaller and queries faster.
+        """
+
+        with self.__lock, self.__db:
+            self.__db.execute("INSERT INTO lines (lines) VALUES ('optimize')")
+
+        return self
+
+    def close(self):
+        with self.__lock:
+            self.__db.close()
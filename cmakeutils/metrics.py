@@ -0,0 +1,346 @@
+"""
+   pycmake Metrics
+
+   Copyright (C) 2023 jppgmx
+   Licensed under MIT License
+
+   Counters and histograms of pycmake (invocations, durations, output,
+   queue waits, worker callbacks) in a registry, exposed in the Prometheus
+   text format: written periodically to a file (for the node-exporter
+   textfile collector) or served on a localhost HTTP endpoint.
+"""
+
+import bisect
+import math
+import os
+import threading
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from . import logging as internal_logger
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds, from a cached configure to a long build
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+                    60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0)
+# Seconds, for callbacks run per output line
+LATENCY_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+
+def __escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def labelstring(names: tuple[str, ...], values: tuple[str, ...], extra: str = '') -> str:
+    """
+        Formats label pairs as {name="value",...} (empty without labels).
+    """
+
+    pairs = [f'{name}="{__escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+
+    return '{' + ','.join(pairs) + '}' if len(pairs) > 0 else ''
+
+def number(value: float) -> str:
+    """
+        Formats a sample value.
+    """
+
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    if float(value).is_integer() and abs(value) < 1e15:
+        return str(int(value))
+
+    return repr(float(value))
+
+class Metric:
+    """
+        Base of the metrics: a name, a help text and label names.
+    """
+
+    kind = 'untyped'
+
+    def __init__(self, name: str, helptext: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = helptext
+        self.labels = tuple(labels)
+        self.lock = threading.Lock()
+
+    def key(self, labels: dict) -> tuple[str, ...]:
+        """
+            Returns the label values of a sample, in the order of the label names.
+        """
+
+        if len(labels) != len(self.labels) or any(name not in labels for name in self.labels):
+            raise ValueError(f'{self.name} takes the labels {self.labels}, got {tuple(labels)}')
+
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def samples(self) -> list[str]:
+        """
+            Returns the sample lines of the metric.
+        """
+
+        return []
+
+    def expose(self) -> str:
+        """
+            Returns the metric in the Prometheus text format.
+        """
+
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        return '\n'.join(lines + self.samples()) + '\n'
+
+class Counter(Metric):
+    """
+        A value that only goes up.
+    """
+
+    kind = 'counter'
+
+    def __init__(self, name: str, helptext: str, labels: tuple[str, ...] = ()):
+        super().__init__(name, helptext, labels)
+        self.values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        """
+            Adds to the counter of a label set.
+        """
+
+        if amount < 0:
+            raise ValueError('Counters can not decrease.')
+
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        """
+            Returns the counter of a label set.
+        """
+
+        with self.lock:
+            return self.values.get(self.key(labels), 0)
+
+    def samples(self) -> list[str]:
+        with self.lock:
+            values = sorted(self.values.items())
+
+        return [f'{self.name}{labelstring(self.labels, key)} {number(val)}'
+                for key, val in values]
+
+class Histogram(Metric):
+    """
+        Counts observations in buckets, with their sum and count.
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, helptext: str, labels: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = DURATION_BUCKETS):
+        super().__init__(name, helptext, labels)
+        self.buckets = tuple(sorted(buckets))
+        self.values: dict[tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        """
+            Adds an observation to the histogram of a label set.
+        """
+
+        key = self.key(labels)
+        position = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                # bucket counts (the last is +Inf), sum
+                state = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][position] += 1
+            state[1] += value
+
+    def count(self, **labels) -> int:
+        """
+            Returns the number of observations of a label set.
+        """
+
+        with self.lock:
+            state = self.values.get(self.key(labels))
+            return 0 if state is None else sum(state[0])
+
+    def samples(self) -> list[str]:
+        with self.lock:
+            values = sorted((key, (list(counts), total))
+                            for key, (counts, total) in self.values.items())
+
+        lines = []
+        for key, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                bucket = labelstring(self.labels, key, f'le="{number(bound)}"')
+                lines.append(f'{self.name}_bucket{bucket} {cumulative}')
+            lines.append(f'{self.name}_sum{labelstring(self.labels, key)} {number(total)}')
+            lines.append(f'{self.name}_count{labelstring(self.labels, key)} {cumulative}')
+
+        return lines
+
+class MetricsRegistry:
+    """
+        The metrics of a process, by name.
+    """
+
+    def __init__(self):
+        self.metrics: dict[str, Metric] = {}
+        self.__lock = threading.Lock()
+
+    def counter(self, name: str, helptext: str, labels: tuple[str, ...] = ()) -> Counter:
+        """
+            Returns the counter of a name, created when missing.
+        """
+
+        return self.__get(Counter, name, helptext, labels)
+
+    def histogram(self, name: str, helptext: str, labels: tuple[str, ...] = (),
+                  buckets: tuple[float, ...] = DURATION_BUCKETS) -> Histogram:
+        """
+            Returns the histogram of a name, created when missing.
+        """
+
+        return self.__get(Histogram, name, helptext, labels, buckets)
+
+    def expose(self) -> str:
+        """
+            Returns every metric in the Prometheus text format.
+        """
+
+        with self.__lock:
+            metrics = sorted(self.metrics.values(), key=lambda metric: metric.name)
+
+        return ''.join(metric.expose() for metric in metrics)
+
+    def write(self, path: str) -> str:
+        """
+            Writes the metrics to a file, atomically (as the textfile collector expects).
+        """
+
+        path = os.path.abspath(path)
+        tmppath = f'{path}.{os.getpid()}.tmp'
+        try:
+            with open(tmppath, 'w', encoding='utf-8') as fh:
+                fh.write(self.expose())
+            os.replace(tmppath, path)
+        except BaseException:
+            if os.path.exists(tmppath):
+                os.remove(tmppath)
+            raise
+
+        return path
+
+    def __get(self, kind: type, name: str, helptext: str, labels: tuple[str, ...], *args):
+        with self.__lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = kind(name, helptext, labels, *args)
+            elif not isinstance(metric, kind) or metric.labels != tuple(labels):
+                raise ValueError(f'Metric {name} already registered as a different metric.')
+
+        return metric
+
+REGISTRY = MetricsRegistry()
+
+class MetricsFileExporter:
+    """
+        Writes a registry to a file every 'interval' seconds, and once more when closed.
+        Point it at the textfile collector dir of node-exporter (a *.prom file).
+    """
+
+    def __init__(self, path: str, interval: float = 15.0, registry: MetricsRegistry = None):
+        self.path = os.path.abspath(path)
+        self.interval = interval
+        self.registry = REGISTRY if registry is None else registry
+
+        self.__stop = threading.Event()
+        self.__thread = threading.Thread(name='pycmake Metrics Exporter', target=self.__export,
+                                         daemon=True)
+        self.__thread.start()
+
+    def export(self) -> bool:
+        """
+            Writes the registry now. A failed write is logged (the next one may work).
+        """
+
+        try:
+            self.registry.write(self.path)
+        except Exception as err: # pylint: disable-msg=W0718
+            internal_logger.log(f'Could not write metrics to {self.path}: {err}',
+                                internal_logger.WARN)
+            return False
+
+        return True
+
+    def close(self):
+        """
+            Stops the exporter after a last write.
+        """
+
+        self.__stop.set()
+        self.__thread.join()
+        self.export()
+
+    def __export(self):
+        while not self.__stop.wait(self.interval):
+            self.export()
+
+class MetricsServer:
+    """
+        Serves a registry on http://<host>:<port>/metrics (localhost by default).
+        Port 0 picks a free port, see 'port'.
+    """
+
+    def __init__(self, port: int = 9464, host: str = '127.0.0.1',
+                 registry: MetricsRegistry = None):
+        registry = REGISTRY if registry is None else registry
+
+        class Handler(BaseHTTPRequestHandler):
+            """
+                Answers /metrics.
+            """
+
+            def do_GET(self): # pylint: disable-msg=C0103
+                """
+                    Sends the metrics.
+                """
+
+                if self.path.split('?', 1)[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+
+                body = registry.expose().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args): # pylint: disable-msg=W0622
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.host = host
+        self.port = self.server.server_address[1]
+        threading.Thread(name='pycmake Metrics Server', target=self.server.serve_forever,
+                         daemon=True).start()
+
+    def url(self) -> str:
+        """
+            Returns the URL of the metrics endpoint.
+        """
+
+        return f'http://{self.host}:{self.port}/metrics'
+
+    def close(self):
+        """
+            Stops serving.
+        """
+
+        self.server.shutdown()
+        self.server.server_close()
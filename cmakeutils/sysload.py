@@ -0,0 +1,194 @@
+"""
+   pycmake System Load
+
+   Copyright (C) 2023 jppgmx
+   Licensed under MIT License
+
+   Reads the state of the machine (load average, pressure stall information
+   and available memory) so pycmake can decide whether it is safe to start more work.
+   Values that can not be read on the current platform are left as None.
+"""
+
+import dataclasses
+import math
+import os
+
+from . import platcheck as pc
+
+PROC_LOADAVG = '/proc/loadavg'
+PROC_MEMINFO = '/proc/meminfo'
+PROC_PRESSURE = '/proc/pressure'
+SYS_CGROUP = '/sys/fs/cgroup'
+
+@dataclasses.dataclass
+class SystemLoad:
+    """
+        Snapshot of the machine state.
+
+        The pressure values are the "some avg10" percentages from /proc/pressure,
+        memavailable is in bytes.
+    """
+
+    cpucount: int = 1
+    loadavg: float = None
+    cpupressure: float = None
+    memorypressure: float = None
+    iopressure: float = None
+    memavailable: int = None
+
+    def loadpercpu(self) -> float:
+        """
+            Returns the 1-minute load average divided by the usable cpus.
+        """
+
+        if self.loadavg is None:
+            return None
+
+        return self.loadavg / max(1, self.cpucount)
+
+def cpucount() -> int:
+    """
+        Returns the number of cpus this process is allowed to run on,
+        taking the affinity mask and the cgroup cpu quota into account.
+    """
+
+    if hasattr(os, 'sched_getaffinity'):
+        count = len(os.sched_getaffinity(0))
+    else:
+        count = os.cpu_count() or 1
+
+    quota = cgroupcpulimit()
+    if quota is not None:
+        count = min(count, max(1, math.ceil(quota)))
+
+    return count
+
+def cgroupcpulimit() -> float:
+    """
+        Reads the cgroup cpu quota as a number of cpus (v2 cpu.max or v1 cfs quota).
+        Returns None when there is no limit.
+    """
+
+    try:
+        with open(os.path.join(SYS_CGROUP, 'cpu.max'), 'r', encoding='ascii') as fh:
+            quota, period = fh.read().split()[:2]
+        if quota == 'max':
+            return None
+        return int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+
+    cfsdir = os.path.join(SYS_CGROUP, 'cpu')
+    try:
+        with open(os.path.join(cfsdir, 'cpu.cfs_quota_us'), 'r', encoding='ascii') as fh:
+            quota = int(fh.read())
+        with open(os.path.join(cfsdir, 'cpu.cfs_period_us'), 'r', encoding='ascii') as fh:
+            period = int(fh.read())
+        if quota <= 0 or period <= 0:
+            return None
+        return quota / period
+    except (OSError, ValueError):
+        pass
+
+    return None
+
+def cgroupmemavailable() -> int:
+    """
+        Reads the memory left before hitting the cgroup (v2) memory limit, in bytes.
+        Returns None when there is no limit.
+    """
+
+    try:
+        with open(os.path.join(SYS_CGROUP, 'memory.max'), 'r', encoding='ascii') as fh:
+            limit = fh.read().strip()
+        if limit == 'max':
+            return None
+        with open(os.path.join(SYS_CGROUP, 'memory.current'), 'r', encoding='ascii') as fh:
+            current = int(fh.read())
+        return max(0, int(limit) - current)
+    except (OSError, ValueError):
+        return None
+
+def readloadavg() -> float:
+    """
+        Reads the 1-minute load average.
+    """
+
+    try:
+        with open(PROC_LOADAVG, 'r', encoding='ascii') as fh:
+            return float(fh.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        pass
+
+    if hasattr(os, 'getloadavg'):
+        try:
+            return os.getloadavg()[0]
+        except OSError:
+            pass
+
+    return None
+
+def readpressure(resource: str) -> float:
+    """
+        Reads the "some avg10" stall percentage of a resource (cpu, memory or io).
+    """
+
+    try:
+        with open(os.path.join(PROC_PRESSURE, resource), 'r', encoding='ascii') as fh:
+            for line in fh:
+                fields = line.split()
+                if len(fields) == 0 or fields[0] != 'some':
+                    continue
+
+                for field in fields[1:]:
+                    key, _, val = field.partition('=')
+                    if key == 'avg10':
+                        return float(val)
+    except (OSError, ValueError):
+        pass
+
+    return None
+
+def readmemavailable() -> int:
+    """
+        Reads the memory available for new processes, in bytes.
+        On Linux the cgroup memory limit is taken into account.
+    """
+
+    available = None
+
+    if pc.iswindows():
+        from . import win32 # pylint: disable-msg=C0415
+        try:
+            return win32.kernel.GlobalMemoryStatusEx().ullAvailPhys
+        except OSError:
+            return None
+
+    try:
+        with open(PROC_MEMINFO, 'r', encoding='ascii') as fh:
+            for line in fh:
+                if line.startswith('MemAvailable:'):
+                    available = int(line.split()[1]) * 1024
+                    break
+    except (OSError, ValueError, IndexError):
+        pass
+
+    cgroup = cgroupmemavailable()
+    if cgroup is not None:
+        available = cgroup if available is None else min(available, cgroup)
+
+    return available
+
+def readload() -> SystemLoad:
+    """
+        Collects a snapshot of the machine state.
+    """
+
+    return SystemLoad(
+        cpucount=cpucount(),
+        loadavg=readloadavg(),
+        cpupressure=readpressure('cpu'),
+        memorypressure=readpressure('memory'),
+        iopressure=readpressure('io'),
+        memavailable=readmemavailable()
+    )
@@ -0,0 +1,255 @@
+"""
+   pycmake Tracing
+
+   Copyright (C) 2023 jppgmx
+   Licensed under MIT License
+
+   Nested timing spans of the phases of pycmake (discovery, validate,
+   compile, invoke, spawn, wait, worker callbacks), exported as Chrome
+   trace events (chrome://tracing, Perfetto) or as OTLP JSON.
+   While tracing is stopped span() returns a shared no-op span, so the
+   instrumented code costs one global lookup and a no-op 'with'.
+"""
+
+import json
+import os
+import threading
+import time
+
+__tracer__ = None
+__local__ = threading.local()
+
+class NoSpan:
+    """
+        The span returned while tracing is stopped. Does nothing.
+    """
+
+    __slots__ = ()
+
+    def event(self, name: str, **attrs): # pylint: disable-msg=W0613
+        """
+            Does nothing.
+        """
+
+    def set(self, **attrs): # pylint: disable-msg=W0613
+        """
+            Does nothing.
+        """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exctype, excvalue, traceback):
+        return False
+
+NOSPAN = NoSpan()
+
+class Span: # pylint: disable-msg=R0902
+    """
+        A timed phase. Spans opened inside it (in the same thread, or given it
+        as 'parent') are its children. Times are in nanoseconds (time.time_ns).
+    """
+
+    __slots__ = ('tracer', 'name', 'attrs', 'traceid', 'spanid', 'parentid',
+                 'start', 'end', 'thread', 'events', '__counter', '__previous')
+
+    def __init__(self, tracer, name: str, attrs: dict, parent=None):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+        self.spanid = os.urandom(8).hex()
+        self.start = 0
+        self.end = 0
+        self.thread = 0
+        self.events: list[tuple[str, int, dict]] = []
+        self.__counter = 0
+        self.__previous = None
+
+        parent = current() if parent is None else parent
+        if isinstance(parent, Span):
+            self.traceid = parent.traceid
+            self.parentid = parent.spanid
+        else:
+            self.traceid = os.urandom(16).hex()
+            self.parentid = None
+
+    def event(self, name: str, **attrs):
+        """
+            Records a point in time of the span (e.g. the first output line).
+        """
+
+        self.events.append((name, time.time_ns(), attrs))
+
+    def set(self, **attrs):
+        """
+            Adds attributes to the span (e.g. a return code known at the end).
+        """
+
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self.thread = threading.get_ident()
+        self.__previous = getattr(__local__, 'span', None)
+        __local__.span = self
+        self.__counter = time.perf_counter_ns()
+        self.start = time.time_ns()
+        return self
+
+    def __exit__(self, exctype, excvalue, traceback):
+        self.end = self.start + time.perf_counter_ns() - self.__counter
+        __local__.span = self.__previous
+        if exctype is not None:
+            self.attrs['error'] = exctype.__name__
+        self.tracer.finish(self)
+        return False
+
+class Tracer:
+    """
+        Collects finished spans.
+
+        'maxspans': Spans kept; later ones are counted in 'dropped'.
+        'service': Service name of the OTLP export.
+    """
+
+    def __init__(self, maxspans: int = 100000, service: str = 'pycmake'):
+        self.maxspans = maxspans
+        self.service = service
+        self.spans: list[Span] = []
+        self.dropped = 0
+        self.__lock = threading.Lock()
+
+    def finish(self, finished: Span):
+        """
+            Keeps a finished span.
+        """
+
+        with self.__lock:
+            if len(self.spans) < self.maxspans:
+                self.spans.append(finished)
+            else:
+                self.dropped += 1
+
+    def chrome(self) -> dict:
+        """
+            Returns the spans as Chrome trace events (complete and instant events, in µs).
+        """
+
+        pid = os.getpid()
+        with self.__lock:
+            spans = list(self.spans)
+
+        events = []
+        for item in spans:
+            events.append({'name': item.name, 'cat': 'pycmake', 'ph': 'X', 'pid': pid,
+                           'tid': item.thread, 'ts': item.start / 1000,
+                           'dur': (item.end - item.start) / 1000, 'args': item.attrs})
+            for name, stamp, attrs in item.events:
+                events.append({'name': name, 'cat': 'pycmake', 'ph': 'i', 's': 't', 'pid': pid,
+                               'tid': item.thread, 'ts': stamp / 1000, 'args': attrs})
+
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def otlp(self) -> dict:
+        """
+            Returns the spans in the OTLP JSON shape (an ExportTraceServiceRequest).
+        """
+
+        with self.__lock:
+            spans = list(self.spans)
+
+        return {'resourceSpans': [{
+            'resource': {'attributes': otlpattributes({'service.name': self.service,
+                                                       'process.pid': os.getpid()})},
+            'scopeSpans': [{
+                'scope': {'name': 'pycmake'},
+                'spans': [{
+                    'traceId': item.traceid,
+                    'spanId': item.spanid,
+                    **({} if item.parentid is None else {'parentSpanId': item.parentid}),
+                    'name': item.name,
+                    'kind': 1,
+                    'startTimeUnixNano': str(item.start),
+                    'endTimeUnixNano': str(item.end),
+                    'attributes': otlpattributes(item.attrs),
+                    'events': [{'name': name, 'timeUnixNano': str(stamp),
+                                'attributes': otlpattributes(attrs)}
+                               for name, stamp, attrs in item.events]
+                } for item in spans]
+            }]
+        }]}
+
+    def write(self, path: str, fmt: str = 'chrome'):
+        """
+            Writes the spans to a file, as 'chrome' trace events or 'otlp' JSON.
+        """
+
+        data = self.chrome() if fmt == 'chrome' else self.otlp()
+        tmppath = f'{path}.{os.getpid()}.tmp'
+        with open(tmppath, 'w', encoding='utf-8') as fh:
+            json.dump(data, fh)
+        os.replace(tmppath, path)
+
+        return path
+
+def otlpattributes(attrs: dict) -> list[dict]:
+    """
+        Converts attributes to OTLP key/value pairs.
+    """
+
+    result = []
+    for key, val in attrs.items():
+        if isinstance(val, bool):
+            value = {'boolValue': val}
+        elif isinstance(val, int):
+            value = {'intValue': str(val)}
+        elif isinstance(val, float):
+            value = {'doubleValue': val}
+        else:
+            value = {'stringValue': str(val)}
+        result.append({'key': str(key), 'value': value})
+
+    return result
+
+def starttracing(tracer: Tracer = None) -> Tracer:
+    """
+        Starts tracing into a tracer (a new one when None). Returns the tracer.
+    """
+
+    global __tracer__ # pylint: disable-msg=W0603
+    __tracer__ = Tracer() if tracer is None else tracer
+    return __tracer__
+
+def stoptracing() -> Tracer:
+    """
+        Stops tracing. Returns the tracer with the spans collected.
+    """
+
+    global __tracer__ # pylint: disable-msg=W0603
+    tracer, __tracer__ = __tracer__, None
+    return tracer
+
+def enabled() -> bool:
+    """
+        Whether tracing is started.
+    """
+
+    return __tracer__ is not None
+
+def span(name: str, parent: Span = None, **attrs) -> Span | NoSpan:
+    """
+        Returns a span to use as a context manager (the no-op span when not tracing).
+        'parent' links a span opened in another thread.
+    """
+
+    tracer = __tracer__
+    if tracer is None:
+        return NOSPAN
+
+    return Span(tracer, name, attrs, parent)
+
+def current() -> Span | NoSpan:
+    """
+        Returns the innermost open span of the thread (the no-op span when none).
+    """
+
+    return getattr(__local__, 'span', None) or NOSPAN
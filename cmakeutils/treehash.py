@@ -0,0 +1,261 @@
+"""
+   pycmake Tree Hashing
+
+   Copyright (C) 2023 jppgmx
+   Licensed under MIT License
+
+   Hashes directory trees (e.g. a source dir) to produce content fingerprints.
+   The tree is walked with os.scandir and the files are hashed on a thread pool
+   (hashlib releases the GIL). A (path, size, mtime, inode) -> digest cache,
+   optionally persisted, makes re-hashing touch only the files that changed.
+   Clean git checkouts use the blob ids from "git ls-files -s" instead.
+"""
+
+import dataclasses
+import hashlib
+import json
+import os
+import subprocess as sp
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from . import logging as internal_logger
+
+# Files modified this close to the scan are not cached, their mtime may not change
+# again if they are modified within the timestamp granularity.
+RACY_NS = 2 * 1000 * 1000 * 1000
+
+@dataclasses.dataclass
+class TreeDigest:
+    """
+        Result of hashing a tree.
+
+        'digest': Digest of the whole tree, prefixed by the method ('git:' or the algorithm).
+        'files': Digest of every file, by path relative to the root ('/' separated).
+        'hashed': Number of files that were actually read.
+    """
+
+    root: str
+    digest: str
+    files: dict[str, str]
+    hashed: int = 0
+
+class TreeHasher: # pylint: disable-msg=R0902
+    """
+        Hashes trees, keeping a stat cache between calls.
+
+        'cachefile': (Optional) File where the stat cache is persisted.
+        'workers': Threads used to hash files. (default: cpu count)
+        'exclude': Directory or file names that are skipped everywhere.
+        'usegit': Use the git index of clean checkouts.
+    """
+
+    algorithm: str = 'sha256'
+    cachefile: str = None
+    workers: int = None
+    exclude: set[str] = None
+    usegit: bool = True
+
+    def __init__(self, cachefile: str = None, workers: int = None, algorithm: str = 'sha256',
+                 exclude: list[str] = None, usegit: bool = True):
+        self.algorithm = algorithm
+        self.cachefile = cachefile
+        self.workers = workers if workers is not None else min(32, (os.cpu_count() or 1) + 4)
+        self.exclude = set(['.git', '.hg', '.svn', '__pycache__'] if exclude is None else exclude)
+        self.usegit = usegit
+
+        self.__lock = threading.Lock()
+        self.__cache: dict[str, list] = {}
+        self.__dirty = False
+
+        if cachefile is not None:
+            self.__loadcache()
+
+    def hashtree(self, root: str, skip: list[str] = None) -> TreeDigest:
+        """
+            Hashes a directory tree. Directories listed in 'skip' (e.g. a build dir
+            inside the source dir) are left out.
+        """
+
+        root = os.path.abspath(root)
+        skip = set() if skip is None else {os.path.abspath(path) for path in skip}
+
+        if self.usegit:
+            result = self.__hashgit(root, skip)
+            if result is not None:
+                return result
+
+        return self.__hashwalk(root, skip)
+
+    def hashfile(self, path: str) -> str:
+        """
+            Hashes a single file.
+        """
+
+        digest = hashlib.new(self.algorithm)
+        with open(path, 'rb') as fh:
+            for block in iter(lambda: fh.read(1 << 20), b''):
+                digest.update(block)
+
+        return digest.hexdigest()
+
+    def save(self):
+        """
+            Writes the stat cache to the cache file, if it changed.
+        """
+
+        with self.__lock:
+            if self.cachefile is None or not self.__dirty:
+                return self
+
+            data = json.dumps({'algorithm': self.algorithm, 'entries': self.__cache},
+                              separators=(',', ':'))
+            self.__dirty = False
+
+        directory = os.path.dirname(os.path.abspath(self.cachefile))
+        os.makedirs(directory, exist_ok=True)
+
+        tmpfile = f'{self.cachefile}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmpfile, 'w', encoding='utf-8') as fh:
+            fh.write(data)
+        os.replace(tmpfile, self.cachefile)
+
+        return self
+
+    def __hashwalk(self, root: str, skip: set[str]) -> TreeDigest:
+        started = time.time_ns()
+        files: dict[str, str] = {}
+        pending = []
+
+        with ThreadPoolExecutor(max_workers=self.workers,
+                                thread_name_prefix='pycmake Hasher') as pool:
+            for relpath, path, stat, link in self.__walk(root, skip):
+                if link is not None:
+                    files[relpath] = 'link:' + link
+                    continue
+
+                key = [stat.st_size, stat.st_mtime_ns, stat.st_ino]
+                with self.__lock:
+                    cached = self.__cache.get(path)
+
+                if cached is not None and cached[:3] == key:
+                    files[relpath] = cached[3]
+                    continue
+
+                cacheable = stat.st_mtime_ns < started - RACY_NS
+                pending.append((relpath, path, key, cacheable,
+                                pool.submit(self.hashfile, path)))
+
+            hashed = self.__gather(pending, files)
+
+        internal_logger.log(f'Hashed {root}: {len(files)} files, {hashed} read')
+        return TreeDigest(root, self.algorithm + ':' + self.__combine(files), files, hashed)
+
+    def __gather(self, pending: list[tuple], files: dict[str, str]) -> int:
+        # Collects the digests of the submitted files, returns how many were read
+        hashed = 0
+        for relpath, path, key, cacheable, future in pending:
+            try:
+                digest = future.result()
+            except OSError as err:
+                internal_logger.log(f'Could not hash {path}: {err}', internal_logger.WARN)
+                continue
+
+            hashed += 1
+            files[relpath] = digest
+            if cacheable:
+                with self.__lock:
+                    self.__cache[path] = key + [digest]
+                    self.__dirty = True
+
+        return hashed
+
+    def __walk(self, root: str, skip: set[str]):
+        stack = [(root, '')]
+        while len(stack) > 0:
+            directory, prefix = stack.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.name in self.exclude:
+                            continue
+
+                        relpath = prefix + entry.name
+                        if entry.is_symlink():
+                            yield (relpath, entry.path, None, os.readlink(entry.path))
+                        elif entry.is_dir():
+                            if entry.path not in skip:
+                                stack.append((entry.path, relpath + '/'))
+                        elif entry.is_file():
+                            yield (relpath, entry.path, entry.stat(), None)
+            except OSError as err:
+                internal_logger.log(f'Could not scan {directory}: {err}', internal_logger.WARN)
+
+    def __hashgit(self, root: str, skip: set[str]) -> TreeDigest:
+        def __git(*args) -> bytes:
+            return sp.run(['git', '-C', root, *args], stdout=sp.PIPE, stderr=sp.DEVNULL,
+                          check=True).stdout
+
+        try:
+            if __git('rev-parse', '--is-inside-work-tree').strip() != b'true':
+                return None
+            if __git('status', '--porcelain', '-z', '--', '.') != b'':
+                internal_logger.log(f'{root} has local changes, hashing the files.')
+                return None
+            listing = __git('ls-files', '-s', '-z', '--', '.')
+        except (OSError, sp.CalledProcessError):
+            return None
+
+        skipped = [os.path.relpath(path, root).replace(os.sep, '/') + '/' for path in skip]
+
+        files = {}
+        for record in listing.split(b'\0'):
+            if len(record) == 0:
+                continue
+
+            meta, _, path = record.partition(b'\t')
+            mode, blob, _ = meta.split(b' ', 2)
+            relpath = path.decode('utf-8', errors='surrogateescape')
+            if len(set(relpath.split('/')) & self.exclude) > 0:
+                continue
+            if any(relpath.startswith(prefix) for prefix in skipped):
+                continue
+
+            files[relpath] = f'{mode.decode()}:{blob.decode()}'
+
+        internal_logger.log(f'Hashed {root} from the git index: {len(files)} files')
+        return TreeDigest(root, 'git:' + self.__combine(files), files, 0)
+
+    def __combine(self, files: dict[str, str]) -> str:
+        digest = hashlib.new(self.algorithm)
+        for relpath in sorted(files):
+            digest.update(f'{relpath}\0{files[relpath]}\n'.encode('utf-8', 'surrogateescape'))
+
+        return digest.hexdigest()
+
+    def __loadcache(self):
+        try:
+            with open(self.cachefile, 'r', encoding='utf-8') as fh:
+                data = json.load(fh)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as err:
+            internal_logger.log(f'Ignoring hash cache {self.cachefile}: {err}',
+                                internal_logger.WARN)
+            return
+
+        if isinstance(data, dict) and data.get('algorithm') == self.algorithm:
+            self.__cache = data.get('entries', {})
+
+def hashtree(root: str, cachefile: str = None) -> TreeDigest:
+    """
+        Hashes a directory tree with a one-off hasher, saving its cache if given.
+    """
+
+    hasher = TreeHasher(cachefile)
+    result = hasher.hashtree(root)
+    hasher.save()
+
+    return result
@@ -10,29 +10,19 @@
 def isdict(obj: object, key: type, value: type) -> bool:
     """
         Check if object is a dict with specified type values.
+        None keys and values are allowed; the other ones must be of exactly
+        these types. Stops at the first mismatch.
     """
 
     if not isinstance(obj, dict):
         return False
 
-    if len(obj) == 0:
-        return True
+    # Exact types on purpose: a bool is not accepted as an int
+    # pylint: disable-msg=C0123
+    for k, v in obj.items():
+        if k is not None and type(k) is not key:
+            return False
+        if v is not None and type(v) is not value:
+            return False
 
-    keytypes = list(
-            {type(k) for k in filter(lambda k: k is not None, obj.keys())}
-        )
-    valuetypes = list(
-            {type(v) for v in filter(lambda v: v is not None, obj.values())}
-        )
-
-    if len(keytypes) == 1 and len(valuetypes) == 0:
-        return keytypes[0] == key
-    if len(keytypes) == 0 and len(valuetypes) == 1:
-        return valuetypes[0] == value
-    if len(keytypes) >= 2 and len(valuetypes) >= 2:
-        return False
-
-    ktype = keytypes[0]
-    vtype = valuetypes[0]
-
-    return ktype == key and vtype == value
+    return True
@@ -12,7 +12,11 @@
     FormatMessage,
     GetLastError,
     SetSearchPathMode,
-    SearchPath
+    SearchPath,
+    GlobalMemoryStatusEx,
+    SetProcessAffinityMask,
+    LockFileEx,
+    UnlockFileEx
 """
 
 #
@@ -33,6 +37,8 @@ AllocOptions = wc.AllocOptions
 FormatOptions = wc.FormatOptions
 FormatSource = wc.FormatSource
 SearchMode = wc.SearchMode
+PriorityClass = wc.PriorityClass
+LockOptions = wc.LockOptions
 
 ErrCodes = werr.Win32ErrorCodes
 
@@ -238,6 +244,101 @@ def SearchPath(filename: str, ext: str = None, path: str = None) -> tuple[str, s
     _filepath = (buffer.value, filepart.value)
     return _filepath
 
+def GlobalMemoryStatusEx() -> wc.MEMORYSTATUSEX:
+    """
+        Gets the current usage of physical and virtual memory.
+    """
+
+    memstatus = __getkrnl32().GlobalMemoryStatusEx
+    memstatus.argtypes = [
+        ct.POINTER(wc.MEMORYSTATUSEX)
+    ]
+    memstatus.restype = wt.BOOL
+
+    status = wc.MEMORYSTATUSEX()
+    status.dwLength = ct.sizeof(wc.MEMORYSTATUSEX)
+
+    if memstatus(ct.byref(status)) == 0:
+        dwcode = GetLastError()
+        raise ct.WinError(dwcode, FormatMessage(FormatSource.FS_SYSTEM, code=dwcode))
+
+    return status
+
+def SetProcessAffinityMask(process: wt.HANDLE, mask: int) -> bool:
+    """
+        Sets the processors the threads of a process are allowed to run on.
+    """
+
+    setaffinity = __getkrnl32().SetProcessAffinityMask
+    setaffinity.argtypes = [
+        wt.HANDLE,
+        wc.DWORD_PTR
+    ]
+    setaffinity.restype = wt.BOOL
+
+    if setaffinity(process, wc.DWORD_PTR(mask)) == 0:
+        dwcode = GetLastError()
+        raise ct.WinError(dwcode, FormatMessage(FormatSource.FS_SYSTEM, code=dwcode))
+
+    return True
+
+def LockFileEx(handle: wt.HANDLE, options: LockOptions, offset: int = 0,
+               length: int = 1) -> bool:
+    """
+        Locks a byte range of an open file, shared unless LO_EXCLUSIVE is given.
+        With LO_FAIL_IMMEDIATELY, returns False when another handle holds the range.
+    """
+
+    lockfile = __getkrnl32().LockFileEx
+    lockfile.argtypes = [
+        wt.HANDLE,
+        wt.DWORD,
+        wt.DWORD,
+        wt.DWORD,
+        wt.DWORD,
+        ct.POINTER(wc.OVERLAPPED)
+    ]
+    lockfile.restype = wt.BOOL
+
+    overlapped = wc.OVERLAPPED()
+    overlapped.Offset = offset & 0xFFFFFFFF
+    overlapped.OffsetHigh = offset >> 32
+
+    if lockfile(handle, int(options), 0, length & 0xFFFFFFFF, length >> 32,
+                ct.byref(overlapped)) != 0:
+        return True
+
+    dwcode = GetLastError()
+    if dwcode == ErrCodes.ERROR_LOCK_VIOLATION.value:
+        return False
+
+    raise ct.WinError(dwcode, FormatMessage(FormatSource.FS_SYSTEM, code=dwcode))
+
+def UnlockFileEx(handle: wt.HANDLE, offset: int = 0, length: int = 1) -> bool:
+    """
+        Unlocks a byte range locked with LockFileEx.
+    """
+
+    unlockfile = __getkrnl32().UnlockFileEx
+    unlockfile.argtypes = [
+        wt.HANDLE,
+        wt.DWORD,
+        wt.DWORD,
+        wt.DWORD,
+        ct.POINTER(wc.OVERLAPPED)
+    ]
+    unlockfile.restype = wt.BOOL
+
+    overlapped = wc.OVERLAPPED()
+    overlapped.Offset = offset & 0xFFFFFFFF
+    overlapped.OffsetHigh = offset >> 32
+
+    if unlockfile(handle, 0, length & 0xFFFFFFFF, length >> 32, ct.byref(overlapped)) == 0:
+        dwcode = GetLastError()
+        raise ct.WinError(dwcode, FormatMessage(FormatSource.FS_SYSTEM, code=dwcode))
+
+    return True
+
 def __getkrnl32() -> ct.WinDLL:
     if not pc.iswindows():
         raise OSError('Cannot use Kernel32 in a different system!')
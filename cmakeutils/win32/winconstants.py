@@ -24,7 +24,45 @@ DWORD_PTR = ct.c_ulonglong if maxsize > 2**32 else ct.c_uint # pylint: disable-m
 
 MAX_PATH: int = 260
 
+class MEMORYSTATUSEX(ct.Structure): # pylint: disable-msg=C0103,R0903
+    """
+        Information about physical and virtual memory, filled by GlobalMemoryStatusEx.
+    """
+
+    _fields_ = [
+        ('dwLength', ct.c_ulong),
+        ('dwMemoryLoad', ct.c_ulong),
+        ('ullTotalPhys', ct.c_ulonglong),
+        ('ullAvailPhys', ct.c_ulonglong),
+        ('ullTotalPageFile', ct.c_ulonglong),
+        ('ullAvailPageFile', ct.c_ulonglong),
+        ('ullTotalVirtual', ct.c_ulonglong),
+        ('ullAvailVirtual', ct.c_ulonglong),
+        ('ullAvailExtendedVirtual', ct.c_ulonglong)
+    ]
+
+class OVERLAPPED(ct.Structure): # pylint: disable-msg=C0103,R0903
+    """
+        Position of an asynchronous or locking file operation.
+    """
+
+    _fields_ = [
+        ('Internal', ct.c_void_p),
+        ('InternalHigh', ct.c_void_p),
+        ('Offset', ct.c_ulong),
+        ('OffsetHigh', ct.c_ulong),
+        ('hEvent', ct.c_void_p)
+    ]
+
 # Options
+class LockOptions(IntFlag):
+    """
+        Options of LockFileEx.
+    """
+
+    LO_FAIL_IMMEDIATELY = 0x00000001
+    LO_EXCLUSIVE = 0x00000002
+
 class SearchMode(IntFlag):
     """
         Set search mode when using SearchPath function.
@@ -51,6 +89,17 @@ class FormatOptions(IntFlag):
     FO_IGNORE_INSERTS = 0x00000200
     FO_VALUEARR_INSTEAD_VALIST = 0x00002000
 
+class PriorityClass(IntFlag):
+    """
+        Process priority classes, passed as creation flags when starting a process.
+    """
+
+    PC_IDLE = 0x00000040
+    PC_BELOW_NORMAL = 0x00004000
+    PC_NORMAL = 0x00000020
+    PC_ABOVE_NORMAL = 0x00008000
+    PC_HIGH = 0x00000080
+
 class AllocOptions(IntFlag):
     """
         Options that LocalAlloc uses to allocate a block of memory.
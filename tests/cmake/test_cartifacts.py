@@ -0,0 +1,87 @@
+import os
+
+from cmake import cfingerprint as cfp
+from cmake.cartifacts import CMakeInstallCache
+from cmake.ccmd import CMakeBuildCommand, CMakeConfigure, CMakeInstallCommand
+from cmake.cinstance import CMakeInst
+
+def __tree(prefix):
+    return sorted(os.path.relpath(os.path.join(d, f), prefix)
+                  for d, _, files in os.walk(prefix) for f in files)
+
+def test_store_restore_evict(tmp_path):
+    prefix = tmp_path / 'prefix'
+    (prefix / 'bin').mkdir(parents=True)
+    (prefix / 'bin' / 'app').write_bytes(b'binary')
+    (prefix / 'include.h').write_text('int f();')
+
+    cache = CMakeInstallCache(str(tmp_path / 'cache'), budget=1 << 20, grace=0)
+    assert not cache.restore('k1', str(tmp_path / 'out'))
+    assert cache.store('k1', str(prefix))
+    assert not cache.store('k1', str(prefix))
+
+    out = tmp_path / 'out'
+    assert cache.restore('k1', str(out))
+    assert __tree(str(out)) == ['bin/app', 'include.h']
+    assert (out / 'bin' / 'app').read_bytes() == b'binary'
+
+    cache.budget = 0
+    assert cache.evict() == ['k1']
+    assert not cache.contains('k1')
+
+def test_restore_replaces_prefix(tmp_path):
+    prefix = tmp_path / 'prefix'
+    prefix.mkdir()
+    (prefix / 'lib.a').write_bytes(b'new')
+
+    cache = CMakeInstallCache(str(tmp_path / 'cache'))
+    assert cache.store('k1', str(prefix))
+
+    out = tmp_path / 'out'
+    out.mkdir()
+    (out / 'stale.a').write_bytes(b'old')
+    assert cache.restore('k1', str(out))
+    assert __tree(str(out)) == ['lib.a']
+    assert sorted(os.listdir(str(tmp_path))) == ['cache', 'out', 'prefix']
+
+def test_key_ignores_parallelism(tmp_path):
+    (tmp_path / 'CMakeLists.txt').write_text('project(app C)\n')
+    cmake = CMakeInst('cmake', '3.25.1')
+    cache = CMakeInstallCache(str(tmp_path / 'cache'))
+    configure = CMakeConfigure(source_dir=str(tmp_path), build_dir=str(tmp_path / 'build'),
+                               install_prefix=str(tmp_path / 'prefix'))
+    install = CMakeInstallCommand(install_path=str(tmp_path / 'build'))
+
+    key = cache.key(cmake, configure, CMakeBuildCommand(), install)
+    assert cache.key(cmake, configure.with_(job_pools=True),
+                     CMakeBuildCommand(max_jobs='16'), install) == key
+    assert cache.key(cmake, configure.with_(generator='Unix Makefiles'),
+                     CMakeBuildCommand(), install) != key
+
+def test_key_contents_and_environment(tmp_path):
+    (tmp_path / 'CMakeLists.txt').write_text('project(app C)\n')
+    script = tmp_path / 'cache.cmake'
+    script.write_text('set(OPT ON CACHE BOOL "")\n')
+    cmake = CMakeInst('cmake', '3.25.1')
+    cmake.environ = {'PATH': '/usr/bin', 'CC': 'gcc', 'HOME': '/root'}
+    cache = CMakeInstallCache(str(tmp_path / 'cache'))
+    configure = CMakeConfigure(source_dir=str(tmp_path), build_dir=str(tmp_path / 'build'),
+                               initial_cache=str(script))
+
+    keys = {cache.key(cmake, configure)}
+    script.write_text('set(OPT OFF CACHE BOOL "")\n')
+    keys.add(cache.key(cmake, configure))
+
+    part = cfp.seedscript(configure, 'check-results', ['set(HAVE_X 1 CACHE INTERNAL "")'])
+    keys.add(cache.key(cmake, configure))
+    with open(part, 'a', encoding='utf-8') as fh:
+        fh.write('set(HAVE_Y 1 CACHE INTERNAL "")\n')
+    keys.add(cache.key(cmake, configure))
+
+    for environ in ({'PATH': '/usr/bin', 'CC': 'clang'}, {'PATH': '/opt/bin', 'CC': 'gcc'}):
+        cmake.environ = environ
+        keys.add(cache.key(cmake, configure))
+    assert len(keys) == 6
+
+    cmake.environ = {'PATH': '/opt/bin', 'CC': 'gcc', 'HOME': '/home/other'}
+    assert cache.key(cmake, configure) in keys
@@ -0,0 +1,50 @@
+from cmake.ccache import CMakeCache
+
+CACHE = '''# This is the CMakeCache file.
+
+########################
+# EXTERNAL cache entries
+########################
+
+//Choose the type of build, options are: None Debug Release RelWithDebInfo
+// MinSizeRel ...
+CMAKE_BUILD_TYPE:STRING=Debug
+
+//Build shared libraries
+BUILD_SHARED_LIBS:BOOL=OFF
+
+"ODD:NAME":STRING=value
+
+########################
+# INTERNAL cache entries
+########################
+
+//ADVANCED property for variable: BUILD_SHARED_LIBS
+BUILD_SHARED_LIBS-ADVANCED:INTERNAL=1
+//Have include stdio.h
+HAVE_STDIO_H:INTERNAL=1
+'''
+
+def test_ccache(tmp_path):
+    path = tmp_path / 'CMakeCache.txt'
+    path.write_text(CACHE)
+
+    cache = CMakeCache(str(tmp_path))
+    assert cache['CMAKE_BUILD_TYPE'] == 'Debug'
+    assert cache.entry('CMAKE_BUILD_TYPE').help.endswith('RelWithDebInfo MinSizeRel ...')
+    assert cache.entry('BUILD_SHARED_LIBS').advanced
+    assert cache.entry('BUILD_SHARED_LIBS').tovalue().value is False
+    assert cache['ODD:NAME'] == 'value'
+    assert 'BUILD_SHARED_LIBS-ADVANCED' not in cache
+
+    old = CMakeCache(str(path))
+    cache['CMAKE_BUILD_TYPE'] = 'Release'
+    cache.write()
+    assert not cache.changed()
+
+    assert old.reload()
+    assert old['CMAKE_BUILD_TYPE'] == 'Release'
+    assert old.entry('HAVE_STDIO_H').help == 'Have include stdio.h'
+
+    diff = CMakeCache(str(tmp_path), load=False).diff(old)
+    assert len(diff.added) == len(old) and diff.empty() is False
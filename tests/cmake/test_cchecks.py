@@ -0,0 +1,108 @@
+import os
+import sys
+
+from cmake.ccmd import CMakeConfigure
+from cmake.cchecks import CMakeCheckCache
+from cmake.cinstance import CMakeInst
+
+CACHE = '''# This is the CMakeCache file.
+
+CMAKE_C_COMPILER:FILEPATH={compiler}
+
+//Have include stdio.h
+HAVE_STDIO_H:INTERNAL=1
+//Have symbol nothing
+HAVE_NOTHING:INTERNAL=
+//Not a check
+OTHER:INTERNAL=x
+'''
+
+def test_harvest_and_seed(tmp_path):
+    first = tmp_path / 'first'
+    first.mkdir()
+    (first / 'CMakeCache.txt').write_text(CACHE.format(compiler=sys.executable))
+
+    cmake = CMakeInst('cmake', '3.25.1')
+    store = CMakeCheckCache(str(tmp_path / 'store'))
+    assert store.harvest(cmake, CMakeConfigure(build_dir=str(first))) == 2
+
+    user = tmp_path / 'user.cmake'
+    user.write_text('set(USER ON CACHE BOOL "")')
+    configure = CMakeConfigure(build_dir=str(tmp_path / 'second'), initial_cache=str(user))
+    assert store.seed(cmake, configure) == 2
+
+    part = tmp_path / 'second' / '.pycmake' / 'check-results.cmake'
+    content = part.read_text()
+    assert 'set(HAVE_STDIO_H "1" CACHE INTERNAL "Have include stdio.h")' in content
+    assert 'set(HAVE_NOTHING "" CACHE INTERNAL "Have symbol nothing")' in content
+    assert 'OTHER' not in content
+
+    # Seeding again keeps including the user's initial cache, once, and first
+    assert store.seed(cmake, configure) == 2
+    with open(configure['initial_cache'], 'r', encoding='utf-8') as fh:
+        includes = [line for line in fh.read().splitlines() if line.startswith('include(')]
+    assert len(includes) == 2
+    assert 'user.cmake' in includes[0] and 'check-results.cmake' in includes[1]
+
+    # Another toolchain selection has no results
+    other = CMakeConfigure(build_dir=str(tmp_path / 'third'),
+                           variables={'CMAKE_C_COMPILER': 'clang'})
+    assert store.seed(cmake, other) == 0
+    assert not os.path.exists(os.path.join(str(tmp_path / 'third'), '.pycmake'))
+
+def test_other_compiler_keeps_record(tmp_path):
+    compiler = tmp_path / 'cc'
+    compiler.write_bytes(b'compiler 1')
+    first = tmp_path / 'first'
+    first.mkdir()
+    (first / 'CMakeCache.txt').write_text(CACHE.format(compiler=str(compiler)))
+
+    cmake = CMakeInst('cmake', '3.25.1')
+    store = CMakeCheckCache(str(tmp_path / 'store'))
+    assert store.harvest(cmake, CMakeConfigure(build_dir=str(first))) == 2
+
+    # This machine has another compiler at that path: nothing seeded, record kept
+    compiler.write_bytes(b'compiler 2, rebuilt')
+    configure = CMakeConfigure(build_dir=str(tmp_path / 'second'))
+    assert store.seed(cmake, configure) == 0
+    assert store.validate(cmake, configure)
+
+    # Its results are stored as another record of the key
+    second = tmp_path / 'second'
+    second.mkdir()
+    (second / 'CMakeCache.txt').write_text(CACHE.format(compiler=str(compiler)))
+    assert store.harvest(cmake, configure) == 2
+    assert len(os.listdir(str(tmp_path / 'store' / store.key(cmake, configure)))) == 2
+    assert store.seed(cmake, CMakeConfigure(build_dir=str(tmp_path / 'third'))) == 2
+
+    compiler.write_bytes(b'compiler 1')
+    assert store.seed(cmake, CMakeConfigure(build_dir=str(tmp_path / 'fourth'))) == 2
+
+def test_found_compiler_differs(tmp_path):
+    compilers = [tmp_path / 'gcc-11', tmp_path / 'gcc-12']
+    for path in compilers:
+        path.write_bytes(path.name.encode())
+    first = tmp_path / 'first'
+    first.mkdir()
+    (first / 'CMakeCache.txt').write_text(CACHE.format(compiler=str(compilers[0])))
+
+    cmake = CMakeInst('cmake', '3.25.1')
+    store = CMakeCheckCache(str(tmp_path / 'store'))
+    assert store.harvest(cmake, CMakeConfigure(build_dir=str(first))) == 2
+
+    # The configure found the other compiler: the seeded results don't fit,
+    # but the stored ones stay for the machines that find the first
+    configure = CMakeConfigure(build_dir=str(tmp_path / 'second'))
+    assert store.seed(cmake, configure) == 2
+    (tmp_path / 'second' / 'CMakeCache.txt').write_text(
+        CACHE.format(compiler=str(compilers[1])))
+    assert not store.validate(cmake, configure)
+    assert store.harvest(cmake, configure) == 2
+    key = os.path.join(str(tmp_path / 'store'), store.key(cmake, configure))
+    assert len(os.listdir(key)) == 2
+
+    # Which compiler CMake finds in a fresh build dir can't be told
+    assert store.seed(cmake, CMakeConfigure(build_dir=str(tmp_path / 'third'))) == 0
+
+    compilers[1].unlink()
+    assert store.seed(cmake, CMakeConfigure(build_dir=str(tmp_path / 'fourth'))) == 2
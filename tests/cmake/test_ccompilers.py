@@ -0,0 +1,93 @@
+import os
+import sys
+
+from cmake.ccmd import CMakeConfigure
+from cmake.ccompilers import CMakeCompilerCache
+from cmake.cinstance import CMakeInst
+
+def test_capture_and_seed(tmp_path):
+    first = tmp_path / 'first'
+    platform = first / 'CMakeFiles' / '3.25.1'
+    platform.mkdir(parents=True)
+    (platform / 'CMakeSystem.cmake').write_text('set(CMAKE_SYSTEM_NAME "Linux")')
+    (platform / 'CMakeCCompiler.cmake').write_text('set(CMAKE_C_COMPILER_ID "GNU")')
+    (first / 'CMakeCache.txt').write_text(
+        f'CMAKE_C_COMPILER:FILEPATH={sys.executable}\nCMAKE_AR:FILEPATH=/usr/bin/ar\n')
+
+    cmake = CMakeInst('cmake', '3.25.1')
+    store = CMakeCompilerCache(str(tmp_path / 'store'))
+    assert store.capture(cmake, CMakeConfigure(build_dir=str(first)))
+
+    second = tmp_path / 'second'
+    configure = CMakeConfigure(build_dir=str(second))
+    assert store.seed(cmake, configure)
+    assert sorted(os.listdir(second / 'CMakeFiles' / '3.25.1')) == \
+        ['CMakeCCompiler.cmake', 'CMakeSystem.cmake']
+
+    part = (second / '.pycmake' / 'compiler-id.cmake').read_text()
+    assert 'set(CMAKE_PLATFORM_INFO_INITIALIZED 1 CACHE INTERNAL "")' in part
+    assert 'set(CMAKE_AR "/usr/bin/ar" CACHE FILEPATH "")' in part
+
+    # A configured build dir is left alone
+    assert not store.seed(cmake, CMakeConfigure(build_dir=str(first)))
+
+def test_records_per_compiler(tmp_path):
+    compiler = tmp_path / 'cc'
+    compiler.write_bytes(b'compiler 1')
+    first = tmp_path / 'first'
+    platform = first / 'CMakeFiles' / '3.25.1'
+    platform.mkdir(parents=True)
+    (platform / 'CMakeCCompiler.cmake').write_text('set(CMAKE_C_COMPILER_VERSION "1")')
+    (first / 'CMakeCache.txt').write_text(f'CMAKE_C_COMPILER:FILEPATH={compiler}\n')
+
+    cmake = CMakeInst('cmake', '3.25.1')
+    store = CMakeCompilerCache(str(tmp_path / 'store'))
+    configure = CMakeConfigure(build_dir=str(first))
+    assert store.capture(cmake, configure)
+    assert not store.capture(cmake, configure)
+
+    # Another machine, another compiler at that path: skipped, not removed
+    compiler.write_bytes(b'compiler 2, rebuilt')
+    assert not store.seed(cmake, CMakeConfigure(build_dir=str(tmp_path / 'second')))
+    assert store.capture(cmake, configure)
+
+    compiler.write_bytes(b'compiler 1')
+    assert store.seed(cmake, CMakeConfigure(build_dir=str(tmp_path / 'third')))
+
+def test_key_selection(tmp_path):
+    cmake = CMakeInst('cmake', '3.25.1')
+    store = CMakeCompilerCache(str(tmp_path / 'store'))
+    plain = store.key(cmake, CMakeConfigure(), {'PATH': '/usr/bin'})
+
+    for variables, environ in (({'CMAKE_C_FLAGS': '-m32'}, {'PATH': '/usr/bin'}),
+                               ({'CMAKE_SYSTEM_NAME': 'Android'}, {'PATH': '/usr/bin'}),
+                               ({'CMAKE_SYSROOT': '/sysroot'}, {'PATH': '/usr/bin'}),
+                               ({}, {'PATH': '/usr/bin', 'CFLAGS': '-m32'}),
+                               ({}, {'PATH': '/opt/gcc/bin:/usr/bin'})):
+        assert store.key(cmake, CMakeConfigure(variables=variables), environ) != plain
+
+    assert store.key(cmake, CMakeConfigure(variables={'BUILD_TESTING': 'ON'}),
+                     {'PATH': '/usr/bin', 'HOME': '/root'}) == plain
+
+def test_ambiguous_records(tmp_path):
+    cmake = CMakeInst('cmake', '3.25.1')
+    store = CMakeCompilerCache(str(tmp_path / 'store'))
+
+    for version in ('11', '12'):
+        compiler = tmp_path / f'gcc-{version}'
+        compiler.write_bytes(f'gcc {version}'.encode())
+        build = tmp_path / version
+        platform = build / 'CMakeFiles' / '3.25.1'
+        platform.mkdir(parents=True)
+        (platform / 'CMakeCCompiler.cmake').write_text(
+            f'set(CMAKE_C_COMPILER_VERSION "{version}")')
+        (build / 'CMakeCache.txt').write_text(f'CMAKE_C_COMPILER:FILEPATH={compiler}\n')
+        assert store.capture(cmake, CMakeConfigure(build_dir=str(build)))
+
+    # Both compilers are installed: CMake could find either
+    assert not store.seed(cmake, CMakeConfigure(build_dir=str(tmp_path / 'fresh')))
+
+    (tmp_path / 'gcc-11').unlink()
+    assert store.seed(cmake, CMakeConfigure(build_dir=str(tmp_path / 'fresh')))
+    assert '"12"' in (tmp_path / 'fresh' / 'CMakeFiles' / '3.25.1' /
+                      'CMakeCCompiler.cmake').read_text()
@@ -0,0 +1,73 @@
+import json
+import os
+
+import pytest
+
+from cmake import cfileapi
+
+def writereply(builddir, objects: dict, files: dict):
+    replydir = builddir / '.cmake' / 'api' / 'v1' / 'reply'
+    replydir.mkdir(parents=True)
+    index = {'objects': [{'kind': kind, 'jsonFile': name} for kind, name in objects.items()]}
+    (replydir / 'index-2023-01-01T00-00-00-0000.json').write_text(json.dumps(index))
+    for name, content in files.items():
+        (replydir / name).write_text(content if isinstance(content, str) else json.dumps(content))
+
+def test_lazy_reply_and_indexes(tmp_path):
+    source = str(tmp_path / 'src')
+    build = tmp_path / 'build'
+    codemodel = {
+        'paths': {'source': source, 'build': str(build)},
+        'configurations': [{
+            'name': 'Release',
+            'directories': [{'source': '.', 'build': '.', 'targetIndexes': [0, 1]},
+                            {'source': 'lib', 'build': 'lib', 'targetIndexes': [1]}],
+            'targets': [{'name': 'app', 'jsonFile': 'target-app.json'},
+                        {'name': 'demo', 'jsonFile': 'target-demo.json'}]
+        }]
+    }
+    writereply(build, {'codemodel': 'codemodel.json', 'cache': 'cache.json'}, {
+        'codemodel.json': codemodel,
+        'cache.json': 'not json',
+        'target-app.json': {'name': 'app', 'sources': [{'path': 'main.c'}]},
+        'target-demo.json': {'name': 'demo', 'sources': [{'path': 'lib/lib.c'},
+                                                         {'path': 'main.c'}]}
+    })
+
+    reply = cfileapi.latestreply(str(build))
+    assert cfileapi.latestreply(str(build)) is reply
+
+    # The broken cache object is never read, nor are the targets until needed
+    assert reply.targetnames() == ['app', 'demo']
+    assert reply.directory(os.path.join(source, 'lib'))['targetNames'] == ['demo']
+    assert reply.directory(str(build))['targetNames'] == ['app', 'demo']
+    with pytest.raises(KeyError):
+        reply.directory(str(tmp_path / 'elsewhere'))
+
+    assert reply.targetsforsource('main.c') == ['app', 'demo']
+    assert reply.targetsforsource('lib/lib.c') == ['demo']
+    assert reply.target('demo')['name'] == 'demo'
+    with pytest.raises(KeyError):
+        reply.target('missing')
+
+    # The lookups go through indexes built once per configuration
+    reply.configuration()['targets'].clear()
+    reply.configuration()['directories'].clear()
+    assert reply.target('app')['name'] == 'app'
+    reply.directory(str(build))['targetNames'].clear()
+    assert reply.directory(str(build))['targetNames'] == ['app', 'demo']
+    with pytest.raises(ValueError):
+        reply.cache()
+
+def test_reply_without_codemodel(tmp_path):
+    writereply(tmp_path, {'toolchains': 'toolchains.json'}, {
+        'toolchains.json': {'toolchains': [{'language': 'C', 'compiler': {'id': 'GNU'}}]}
+    })
+
+    reply = cfileapi.latestreply(str(tmp_path))
+    assert reply.toolchains()['C']['compiler']['id'] == 'GNU'
+    assert reply.cmakefiles() is None and reply.cache() == {}
+    for lookup in (reply.targetnames, lambda: reply.directory(str(tmp_path)),
+                   lambda: reply.targetsforsource('main.c')):
+        with pytest.raises(KeyError):
+            lookup()
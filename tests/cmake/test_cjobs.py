@@ -0,0 +1,98 @@
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+from cmake import cjobs
+from cmake.ccmd import CMakeBuildCommand, CMakeConfigure
+from cmake.cinstance import CMakeInst
+from cmakeutils.sysload import SystemLoad
+
+CMAKE = shutil.which('cmake')
+
+def test_estimate(tmp_path):
+    history = str(tmp_path / 'jobs.json')
+    load = SystemLoad(cpucount=8, memavailable=(8 << 30) + (512 << 20))
+    estimator = cjobs.CMakeJobsEstimator(history, samples=2, sampler=lambda: load)
+
+    # Without samples: 1 GiB per compile and 4 GiB per link
+    assert estimator.estimate() == cjobs.CMakeJobs(8, 8, 2)
+
+    estimator.record(cjobs.COMPILE, 2 << 30).record(cjobs.LINK, 1 << 30)
+    assert estimator.estimate() == cjobs.CMakeJobs(4, 4, 8)
+
+    # Only the last 'samples' values count, and they are kept in the history file
+    estimator.record(cjobs.COMPILE, 1 << 30).record(cjobs.COMPILE, 1 << 29)
+    reloaded = cjobs.CMakeJobsEstimator(history, samples=2, sampler=lambda: load)
+    assert reloaded.peak(cjobs.COMPILE) == 1 << 30 and reloaded.peak(cjobs.LINK) == 1 << 30
+
+    # Never below one job, not limited without memory information
+    assert cjobs.CMakeJobsEstimator(sampler=lambda: SystemLoad(2, memavailable=0)).estimate() \
+        == cjobs.CMakeJobs(1, 1, 1)
+    assert cjobs.CMakeJobsEstimator(sampler=lambda: SystemLoad(2)).estimate() == \
+        cjobs.CMakeJobs(2, 2, 2)
+
+def test_stepkind():
+    assert cjobs.stepkind('[1/3] Building C object CMakeFiles/app.dir/main.c.o') == cjobs.COMPILE
+    assert cjobs.stepkind('[100%] Linking C executable app') == cjobs.LINK
+    assert cjobs.stepkind('[100%] Built target app') is None
+
+def test_job_pools_option():
+    load = SystemLoad(cpucount=8, memavailable=(8 << 30) + (512 << 20))
+    previous = cjobs.default()
+    cjobs.setdefault(cjobs.CMakeJobsEstimator(sampler=lambda: load))
+    try:
+        args = CMakeConfigure(job_pools=True).compile()
+        assert '-DCMAKE_JOB_POOLS:STRING=compile=8;link=2' in args
+        assert '-DCMAKE_JOB_POOL_COMPILE:STRING=compile' in args
+        assert '-DCMAKE_JOB_POOL_LINK:STRING=link' in args
+
+        # Only the Ninja generators have job pools
+        assert not any('JOB_POOL' in arg for arg in
+                       CMakeConfigure(job_pools=True, generator='Unix Makefiles').compile())
+        assert not any('JOB_POOL' in arg for arg in CMakeConfigure().compile())
+    finally:
+        cjobs.setdefault(previous)
+
+@pytest.mark.skipif(CMAKE is None or shutil.which('cc') is None or not hasattr(os, 'wait4'),
+                    reason='needs cmake, a C compiler and wait4')
+def test_build_records_peak_rss(tmp_path):
+    (tmp_path / 'main.c').write_text('int main(void) { return 0; }\n')
+    (tmp_path / 'CMakeLists.txt').write_text(
+        'cmake_minimum_required(VERSION 3.10)\nproject(app C)\nadd_executable(app main.c)\n')
+
+    version = subprocess.run([CMAKE, '--version'], capture_output=True, text=True,
+                             check=True).stdout.split()[2]
+    inst = CMakeInst(CMAKE, version)
+    previous = cjobs.default()
+    estimator = cjobs.CMakeJobsEstimator(compilerss=1, linkrss=1)
+    cjobs.setdefault(estimator)
+    try:
+        inst.invoke(CMakeConfigure(source_dir=str(tmp_path), build_dir=str(tmp_path / 'build'),
+                                   generator='Unix Makefiles'))
+        assert inst.lastreturncode == 0 and estimator.peak(cjobs.COMPILE) == 1
+
+        # Compiles and links: the peak can't be told apart, nothing is recorded
+        inst.invoke(CMakeBuildCommand(build_path=str(tmp_path / 'build')))
+        assert inst.lastreturncode == 0 and inst.laststeps == {cjobs.COMPILE, cjobs.LINK}
+        assert inst.lastpeakrss > 1 << 20
+        assert estimator.peak(cjobs.COMPILE) == estimator.peak(cjobs.LINK) == 1
+
+        # Only links
+        os.unlink(tmp_path / 'build' / 'app')
+        inst.invoke(CMakeBuildCommand(build_path=str(tmp_path / 'build')))
+        assert inst.lastreturncode == 0 and inst.laststeps == {cjobs.LINK}
+        assert estimator.peak(cjobs.LINK) == inst.lastpeakrss
+        assert estimator.peak(cjobs.COMPILE) == 1
+    finally:
+        cjobs.setdefault(previous)
+
+@pytest.mark.skipif(not hasattr(os, 'wait4'), reason='needs wait4')
+def test_reap_after_poll():
+    with subprocess.Popen([sys.executable, '-c', 'raise SystemExit(3)']) as proc:
+        # Another thread polled the process first
+        proc.wait()
+        assert CMakeInst._CMakeInst__reap(proc) is None # pylint: disable-msg=W0212
+        assert proc.returncode == 3
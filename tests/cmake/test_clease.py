@@ -0,0 +1,67 @@
+import os
+
+import pytest
+
+from cmake.ccmd import CMakeBuildCommand, CMakeConfigure, CMakeInstallCommand
+from cmake.cinstance import CMakeInst
+from cmake.clease import CMakeLeaseManager, CMakeLeaseMode, LockTimeout, dirsfor
+
+def test_dirsfor(tmp_path):
+    build = str(tmp_path / 'build')
+    prefix = str(tmp_path / 'prefix')
+
+    assert dirsfor(CMakeConfigure(build_dir=build)) == {build: CMakeLeaseMode.EXCLUSIVE}
+    assert dirsfor(CMakeBuildCommand(build_path=build)) == {build: CMakeLeaseMode.EXCLUSIVE}
+    assert dirsfor(CMakeInstallCommand(install_path=build, prefix=prefix)) == {
+        build: CMakeLeaseMode.SHARED, prefix: CMakeLeaseMode.EXCLUSIVE
+    }
+
+    # Without a prefix, the one of the cache
+    os.makedirs(build)
+    with open(os.path.join(build, 'CMakeCache.txt'), 'w', encoding='utf-8') as fh:
+        fh.write(f'CMAKE_INSTALL_PREFIX:PATH={prefix}\n')
+    assert dirsfor(CMakeInstallCommand(install_path=build)) == {
+        build: CMakeLeaseMode.SHARED, prefix: CMakeLeaseMode.EXCLUSIVE
+    }
+
+def test_shared_and_exclusive(tmp_path):
+    manager = CMakeLeaseManager(str(tmp_path / 'locks'))
+    build = str(tmp_path / 'build')
+    install = CMakeInstallCommand(install_path=build, prefix=str(tmp_path / 'prefix'))
+    other = CMakeInstallCommand(install_path=build, prefix=str(tmp_path / 'other'))
+
+    # Installs of one build dir to different prefixes run together
+    with manager.forcommand(install), manager.forcommand(other):
+        with pytest.raises(LockTimeout):
+            manager.forcommand(CMakeBuildCommand(build_path=build)).acquire(0.05)
+
+    with manager.forcommand(CMakeConfigure(build_dir=build)):
+        with pytest.raises(LockTimeout):
+            manager.forcommand(install).acquire(0.05)
+        manager.forcommand(CMakeConfigure(build_dir=str(tmp_path / 'elsewhere'))) \
+            .acquire(0.05).release()
+
+def test_order_and_timeout(tmp_path):
+    manager = CMakeLeaseManager(str(tmp_path / 'locks'), timeout=0.05)
+    first, second = str(tmp_path / 'a'), str(tmp_path / 'b')
+
+    lease = manager.lease({second: CMakeLeaseMode.EXCLUSIVE, first: CMakeLeaseMode.SHARED,
+                           os.path.join(second, '.'): CMakeLeaseMode.SHARED})
+    assert lease.paths() == [first, second]
+    assert [lock.shared for _, lock in lease.locks] == [True, False]
+
+    # A timeout releases the leases taken so far
+    with manager.lease({second: CMakeLeaseMode.EXCLUSIVE}):
+        with pytest.raises(LockTimeout):
+            with lease:
+                pass
+        assert not any(lock.locked() for _, lock in lease.locks)
+
+    with manager.lease({first: CMakeLeaseMode.EXCLUSIVE}):
+        pass
+
+def test_invoke_leases_by_default():
+    cmake = CMakeInst('cmake', '3.25.1')
+    assert isinstance(cmake.leases, CMakeLeaseManager)
+    assert cmake.clone().leases is cmake.leases
+    assert cmake.setleases(enabled=False).leases is None
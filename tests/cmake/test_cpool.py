@@ -0,0 +1,69 @@
+import os
+import subprocess
+import sys
+
+from cmake.ccmd import CMakeConfigure
+from cmake.cpool import CMakeBuildPool
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def configure(source, buildtype: str = 'Release') -> CMakeConfigure:
+    return CMakeConfigure(source_dir=str(source), variables={'CMAKE_BUILD_TYPE': buildtype})
+
+def test_leases(tmp_path):
+    pool = CMakeBuildPool(str(tmp_path / 'pool'))
+    first = configure(tmp_path)
+    lease = pool.lease(first)
+    assert not lease.warm and first['build_dir'] == lease.path and os.path.isdir(lease.path)
+
+    # A leased dir is not handed out again, not even by another pool object
+    other = CMakeBuildPool(str(tmp_path / 'pool'))
+    second = other.lease(configure(tmp_path))
+    assert second.path != lease.path and len(pool.entries()) == 0
+
+    (tmp_path / 'pool' / lease.entry / 'build' / 'out.o').write_bytes(b'x' * 100)
+    lease.release()
+    second.release(keep=False)
+    assert [entry for entry, _ in pool.entries()] == [lease.entry]
+
+    # The closest idle dir is reused
+    again = other.lease(configure(tmp_path, 'Debug'))
+    assert again.warm and not again.exact and again.entry == lease.entry
+    again.release()
+
+def test_lease_dropped_with_holder(tmp_path):
+    pool = CMakeBuildPool(str(tmp_path / 'pool'))
+    entry = pool.lease(configure(tmp_path)).release().entry
+
+    # Another process leases the dir, then dies without releasing it
+    lockpath = str(tmp_path / 'pool' / '.locks' / (entry + '.lock'))
+    holder = subprocess.Popen([sys.executable, '-c', (
+        'import sys, time\n'
+        'from cmakeutils.filelock import FileLock\n'
+        f'FileLock({lockpath!r}).acquire()\n'
+        'print(flush=True)\n'
+        'time.sleep(60)\n'
+    )], stdout=subprocess.PIPE, env=dict(os.environ, PYTHONPATH=ROOT))
+    try:
+        holder.stdout.readline()
+        assert pool.entries() == []
+    finally:
+        holder.kill()
+        holder.wait()
+        holder.stdout.close()
+
+    assert [found for found, _ in pool.entries()] == [entry]
+
+def test_evict(tmp_path):
+    pool = CMakeBuildPool(str(tmp_path / 'pool'), budget=150, maxentries=2)
+    leases = [pool.lease(configure(tmp_path / f'src{n}')) for n in range(3)]
+    for lease in leases:
+        with open(os.path.join(lease.path, 'out.o'), 'wb') as fh:
+            fh.write(b'x' * 100)
+        with lease:
+            pass
+
+    # Least recently used first, down to the budget
+    assert [entry for entry, _ in pool.entries()] == [leases[2].entry]
+    assert pool.usage() == 100
+    assert os.listdir(tmp_path / 'pool' / '.trash') == []
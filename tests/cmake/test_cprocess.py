@@ -0,0 +1,53 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from cmake.cprocess import CMakeProcessControl, CMakeProcessOptions, partitioncpus
+
+def test_partitioncpus():
+    cpus = [3, 0, 2, 1, 5, 4, 7, 6]
+    assert partitioncpus(cpus, 0, 2) == [0, 1, 2, 3]
+    assert partitioncpus(cpus, 1, 2) == [4, 5, 6, 7]
+    assert [len(partitioncpus(cpus, slot, 3)) for slot in range(3)] == [2, 3, 3]
+    assert sorted(sum((partitioncpus(cpus, slot, 3) for slot in range(3)), [])) == sorted(cpus)
+
+    # More slots than cpus: every slot still gets one
+    assert [partitioncpus([0, 1], slot, 3) for slot in range(3)] == [[0], [1], [0]]
+    assert partitioncpus(cpus, 0, 0) == sorted(cpus)
+    assert partitioncpus([], 1, 2) == []
+
+@pytest.mark.skipif(os.name == 'nt', reason='POSIX process controls')
+def test_options_applied_after_spawn():
+    options = CMakeProcessOptions(nice=3, processgroup=True)
+    if hasattr(os, 'sched_getaffinity'):
+        options.cpus = [min(os.sched_getaffinity(0))]
+
+    control = CMakeProcessControl(options)
+    popenargs = control.popenargs()
+    assert popenargs == {'start_new_session': True}
+
+    process = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(30)'],
+                               **popenargs)
+    try:
+        control.started(process)
+        assert os.getpriority(os.PRIO_PROCESS, process.pid) == \
+            os.getpriority(os.PRIO_PROCESS, 0) + 3
+        if options.cpus is not None:
+            assert os.sched_getaffinity(process.pid) == set(options.cpus)
+        assert os.getsid(process.pid) == process.pid
+    finally:
+        process.kill()
+        process.wait()
+        control.finished()
+
+def test_partition_rebalance():
+    first = CMakeProcessControl(CMakeProcessOptions(cpus=[0, 1, 2, 3], partition=True))
+    second = CMakeProcessControl(CMakeProcessOptions(cpus=[0, 1, 2, 3], partition=True))
+    try:
+        assert first.cpus == [0, 1] and second.cpus == [2, 3]
+    finally:
+        second.finished()
+    assert first.cpus == [0, 1, 2, 3]
+    first.finished()
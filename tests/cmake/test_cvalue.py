@@ -0,0 +1,36 @@
+import dataclasses
+import sys
+
+import pytest
+
+from cmake import cbasic
+from cmake.cbasic import CMakeValType, CMakeValue
+from cmake.ccmd import CMakeConfigure
+
+def test_values_are_immutable_and_hashable():
+    assert CMakeValue('a') != CMakeValue('b')
+    assert CMakeValue('a') == CMakeValue('a', CMakeValType.STRING)
+
+    variables = CMakeValue({'FOO': CMakeValue('bar')})
+    assert variables == CMakeValue({'FOO': CMakeValue('bar')})
+    assert hash(variables) == hash(CMakeValue({'FOO': CMakeValue('bar')}))
+
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        variables.value = {}
+    with pytest.raises(TypeError):
+        variables.value['FOO'] = CMakeValue('baz')
+    with pytest.raises(ValueError):
+        CMakeValue(True, CMakeValType.PATH)
+
+def test_paths_resolved_when_compiled():
+    value = CMakeValue(sys.executable)
+    assert value.type == CMakeValType.STRING and not value.declared
+
+    cbasic.clearpaths()
+    command = CMakeConfigure(variables={
+        'TOOL': sys.executable,
+        'NAME': 'not-a-file',
+        'DIR': CMakeValue('/usr', CMakeValType.PATH)
+    })
+    assert command.compile()[6:] == [f'-DTOOL:FILEPATH={sys.executable}',
+                                     '-DNAME:STRING=not-a-file', '-DDIR:PATH=/usr']
@@ -0,0 +1,19 @@
+from cmake.cscheduler import COMPILER_ERROR
+
+def test_compiler_error():
+    errors = [
+        'src/foo.c:12:5: error: unknown type name \'bar\'',
+        'foo.cpp(3): error C2065: \'x\': undeclared identifier',
+        'LINK : fatal error LNK1104: cannot open file \'a.lib\'',
+        'FAILED: CMakeFiles/app.dir/main.c.o',
+        '/usr/bin/ld: main.o: undefined reference to `baz\'',
+        'make[2]: *** [CMakeFiles/app.dir/build.make:76] Error 1'
+    ]
+    noise = [
+        '-- Configuring done',
+        'src/foo.c:3:1: warning: unused variable \'y\'',
+        '[2/10] Building C object CMakeFiles/app.dir/error.c.o'
+    ]
+
+    assert all(COMPILER_ERROR.search(line) for line in errors)
+    assert not any(COMPILER_ERROR.search(line) for line in noise)
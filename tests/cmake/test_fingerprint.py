@@ -0,0 +1,99 @@
+import os
+
+from cmake import cfingerprint as cfp
+from cmake import cjobs
+from cmake.ccmd import CMakeConfigure
+from cmakeutils.sysload import SystemLoad
+
+def __builddir(build):
+    os.makedirs(os.path.join(build, 'CMakeFiles'))
+    for name in ('CMakeCache.txt', 'Makefile'):
+        with open(os.path.join(build, name), 'w', encoding='utf-8') as fh:
+            fh.write('\n')
+
+def test_check_and_changes(tmp_path):
+    build = str(tmp_path / 'build')
+    lists = str(tmp_path / 'CMakeLists.txt')
+    __builddir(build)
+    with open(lists, 'w', encoding='utf-8') as fh:
+        fh.write('project(app C)\n')
+
+    command = CMakeConfigure(source_dir=str(tmp_path), build_dir=build)
+    assert cfp.check(command, 'cmake', '3.25.1', {}) == (False,
+                                                         ['no previous successful configure'])
+
+    cfp.store(build, cfp.fingerprint(command, 'cmake', '3.25.1', {'CC': 'gcc'}, [lists]))
+    assert cfp.check(command, 'cmake', '3.25.1', {'CC': 'gcc', 'HOME': '/root'}) == (True, [])
+
+    with open(lists, 'a', encoding='utf-8') as fh:
+        fh.write('add_executable(app main.c)\n')
+    command['generator'] = 'Unix Makefiles'
+    skip, reasons = cfp.check(command, 'cmake', '3.25.1', {'CC': 'clang'})
+    assert not skip
+    assert reasons == ['options changed', 'env: CC changed', f'inputs: {lists} changed']
+
+def test_job_pools_are_stable(tmp_path):
+    command = CMakeConfigure(build_dir=str(tmp_path), job_pools=True)
+    digests = set()
+    try:
+        for memory in (2 << 30, 64 << 30):
+            cjobs.setdefault(cjobs.CMakeJobsEstimator(
+                sampler=lambda memory=memory: SystemLoad(cpucount=16, memavailable=memory)))
+            command['job_pools'] = True
+            assert any(arg.startswith('-DCMAKE_JOB_POOLS') for arg in command.compile())
+            digests.add(cfp.fingerprint(command, 'cmake', '3.25.1', {}, [])['digest'])
+    finally:
+        cjobs.setdefault(None)
+
+    assert len(digests) == 1
+
+def test_inputfiles(tmp_path):
+    make = tmp_path / 'make'
+    (make / 'CMakeFiles').mkdir(parents=True)
+    (make / 'CMakeFiles' / 'Makefile.cmake').write_text(
+        'set(CMAKE_MAKEFILE_DEPENDS\n  "CMakeCache.txt"\n  "/src/CMakeLists.txt"\n  )\n')
+    assert cfp.inputfiles(str(make)) == sorted([
+        os.path.normpath(str(make / 'CMakeCache.txt')), os.path.normpath('/src/CMakeLists.txt')
+    ])
+
+    ninja = tmp_path / 'ninja'
+    ninja.mkdir()
+    (ninja / 'build.ninja').write_text(
+        'build build.ninja: RERUN_CMAKE | /src/CMakeLists.txt $\n'
+        '    /src/My$ Dir/x.cmake || cmake_object_order_depends\n')
+    assert cfp.inputfiles(str(ninja)) == sorted([
+        os.path.normpath('/src/CMakeLists.txt'), os.path.normpath('/src/My Dir/x.cmake')
+    ])
+
+    assert cfp.inputfiles(str(tmp_path / 'missing')) == []
+
+def test_raw_args(tmp_path):
+    build = str(tmp_path / 'build')
+    __builddir(build)
+
+    command = CMakeConfigure(source_dir=str(tmp_path), build_dir=build)
+    cfp.store(build, cfp.fingerprint(command, 'cmake', '3.25.1', {}, [], ['-Wdev']))
+    assert cfp.check(command, 'cmake', '3.25.1', {}, ['-Wdev']) == (True, [])
+
+    for rawargs in (None, ['-DCMAKE_BUILD_TYPE=Release'], ['-Wdev', '--fresh']):
+        assert cfp.check(command, 'cmake', '3.25.1', {}, rawargs) == (False,
+                                                                      ['raw arguments changed'])
+
+def test_seeded_initial_cache(tmp_path):
+    build = str(tmp_path / 'build')
+    user = tmp_path / 'user.cmake'
+    user.write_text('set(A 1 CACHE STRING "")\n')
+
+    command = CMakeConfigure(build_dir=build, initial_cache=str(user))
+    part = cfp.seedscript(command, 'check-results', ['set(HAVE_X 1 CACHE INTERNAL "")'])
+    script = os.path.join(build, '.pycmake', 'initial-cache.cmake')
+    assert cfp.initialcache(command) == [script, str(user), part]
+
+    digests = {cfp.fingerprint(command, 'cmake', '3.25.1', {}, [])['digest']}
+    user.write_text('set(A 2 CACHE STRING "")\n')
+    digests.add(cfp.fingerprint(command, 'cmake', '3.25.1', {}, [])['digest'])
+    with open(part, 'a', encoding='utf-8') as fh:
+        fh.write('set(HAVE_Y 1 CACHE INTERNAL "")\n')
+    digests.add(cfp.fingerprint(command, 'cmake', '3.25.1', {}, [])['digest'])
+
+    assert len(digests) == 3
@@ -0,0 +1,57 @@
+import dataclasses
+
+import pytest
+
+from cmake import cbasic as cb
+from cmake.ccmd import CMakeConfigure
+
+def test_frozen_commands():
+    base = CMakeConfigure(build_dir='build', variables={'FOO': 'bar'}).freeze()
+    assert base.compile() == ['-S', '.', '-B', 'build', '-G', 'Ninja', '-DFOO:STRING=bar']
+
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        base['build_dir'] = 'other'
+
+    derived = base.with_(build_dir='other', generator='Unix Makefiles')
+    assert derived.frozen
+    assert derived.compile() == ['-S', '.', '-B', 'other', '-G', 'Unix Makefiles',
+                                 '-DFOO:STRING=bar']
+    assert base['build_dir'] == 'build'
+
+    same = CMakeConfigure(build_dir='build', variables={'FOO': 'bar'}).freeze()
+    assert same == base and hash(same) == hash(base)
+    assert derived != base
+
+def test_mutable_commands_recompile_changes():
+    command = CMakeConfigure()
+    command.compile()
+    command['build_dir'] = 'out'
+    assert command.compile()[3] == 'out'
+
+    # Unfrozen commands are only equal to themselves
+    twin = CMakeConfigure(build_dir='out')
+    assert command == command and command != twin and len({command, twin}) == 2
+    assert command != twin.freeze()
+
+def test_clearpaths_recompiles_variables(tmp_path):
+    path = str(tmp_path / 'toolchain.cmake')
+    command = CMakeConfigure(variables={'TOOLCHAIN': path}).freeze()
+    assert f'-DTOOLCHAIN:STRING={path}' in command.compile()
+
+    # Until clearpaths(), the kind found for the path is kept
+    (tmp_path / 'toolchain.cmake').write_text('')
+    assert f'-DTOOLCHAIN:STRING={path}' in command.compile()
+
+    cb.clearpaths()
+    assert f'-DTOOLCHAIN:FILEPATH={path}' in command.compile()
+    assert f'-DTOOLCHAIN:FILEPATH={path}' in command.with_(build_dir='other').compile()
+
+def test_declared_types_in_key():
+    commands = [
+        CMakeConfigure(variables={'X': cb.CMakeValue('/opt', vtype)}).freeze()
+        for vtype in (cb.CMakeValType.PATH, cb.CMakeValType.STRING, cb.CMakeValType.INTERNAL)
+    ]
+    assert [command.compile()[-1] for command in commands] == \
+        ['-DX:PATH=/opt', '-DX:STRING=/opt', '-DX:INTERNAL=/opt']
+    assert len(set(commands)) == 3
+    assert len({hash(command) for command in commands}) == 3
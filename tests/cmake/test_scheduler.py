@@ -0,0 +1,154 @@
+import os
+import shutil
+import subprocess
+import time
+
+import pytest
+
+from cmake.cadmission import CMakeAdmissionController, CMakeAdmissionOptions
+from cmake.ccmd import CMakeConfigure
+from cmake.cinstance import CMakeInst
+from cmake.cscheduler import CMakeScheduler, CMakeJobState, CMakePriority
+from cmakeutils import eventlog, sysload
+
+CMAKE = shutil.which('cmake')
+
+def cmakeinst() -> CMakeInst:
+    version = subprocess.run([CMAKE, '--version'], capture_output=True, text=True,
+                             check=True).stdout.split()[2]
+    return CMakeInst(CMAKE, version)
+
+def test_clone_keeps_configuration(tmp_path):
+    inst = CMakeInst('cmake', '3.25.1').setconfigureskip().setfileapi()
+    inst.seteventlog(eventlog.EventLog(str(tmp_path)))
+    inst.append_env_variables({'FOO': '1'})
+
+    clone = inst.clone()
+    assert clone is not inst and clone.events is inst.events and clone.configureskip
+    assert clone.fileapikinds == inst.fileapikinds and clone.environ is inst.environ
+    assert clone.scopeenviron == {} and clone.lastreturncode is None
+
+@pytest.mark.skipif(CMAKE is None, reason='cmake not found')
+def test_failing_job_cancels_siblings(tmp_path):
+    source = tmp_path / 'slow'
+    source.mkdir()
+    (source / 'CMakeLists.txt').write_text(
+        'cmake_minimum_required(VERSION 3.10)\n'
+        'project(slow NONE)\n'
+        'execute_process(COMMAND ${CMAKE_COMMAND} -E sleep 60)\n')
+
+    scheduler = CMakeScheduler(cmakeinst(), capacity=2, preempt=False)
+    batch = scheduler.batch(grace=1.0)
+
+    slow = batch.submit(CMakeConfigure(source_dir=str(source), build_dir=str(tmp_path / 'b1'),
+                                       generator='Unix Makefiles'))
+    deadline = time.monotonic() + 10
+    while slow.process is None and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    failing = batch.submit(CMakeConfigure(source_dir=str(tmp_path / 'missing'),
+                                          build_dir=str(tmp_path / 'b2'),
+                                          generator='Unix Makefiles'))
+
+    started = time.monotonic()
+    assert len(batch.wait(30)) == 2
+    assert time.monotonic() - started < 30
+
+    assert failing.state == CMakeJobState.DONE and not failing.succeeded()
+    assert slow.state == CMakeJobState.CANCELLED
+    assert batch.tripped and batch.failedjob is failing and not batch.succeeded()
+    scheduler.shutdown()
+
+@pytest.mark.skipif(CMAKE is None, reason='cmake not found')
+def test_jobs_use_instance_and_sampler(tmp_path):
+    log = eventlog.EventLog(str(tmp_path / 'events'))
+    inst = cmakeinst().seteventlog(log)
+
+    # The injected sampler always reports an overloaded machine: one job at a time
+    samples = []
+    def sampler():
+        samples.append(True)
+        return sysload.SystemLoad(cpucount=1, loadavg=100.0)
+    admission = CMakeAdmissionController(CMakeAdmissionOptions(maxloadpercpu=1.0), sampler)
+
+    scheduler = CMakeScheduler(inst, capacity=4, preempt=False, admission=admission,
+                               interval=0.05)
+    jobs = [
+        scheduler.submit(CMakeConfigure(source_dir=str(tmp_path / 'missing'),
+                                        build_dir=str(tmp_path / f'b{n}'),
+                                        generator='Unix Makefiles'))
+        for n in range(3)
+    ]
+    scheduler.shutdown()
+
+    assert all(job.done() for job in jobs) and len(samples) > 0
+    for first, second in zip(jobs, jobs[1:]):
+        assert second.started >= first.finished
+
+    log.flush()
+    assert len(eventlog.index(str(tmp_path / 'events'))) == 3
+
+def sleeper(tmp_path, name: str, seconds: float) -> CMakeConfigure:
+    source = tmp_path / name
+    source.mkdir()
+    (source / 'CMakeLists.txt').write_text(
+        'cmake_minimum_required(VERSION 3.10)\n'
+        f'project({name} NONE)\n'
+        f'execute_process(COMMAND ${{CMAKE_COMMAND}} -E sleep {seconds})\n')
+
+    return CMakeConfigure(source_dir=str(source), build_dir=str(tmp_path / f'{name}-build'),
+                          generator='Unix Makefiles')
+
+def waitspawn(*jobs):
+    deadline = time.monotonic() + 10
+    while any(job.process is None for job in jobs) and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+def stopped(job) -> bool:
+    with open(f'/proc/{job.process.pid}/stat', 'r', encoding='utf-8') as fh:
+        return fh.read().rsplit(')', 1)[1].split()[0] == 'T'
+
+@pytest.mark.skipif(CMAKE is None or not os.path.isdir('/proc'),
+                    reason='needs cmake and /proc')
+def test_preemption(tmp_path):
+    scheduler = CMakeScheduler(cmakeinst(), capacity=1, interval=0.05)
+    low = scheduler.submit(sleeper(tmp_path, 'low', 2), CMakePriority.LOW)
+    waitspawn(low)
+
+    high = scheduler.submit(sleeper(tmp_path, 'high', 1), CMakePriority.HIGH)
+    waitspawn(high)
+    assert low.state == CMakeJobState.SUSPENDED and stopped(low)
+    assert high.state == CMakeJobState.RUNNING
+
+    scheduler.shutdown()
+    assert low.succeeded() and high.succeeded()
+    assert low.suspensions == 1 and high.suspensions == 0
+
+    # Resumed once the high priority job finished, suspended meanwhile
+    assert high.started >= low.started and low.finished > high.finished
+    assert 0.8 <= low.suspendedtime <= high.finished - high.started + 0.5
+    assert low.suspendedsince is None and low.runtime() > low.suspendedtime
+
+@pytest.mark.skipif(CMAKE is None or not os.path.isdir('/proc'),
+                    reason='needs cmake and /proc')
+def test_preemption_suspends_one_job_for_overload(tmp_path):
+    overloaded = []
+    def sampler():
+        return sysload.SystemLoad(cpucount=1, loadavg=100.0 if overloaded else 0.0)
+    admission = CMakeAdmissionController(CMakeAdmissionOptions(maxloadpercpu=1.0), sampler)
+
+    scheduler = CMakeScheduler(cmakeinst(), capacity=4, admission=admission, interval=0.05)
+    lows = [scheduler.submit(sleeper(tmp_path, f'low{n}', 2), CMakePriority.LOW)
+            for n in range(2)]
+    waitspawn(*lows)
+
+    overloaded.append(True)
+    high = scheduler.submit(sleeper(tmp_path, 'high', 1), CMakePriority.HIGH)
+    waitspawn(high)
+    assert sorted(job.state.name for job in lows) == ['RUNNING', 'SUSPENDED']
+
+    high.wait(10)
+    overloaded.clear()
+    scheduler.shutdown()
+    assert all(job.succeeded() for job in lows + [high])
+    assert sum(job.suspensions for job in lows) == 1
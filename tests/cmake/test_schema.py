@@ -0,0 +1,20 @@
+import pytest
+
+from cmake.ccmd import CMakeBuildCommand, CMakeConfigure
+
+def test_schema_is_shared_by_class():
+    first = CMakeConfigure(build_dir='a')
+    second = CMakeConfigure(build_dir='b')
+    assert first.schema() is second.schema()
+    assert first.schema() is not CMakeBuildCommand().schema()
+    assert not hasattr(first, '__dict__')
+
+def test_schema_item_access():
+    command = CMakeConfigure(build_dir='out')
+    assert command['BUILD_DIR'] == 'out'
+    assert command['toolchain'] is None
+
+    with pytest.raises(KeyError):
+        command['missing'] = 'value'
+    with pytest.raises(ValueError):
+        CMakeConfigure(build_dir=True)
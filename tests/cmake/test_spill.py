@@ -0,0 +1,45 @@
+import os
+
+from cmake import coptions
+from cmake.ccmd import CMakeConfigure
+
+def test_variables_spill_to_script(tmp_path):
+    coptions.setspill(3, str(tmp_path))
+    try:
+        few = CMakeConfigure(variables={'a': '1', 'b': True})
+        assert '-DB:BOOL=ON' in few.compile()
+
+        many = CMakeConfigure(variables={f'v{n}': f'x {n}' for n in range(5)})
+        args = many.compile()
+        assert '-DV0:STRING=x 0' not in args
+        script = args[args.index('-C') + 1]
+        with open(script, 'r', encoding='utf-8') as fh:
+            content = fh.read()
+        assert 'set(V4 "x 4" CACHE STRING' in content and 'FORCE)' in content
+
+        # The same variables reuse the same script
+        again = CMakeConfigure(variables={f'v{n}': f'x {n}' for n in range(5)})
+        assert again.compile() == args
+    finally:
+        coptions.setspill()
+
+def test_spill_to_build_dir(tmp_path):
+    coptions.setspill(3)
+    try:
+        first = CMakeConfigure(build_dir=str(tmp_path / 'build'),
+                               variables={f'v{n}': str(n) for n in range(5)})
+        args = first.compile()
+        script = args[args.index('-C') + 1]
+        assert script.startswith(str(tmp_path / 'build' / '.pycmake'))
+
+        # A new variable set replaces the older script of the build dir
+        second = first.with_(variables={f'v{n}': str(n) for n in range(6)})
+        args = second.compile()
+        assert [path.name for path in (tmp_path / 'build' / '.pycmake').iterdir()] == \
+            [os.path.basename(args[args.index('-C') + 1])]
+
+        # ... and is written again when needed
+        args = first.compile()
+        assert args[args.index('-C') + 1] == script and os.path.isfile(script)
+    finally:
+        coptions.setspill()
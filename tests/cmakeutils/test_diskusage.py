@@ -0,0 +1,14 @@
+import os
+
+from cmakeutils.diskusage import usage
+
+def test_usage_counts_hardlinks_once(tmp_path):
+    (tmp_path / 'a' / 'b').mkdir(parents=True)
+    (tmp_path / 'a' / 'one').write_bytes(b'x' * 100)
+    (tmp_path / 'a' / 'b' / 'two').write_bytes(b'y' * 50)
+    os.link(tmp_path / 'a' / 'one', tmp_path / 'linked')
+
+    result = usage(str(tmp_path))
+    assert result.files == 2
+    assert result.dirs == 2
+    assert result.size == 150
@@ -0,0 +1,38 @@
+from cmakeutils import eventlog
+
+def test_event_streams(tmp_path):
+    log = eventlog.EventLog(str(tmp_path))
+    first = log.open({'command': 'build'})
+    second = log.open({'command': 'install'})
+
+    first.emit('line', text='one')
+    second.emit('line', text='other')
+    first.emit('line', text='two')
+    first.close(returncode=0)
+    second.close(returncode=1)
+    log.close()
+
+    entries = eventlog.index(str(tmp_path))
+    assert [(entry['command'], entry['returncode'], entry['events']) for entry in entries] == \
+        [('build', 0, 2), ('install', 1, 1)]
+
+    lines = list(eventlog.events(str(tmp_path), entries[0]))
+    assert [(event['seq'], event['text']) for event in lines] == [(1, 'one'), (2, 'two')]
+    assert all(event['id'] == entries[0]['id'] and event['phase'] == 'line' for event in lines)
+
+def test_writer_survives_errors(tmp_path):
+    # The index can not be written while it is a directory
+    (tmp_path / eventlog.INDEX_FILE).mkdir()
+    log = eventlog.EventLog(str(tmp_path))
+    failed = log.open({'command': 'build'})
+    failed.emit('line', text='lost')
+    failed.close(returncode=0)
+    assert log.flush(5.0)
+
+    (tmp_path / eventlog.INDEX_FILE).rmdir()
+    stream = log.open({'command': 'install'})
+    stream.close(returncode=0)
+    assert log.flush(5.0)
+    log.close()
+
+    assert [entry['command'] for entry in eventlog.index(str(tmp_path))] == ['install']
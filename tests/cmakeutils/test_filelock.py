@@ -0,0 +1,51 @@
+import os
+
+import pytest
+
+from cmakeutils.filelock import FileLock, LockTimeout, owner, prune, userdir
+
+def test_shared_and_exclusive(tmp_path):
+    path = str(tmp_path / 'dir.lock')
+
+    with FileLock(path, shared=True), FileLock(path, shared=True):
+        with pytest.raises(LockTimeout):
+            FileLock(path).acquire(0.05)
+
+    with FileLock(path) as lock:
+        assert lock.locked()
+        assert owner(path)['pid'] == os.getpid()
+        with pytest.raises(LockTimeout):
+            FileLock(path, shared=True).acquire(0.05)
+
+def test_prune_skips_held_locks(tmp_path):
+    held = str(tmp_path / 'held.lock')
+    idle = str(tmp_path / 'idle.lock')
+    FileLock(idle).acquire(1).release()
+
+    with FileLock(held):
+        removed = prune(str(tmp_path), age=0)
+
+    assert idle in removed
+    assert held not in removed
+    assert os.path.exists(held)
+
+def test_foreign_lock_file(tmp_path, monkeypatch):
+    path = str(tmp_path / 'dir.lock')
+    FileLock(path).acquire(1).release()
+
+    # The lock files were created by another user
+    realopen = os.open
+    def foreign(file, flags, *args):
+        if flags & os.O_RDWR:
+            raise PermissionError(13, 'Permission denied', file)
+        return realopen(file, flags, *args)
+    monkeypatch.setattr(os, 'open', foreign)
+
+    with FileLock(path) as lock:
+        assert lock.locked()
+        with pytest.raises(LockTimeout):
+            FileLock(path, shared=True).acquire(0.05)
+
+def test_userdir():
+    assert userdir('pycmake-locks') != userdir('pycmake-spill')
+    assert os.path.basename(userdir('pycmake-locks')).startswith('pycmake-locks-')
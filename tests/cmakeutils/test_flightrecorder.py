@@ -0,0 +1,46 @@
+from cmakeutils import eventlog
+from cmakeutils.flightrecorder import FlightRecorder, RingBuffer
+
+def test_ring_keeps_last_bytes():
+    ring = RingBuffer(8)
+    ring.write(b'abcde')
+    ring.write(b'fghij')
+    assert ring.getvalue() == b'cdefghij'
+    ring.write(b'0123456789')
+    assert ring.getvalue() == b'23456789' and ring.written == 20
+
+def test_only_failures_are_written(tmp_path):
+    recorder = FlightRecorder(str(tmp_path), capacity=256)
+
+    green = recorder.open({'command': 'build'})
+    green.emit('line', text='fine')
+    green.close(returncode=0)
+    assert eventlog.index(str(tmp_path)) == []
+
+    red = recorder.open({'command': 'build'})
+    for n in range(20):
+        red.emit('line', text=f'line {n}')
+    red.close(returncode=2)
+
+    entries = eventlog.index(str(tmp_path))
+    assert len(entries) == 1 and entries[0]['returncode'] == 2 and entries[0]['dropped'] > 0
+    lines = [event['text'] for event in eventlog.events(str(tmp_path), entries[0])]
+    assert lines[-1] == 'line 19' and 'line 0' not in lines
+
+def test_released_stream_keeps_out_of_reused_ring(tmp_path):
+    recorder = FlightRecorder(str(tmp_path), capacity=256, spares=1)
+
+    first = recorder.open({'command': 'build'})
+    first.emit('line', text='first')
+    first.close(returncode=0)
+
+    # The ring of 'first' now records 'second'; 'first' must not dump it
+    second = recorder.open({'command': 'build'})
+    second.emit('line', text='second')
+    assert first.dump() is None
+    first.emit('line', text='late')
+
+    assert recorder.dump() == [second.dump()]
+    entry = {'file': second.path}
+    assert [event['text'] for event in eventlog.events(str(tmp_path), entry)] == ['second']
+    second.close(returncode=0)
@@ -0,0 +1,53 @@
+import gzip
+
+import pytest
+
+from cmakeutils import eventlog
+from cmakeutils.logarchive import LogArchive, LogArchiveReader, LogArchiveWriter
+
+@pytest.mark.parametrize('codec,suffix', [('zlib', '.log.gz'), ('lzma', '.log.xz')])
+def test_line_ranges(tmp_path, codec, suffix):
+    path = str(tmp_path / ('build' + suffix))
+    writer = LogArchiveWriter(path, codec, blockbytes=256, interval=None)
+    for n in range(1000):
+        writer.write(f'[{n // 10}%] Building object {n}.o')
+
+    reader = LogArchiveReader(path)
+    readable = reader.count()
+    assert 0 < readable < 1000
+
+    writer.close()
+    assert reader.count() == 1000 and len(reader.blocks()) > 10
+    assert reader.lines(500, 503) == ['[50%] Building object 500.o', '[50%] Building object 501.o',
+                                      '[50%] Building object 502.o']
+    assert len(reader.lines()) == 1000
+
+def test_archive_is_gzip(tmp_path):
+    path = str(tmp_path / 'build.log.gz')
+    writer = LogArchiveWriter(path, blockbytes=64, interval=None)
+    for n in range(50):
+        writer.write(f'line {n}')
+    writer.close()
+
+    with gzip.open(path, 'rt', encoding='utf-8') as fh:
+        assert fh.read().splitlines() == [f'line {n}' for n in range(50)]
+
+def test_tee_closes_every_stream(tmp_path):
+    class Failing(eventlog.EventSink):
+        def open(self, meta: dict = None, streamid: str = None):
+            return self
+
+        def emit(self, phase: str, **payload):
+            pass
+
+        def close(self, **summary):
+            raise OSError('disk full')
+
+    archive = LogArchive(str(tmp_path))
+    stream = eventlog.EventTee(Failing(), archive).open({'command': 'build'})
+    stream.emit('line', text='kept')
+    with pytest.raises(OSError):
+        stream.close(returncode=0)
+
+    entries = eventlog.index(str(tmp_path))
+    assert len(entries) == 1 and archive.reader(entries[0]).lines(0, 1) == ['kept']
@@ -0,0 +1,36 @@
+from cmakeutils import logging as internal_logger
+
+def test_logging_fast_path(tmp_path):
+    logfile = tmp_path / 'pycmake.log'
+    assert not internal_logger.enabled()
+
+    internal_logger.loginit(str(logfile))
+    try:
+        assert internal_logger.enabled() and not internal_logger.enabled(internal_logger.DEBUG)
+        internal_logger.log('dropped', internal_logger.DEBUG)
+        internal_logger.log('kept', internal_logger.WARN)
+    finally:
+        internal_logger.logshutdown()
+
+    content = logfile.read_text(encoding='utf-8')
+    assert 'mod test_logging.py][WARNING]: kept' in content
+    assert 'dropped' not in content
+    assert not internal_logger.enabled()
+
+def test_setlevel_lowers_the_file_level(tmp_path):
+    logfile = tmp_path / 'pycmake.log'
+
+    internal_logger.loginit(str(logfile))
+    try:
+        internal_logger.setlevel(internal_logger.DEBUG)
+        assert internal_logger.enabled(internal_logger.DEBUG)
+        internal_logger.log('details', internal_logger.DEBUG)
+
+        internal_logger.setlevel(internal_logger.ERROR)
+        internal_logger.log('dropped', internal_logger.WARN)
+    finally:
+        internal_logger.logshutdown()
+
+    content = logfile.read_text(encoding='utf-8')
+    assert '[DEBUG]: details' in content
+    assert 'dropped' not in content
@@ -0,0 +1,52 @@
+from cmakeutils import eventlog
+from cmakeutils.logarchive import LogArchive
+from cmakeutils.logindex import LogIndex, phrase
+
+def test_search_output(tmp_path):
+    index = LogIndex(str(tmp_path / 'logs.db'))
+
+    failed = index.open({'command': 'build'})
+    failed.emit('line', text='[ 50%] Linking C executable app')
+    failed.emit('line', text="main.c:(.text+0x5): undefined reference to `missing_symbol'")
+    failed.close(returncode=2)
+
+    green = index.open({'command': 'build'})
+    green.emit('line', text='[100%] Built target app')
+    green.close(returncode=0)
+
+    matches = index.search(phrase('undefined reference'))
+    assert [(match.line, match.returncode) for match in matches] == [(1, 2)]
+    assert index.search('missing_symbol', failed=False) == []
+    assert len(index.search('app')) == 2
+    assert index.invocation(matches[0].invocation)['command'] == 'build'
+    index.close()
+
+def test_add_event_log(tmp_path):
+    log = eventlog.EventLog(str(tmp_path / 'events'))
+    stream = log.open({'command': 'configure'})
+    stream.emit('line', text='CMake Error at CMakeLists.txt:3 (project)')
+    stream.close(returncode=1)
+    log.close()
+
+    index = LogIndex(str(tmp_path / 'logs.db'))
+    assert index.addlog(str(tmp_path / 'events')) == 1
+    assert index.addlog(str(tmp_path / 'events')) == 0
+    assert index.search(phrase('CMakeLists.txt'))[0].text.startswith('CMake Error')
+    index.close()
+
+def test_tee_with_archive(tmp_path):
+    archive = LogArchive(str(tmp_path / 'archive'), interval=None)
+    index = LogIndex(str(tmp_path / 'logs.db'))
+    tee = eventlog.EventTee(archive, index)
+
+    stream = tee.open({'command': 'build'})
+    stream.emit('line', text="main.c:(.text+0x5): undefined reference to `missing_symbol'")
+    stream.close(returncode=2)
+
+    # Already indexed through the tee, under the id of the archived log
+    assert index.addlog(str(tmp_path / 'archive')) == 0
+    matches = index.search('missing_symbol')
+    entry = eventlog.index(str(tmp_path / 'archive'))[0]
+    assert [match.invocation for match in matches] == [entry['id']]
+    assert archive.reader(entry).lines()[matches[0].line].endswith("`missing_symbol'")
+    index.close()
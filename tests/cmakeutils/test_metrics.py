@@ -0,0 +1,80 @@
+import time
+import urllib.request
+
+import pytest
+
+from cmakeutils import metrics
+
+def test_exposition_format():
+    registry = metrics.MetricsRegistry()
+    invocations = registry.counter('pycmake_invocations_total', 'Invocations.',
+                                   ('command', 'code'))
+    duration = registry.histogram('pycmake_invocation_duration_seconds', 'Duration.',
+                                  ('command',), (0.1, 1.0))
+
+    invocations.inc(command='build', code='0')
+    invocations.inc(2, command='build', code='0')
+    invocations.inc(command='configure "x"', code='1')
+    duration.observe(0.05, command='build')
+    duration.observe(0.5, command='build')
+    duration.observe(5.0, command='build')
+
+    assert registry.counter('pycmake_invocations_total', 'Invocations.',
+                            ('command', 'code')) is invocations
+    assert invocations.get(command='build', code='0') == 3
+    assert duration.count(command='build') == 3
+
+    text = registry.expose()
+    assert '# TYPE pycmake_invocations_total counter\n' in text
+    assert 'pycmake_invocations_total{command="build",code="0"} 3\n' in text
+    assert 'pycmake_invocations_total{command="configure \\"x\\"",code="1"} 1\n' in text
+    assert 'pycmake_invocation_duration_seconds_bucket{command="build",le="0.1"} 1\n' in text
+    assert 'pycmake_invocation_duration_seconds_bucket{command="build",le="1"} 2\n' in text
+    assert 'pycmake_invocation_duration_seconds_bucket{command="build",le="+Inf"} 3\n' in text
+    assert 'pycmake_invocation_duration_seconds_sum{command="build"} 5.55\n' in text
+    assert 'pycmake_invocation_duration_seconds_count{command="build"} 3\n' in text
+
+def test_invalid_use():
+    registry = metrics.MetricsRegistry()
+    counter = registry.counter('total', 'Total.', ('command',))
+
+    with pytest.raises(ValueError):
+        counter.inc(-1, command='build')
+    with pytest.raises(ValueError):
+        counter.inc(code='0')
+    with pytest.raises(ValueError):
+        registry.histogram('total', 'Total.', ('command',))
+
+def test_exporters(tmp_path):
+    registry = metrics.MetricsRegistry()
+    registry.counter('pycmake_invocations_total', 'Invocations.').inc()
+
+    exporter = metrics.MetricsFileExporter(str(tmp_path / 'pycmake.prom'), 60.0, registry)
+    exporter.close()
+    assert (tmp_path / 'pycmake.prom').read_text() == registry.expose()
+    assert [path.name for path in tmp_path.iterdir()] == ['pycmake.prom']
+
+    server = metrics.MetricsServer(0, registry=registry)
+    try:
+        with urllib.request.urlopen(server.url()) as response:
+            assert response.headers['Content-Type'] == metrics.CONTENT_TYPE
+            assert response.read().decode('utf-8') == registry.expose()
+    finally:
+        server.close()
+
+def test_exporter_survives_write_errors(tmp_path):
+    registry = metrics.MetricsRegistry()
+    registry.counter('pycmake_invocations_total', 'Invocations.').inc()
+
+    # The directory does not exist yet: the writes fail, the exporter goes on
+    exporter = metrics.MetricsFileExporter(str(tmp_path / 'out' / 'pycmake.prom'), 0.01,
+                                           registry)
+    assert not exporter.export()
+    time.sleep(0.05)
+
+    (tmp_path / 'out').mkdir()
+    deadline = time.monotonic() + 5
+    while not (tmp_path / 'out' / 'pycmake.prom').exists() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    exporter.close()
+    assert (tmp_path / 'out' / 'pycmake.prom').read_text() == registry.expose()
@@ -0,0 +1,41 @@
+import cmakeutils.sysload as sl
+
+def test_readpressure(tmp_path, monkeypatch):
+    (tmp_path / 'cpu').write_text(
+        'some avg10=12.50 avg60=3.00 avg300=1.00 total=100\n'
+        'full avg10=0.00 avg60=0.00 avg300=0.00 total=0\n'
+    )
+    monkeypatch.setattr(sl, 'PROC_PRESSURE', str(tmp_path))
+
+    assert sl.readpressure('cpu') == 12.5
+    assert sl.readpressure('io') is None
+
+def test_loadpercpu():
+    load = sl.SystemLoad(cpucount=4, loadavg=6.0)
+
+    assert load.loadpercpu() == 1.5
+    assert sl.SystemLoad().loadpercpu() is None
+
+def test_cgroup_limits(tmp_path, monkeypatch):
+    monkeypatch.setattr(sl, 'SYS_CGROUP', str(tmp_path))
+    assert sl.cgroupcpulimit() is None and sl.cgroupmemavailable() is None
+
+    # cgroup v1 cfs quota
+    (tmp_path / 'cpu').mkdir()
+    (tmp_path / 'cpu' / 'cpu.cfs_quota_us').write_text('150000\n')
+    (tmp_path / 'cpu' / 'cpu.cfs_period_us').write_text('100000\n')
+    assert sl.cgroupcpulimit() == 1.5
+    (tmp_path / 'cpu' / 'cpu.cfs_quota_us').write_text('-1\n')
+    assert sl.cgroupcpulimit() is None
+
+    # cgroup v2
+    (tmp_path / 'cpu.max').write_text('200000 100000\n')
+    assert sl.cgroupcpulimit() == 2.0
+    (tmp_path / 'cpu.max').write_text('max 100000\n')
+    assert sl.cgroupcpulimit() is None
+
+    (tmp_path / 'memory.max').write_text(f'{4 << 30}\n')
+    (tmp_path / 'memory.current').write_text(f'{1 << 30}\n')
+    assert sl.cgroupmemavailable() == 3 << 30
+    (tmp_path / 'memory.max').write_text('max\n')
+    assert sl.cgroupmemavailable() is None
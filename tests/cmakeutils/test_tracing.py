@@ -0,0 +1,37 @@
+import threading
+
+from cmakeutils import tracing
+
+def test_disabled_spans_are_shared():
+    assert not tracing.enabled()
+    assert tracing.span('anything') is tracing.NOSPAN
+
+def test_nested_spans_export():
+    tracer = tracing.starttracing()
+    try:
+        with tracing.span('outer', command='build') as outer:
+            with tracing.span('inner'):
+                outer.event('first output')
+
+            def worker():
+                with tracing.span('callback', outer):
+                    pass
+            thread = threading.Thread(target=worker)
+            thread.start()
+            thread.join()
+    finally:
+        assert tracing.stoptracing() is tracer
+
+    spans = {span.name: span for span in tracer.spans}
+    assert spans['inner'].parentid == spans['outer'].spanid
+    assert spans['callback'].parentid == spans['outer'].spanid
+    assert spans['outer'].parentid is None
+    assert spans['outer'].end >= spans['inner'].end >= spans['inner'].start >= spans['outer'].start
+
+    events = tracer.chrome()['traceEvents']
+    assert {event['ph'] for event in events} == {'X', 'i'}
+
+    exported = tracer.otlp()['resourceSpans'][0]['scopeSpans'][0]['spans']
+    outer = next(span for span in exported if span['name'] == 'outer')
+    assert outer['attributes'] == [{'key': 'command', 'value': {'stringValue': 'build'}}]
+    assert outer['events'][0]['name'] == 'first output'
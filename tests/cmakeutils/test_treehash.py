@@ -0,0 +1,32 @@
+import os
+
+from cmakeutils.treehash import TreeHasher
+
+def test_treehash(tmp_path):
+    src = tmp_path / 'src'
+    (src / 'sub').mkdir(parents=True)
+    (src / '.git').mkdir()
+    (src / 'CMakeLists.txt').write_text('project(demo)\n')
+    (src / 'sub' / 'main.c').write_text('int main(void) { return 0; }\n')
+
+    # Old enough to be cached
+    old = os.stat(src / 'CMakeLists.txt').st_mtime_ns - 10 ** 10
+    for path in (src / 'CMakeLists.txt', src / 'sub' / 'main.c'):
+        os.utime(path, ns=(old, old))
+
+    cachefile = str(tmp_path / 'hashcache.json')
+    hasher = TreeHasher(cachefile, usegit=False)
+    first = hasher.hashtree(str(src))
+    hasher.save()
+
+    assert sorted(first.files) == ['CMakeLists.txt', 'sub/main.c']
+    assert first.hashed == 2
+
+    second = TreeHasher(cachefile, usegit=False).hashtree(str(src))
+    assert second.digest == first.digest
+    assert second.hashed == 0
+
+    (src / 'sub' / 'main.c').write_text('int main(void) { return 1; }\n')
+    third = TreeHasher(cachefile, usegit=False).hashtree(str(src))
+    assert third.digest != first.digest
+    assert third.hashed == 1